@@ -27,9 +27,10 @@ setuptools.setup(
         "arc_arena": ["resources/images/*", "resources/sounds/*", "resources/fonts/*"],
     },
 
-    python_requires='>=3.7',
+    python_requires='>=3.8',  # multiprocessing.shared_memory (shmframes.py)
     install_requires=[
         # 3rd party dependencies
         "gnp_pygame @ http://github.com/SirGnip/gnp_pygame/tarball/v2.1.0#egg=package-1.0",
+        "numpy",  # needed by pygame.surfarray
     ],
 )
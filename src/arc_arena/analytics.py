@@ -0,0 +1,179 @@
+"""
+Batch statistics and heatmaps from a directory of round logs (see gamelog.py)
+
+    python -m arc_arena.analytics LOG_DIRECTORY [--out DIRECTORY] [--processes N]
+
+The logs are streamed through a pool of worker processes (settings.Analytics.Processes, one per core by default). Each
+worker reads and sums up a file at a time, and only the summaries come back, so a season of thousands of rounds takes
+minutes. Writes to the output directory:
+
+    summary.txt   per player and per round class statistics: rounds, wins, survival time, kills, apples, deaths
+    heatmaps.npz  per round class, counts on a settings.Analytics.HeatmapSize grid over the arena of where the snakes
+                  were each tick (<round class>_positions) and where they died (<round class>_deaths)
+"""
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+import numpy
+from arc_arena import settings
+from arc_arena import gamelog
+
+CFG = settings  # quick alias
+
+
+def to_cells(x, y, playfield, heatmap_size):
+    """Flat heatmap cell index of each position (x and y are arrays)"""
+    width, height = heatmap_size
+    cell_x = numpy.clip(x.astype(numpy.int64) * width // playfield[0], 0, width - 1)
+    cell_y = numpy.clip(y.astype(numpy.int64) * height // playfield[1], 0, height - 1)
+    return cell_y * width + cell_x
+
+
+class RoundSummary(object):
+    """What one round log adds up to. Made by a worker process and sent back to the main one."""
+
+    def __init__(self, log, heatmap_size):
+        header = log.header
+        self.round_name = header['round']
+        self.players = header['players']
+        self.is_complete = log.is_complete
+        count = len(self.players)
+        cells = heatmap_size[0] * heatmap_size[1]
+        time_deltas = log.ticks['time_delta'].astype(numpy.float64)
+        x = log.ticks['pos'][:, :, 0]
+        y = log.ticks['pos'][:, :, 1]
+        alive = x != gamelog.DEAD
+        self.length = float(time_deltas.sum())
+        self.survival = (alive * time_deltas[:, numpy.newaxis]).sum(axis=0)  # seconds, per player
+        self.is_winner = alive[-1] if len(alive) else numpy.zeros(count, bool)
+        self.positions = numpy.bincount(to_cells(x[alive], y[alive], header['playfield'], heatmap_size),
+                                        minlength=cells).astype(numpy.int32)
+
+        self.kills = numpy.zeros(count, numpy.int32)
+        self.apples = numpy.zeros(count, numpy.int32)
+        self.deaths = numpy.zeros(count, numpy.int32)
+        death_spots = []
+        for kind, tick, player_idx, other_idx, x, y in log.events:
+            if kind == gamelog.EVENT_DEATH:
+                self.deaths[player_idx] += 1
+                death_spots.append((x, y))
+                if other_idx >= 0:
+                    self.kills[other_idx] += 1
+            elif kind == gamelog.EVENT_APPLE:
+                self.apples[player_idx] += 1
+        spots = numpy.array(death_spots, numpy.int64).reshape(-1, 2)
+        self.death_map = numpy.bincount(to_cells(spots[:, 0], spots[:, 1], header['playfield'], heatmap_size),
+                                        minlength=cells).astype(numpy.int32)
+
+
+def summarize_log(path):
+    """Read a round log and sum it up. Returns (path, RoundSummary), or (path, error message) if it can't be read.
+    Runs in the worker processes."""
+    try:
+        return path, RoundSummary(gamelog.GameLog.load(path), CFG.Analytics.HeatmapSize)
+    except (OSError, ValueError, IndexError, KeyError) as exc:
+        return path, '%s: %s' % (exc.__class__.__name__, exc)
+
+
+class Totals(object):
+    """Statistics added up over many rounds"""
+    _FIELDS = ('rounds', 'player_rounds', 'wins', 'survival', 'kills', 'apples', 'deaths')
+
+    def __init__(self):
+        for name in self._FIELDS:
+            setattr(self, name, 0)
+        self.time = 0.0  # seconds of play
+
+
+class Analysis(object):
+    """Summaries of rounds, added up by player and by round class"""
+
+    def __init__(self, heatmap_size):
+        self.heatmap_size = heatmap_size
+        self.players = {}  # name -> Totals
+        self.round_classes = {}  # round class name -> Totals
+        self.position_maps = {}  # round class name -> heatmap counts (heatmap rows, heatmap columns)
+        self.death_maps = {}
+        self.round_count = 0
+        self.incomplete_count = 0  # logs of rounds that were cut short (the game quit during them)
+        self.errors = []  # (path, error message)
+
+    def add(self, summary):
+        self.round_count += 1
+        self.incomplete_count += not summary.is_complete
+        round_totals = self.round_classes.setdefault(summary.round_name, Totals())
+        round_totals.rounds += 1
+        round_totals.time += summary.length
+        for idx, name in enumerate(summary.players):
+            totals = self.players.setdefault(name, Totals())
+            totals.rounds += 1
+            totals.time += summary.length
+            for target in (totals, round_totals):
+                target.player_rounds += 1
+                target.wins += int(summary.is_winner[idx])
+                target.survival += float(summary.survival[idx])
+                target.kills += int(summary.kills[idx])
+                target.apples += int(summary.apples[idx])
+                target.deaths += int(summary.deaths[idx])
+        shape = (self.heatmap_size[1], self.heatmap_size[0])
+        for maps, counts in ((self.position_maps, summary.positions), (self.death_maps, summary.death_map)):
+            if summary.round_name not in maps:
+                maps[summary.round_name] = numpy.zeros(shape, numpy.int64)
+            maps[summary.round_name] += counts.reshape(shape)
+
+    def get_table(self):
+        """Summary table, as text"""
+        lines = ['%d rounds (%d cut short), %d unreadable logs' % (self.round_count, self.incomplete_count,
+                                                                   len(self.errors)), '']
+        columns = '%-24s %7s %10s %6s %13s %7s %7s %7s'
+        for title, by_name in (('Player', self.players), ('Round', self.round_classes)):
+            lines.append(columns % (title, 'rounds', 'play time', 'wins', 'avg survival', 'kills', 'apples', 'deaths'))
+            for name, totals in sorted(by_name.items(), key=lambda item: -item[1].wins):
+                survival = totals.survival / max(1, totals.player_rounds)
+                lines.append(columns % (name[:24], totals.rounds, '%.1fm' % (totals.time / 60), totals.wins,
+                                        '%.1fs' % survival, totals.kills, totals.apples, totals.deaths))
+            lines.append('')
+        return '\n'.join(lines)
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        maps = {}
+        for round_name in self.position_maps:
+            maps[round_name + '_positions'] = self.position_maps[round_name]
+            maps[round_name + '_deaths'] = self.death_maps[round_name]
+        numpy.savez_compressed(str(directory / 'heatmaps.npz'), **maps)
+        with open(directory / 'summary.txt', 'w') as f:
+            f.write(self.get_table())
+
+
+def analyze(log_dir, processes=None):
+    """Sum up every round log in a directory, using a pool of processes. Returns an Analysis."""
+    analysis = Analysis(CFG.Analytics.HeatmapSize)
+    paths = (str(path) for path in Path(log_dir).glob('*.arclog'))  # streamed to the pool, not listed up front
+    with multiprocessing.Pool(processes) as pool:
+        for path, summary in pool.imap_unordered(summarize_log, paths, CFG.Analytics.FilesPerTask):
+            if isinstance(summary, str):
+                analysis.errors.append((path, summary))
+            else:
+                analysis.add(summary)
+    return analysis
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    out = sys.argv[sys.argv.index('--out') + 1] if '--out' in sys.argv else 'analytics'
+    process_count = CFG.Analytics.Processes
+    if '--processes' in sys.argv:
+        process_count = int(sys.argv[sys.argv.index('--processes') + 1])
+    start = time.perf_counter()
+    result = analyze(sys.argv[1], process_count)
+    result.save(out)
+    for error_path, message in result.errors:
+        print('Could not read %s: %s' % (error_path, message))
+    print(result.get_table())
+    print('Analyzed %d logs in %.1f seconds. Results written to %s' % (result.round_count + len(result.errors),
+                                                                      time.perf_counter() - start, out))
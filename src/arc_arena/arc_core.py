@@ -11,8 +11,12 @@ from gnp_pygame import gnpinput
 from arc_arena import settings
 from arc_arena import utils
 from arc_arena import backgrounds
+from arc_arena import trails
+from arc_arena import chunks
+from arc_arena import netinput
 import inspect
 import pickle
+import time
 
 CFG = settings  # quick alias
 # simplistic color palette
@@ -47,10 +51,14 @@ class ColorIdxAndRGB(object):
         return hash((self.idx, self.rgb))
 
 
-def load_player_controllers(joys):
+def load_player_controllers(joys, net_server=None):
     def persistent_load(persist_id):
         try:
             print('\tUnpickling with persist_id: "%s"' % str(persist_id))
+            if persist_id[0] == 'net':
+                if net_server is None:
+                    raise pickle.UnpicklingError('Network input server is not running')
+                return net_server.get_client(persist_id[1])
             for joy in joys:
                 if joy is not None and (joy._joy.get_id(), joy._joy.get_name()) == persist_id:
                     print('\tUnpickled %s "%s"' % (type(joy).__name__, joy._joy.get_id()))
@@ -80,6 +88,8 @@ def save_player_controllers(controllers):
             persist_id = (obj._joy.get_id(), obj._joy.get_name())
             print('Pickling %s with custom persist_id: "%s"' % (type(obj), persist_id))
             return persist_id
+        if isinstance(obj, netinput.NetClient):
+            return 'net', obj.client_id  # the client is looked up again on the network input server when loaded
         return None
 
     # save player list to disk
@@ -101,6 +111,7 @@ class ScoreboardPlayer(object):
         self._winner_pulse = gnipMath.cPulseWave(0.8, gnipMath.cRange(0, 1), pulseWidth=0.2)
         self.win_streak = 0
         self.is_winner = False
+        self.kills = 0
 
     def draw(self, screen, draw_rect, elapsed):
         game.font_mgr.draw(screen, game.fnt, 24, '%s: %d' % (self.name, self.score), draw_rect, self.color, 'center',
@@ -175,20 +186,38 @@ class Scoreboard(object):
         self._player_list[player_index].score += score_delta
         self._player_list[player_index].score_delta += score_delta
 
+    def add_kill(self, player_index):
+        self._player_list[player_index].kills += 1
+
+    def get_state(self):
+        """(score, score change this round, kills) of every player"""
+        return [(p.score, p.score_delta, p.kills) for p in self._player_list]
+
+    def set_state(self, state):
+        for player, (score, score_delta, kills) in zip(self._player_list, state):
+            player.score, player.score_delta, player.kills = score, score_delta, kills
+
     def step(self, time_delta):
         self._elapsed += time_delta
 
+    def _get_page(self):
+        """Return (page index, page count) of the scoreboard page currently being shown. Pages flip every few seconds."""
+        page_count = max(1, (len(self._player_list) + CFG.Score.PageSize - 1) // CFG.Score.PageSize)
+        return int(self._elapsed / CFG.Score.PageTime) % page_count, page_count
+
     def draw(self, screen):
-        game.font_mgr.draw(screen, game.fnt, 60, f'Round {self._round_num} Over', game.get_screen_rect(),
+        game.font_mgr.draw(screen, game.fnt, 60, f'Round {self._round_num} Over', game.get_playfield_rect(),
                             gnppygame.WHITE, 'center', 'center')
-        # player scores
-        cnt = len(self._player_list)
+        # player scores (paged, when there are more players than fit in the two rows)
+        page, page_count = self._get_page()
+        page_players = self._player_list[page * CFG.Score.PageSize:(page + 1) * CFG.Score.PageSize]
+        cnt = len(page_players)
         if cnt <= 6:
             top_cnt, btm_cnt = cnt, 0
         else:
             top_cnt, btm_cnt = cnt // 2 + cnt % 2, cnt // 2  # divide by 2, always add any remainder to top row
-        top_players = self._player_list[:top_cnt]  # "top" represents visual positioning, not score
-        bottom_players = self._player_list[top_cnt:]  # "bottom" represents visual positioning, not score
+        top_players = page_players[:top_cnt]  # "top" represents visual positioning, not score
+        bottom_players = page_players[top_cnt:]  # "bottom" represents visual positioning, not score
         top_rects = gnppygame.split_rect_horizontally(self._display_rect_top, len(top_players))
 
         # pygame.draw.rect(screen, (30, 40, 0), self._display_rect_top)
@@ -204,31 +233,43 @@ class Scoreboard(object):
                 player.draw(screen, bottom_rects[idx], self._elapsed)
 
         # Micro-achievement drawing setup
-        rect = game.get_screen_rect()
+        rect = game.get_playfield_rect()
         rect.y = rect.centery + 100
         rect.height = 30
         spacing = 40
+        if page_count > 1:
+            page_msg = 'Scores page %d of %d' % (page + 1, page_count)
+            game.font_mgr.draw(screen, game.fnt, 24, page_msg, rect.move(0, -spacing), gnppygame.WHITE, 'center',
+                               'center')
         # Current round length
         longest_round_msg = 'Round time: %.1f seconds' % self._last_round_time
         game.font_mgr.draw(screen, game.fnt, 24, longest_round_msg, rect, gnppygame.WHITE, 'center', 'center')
         # longest round length
         rect.move_ip(0, spacing)
         longest_round_players = self._max_round_time[1]
-        players = ', '.join([p.name for p in longest_round_players])
+        players = utils.names_summary([p.name for p in longest_round_players], CFG.Score.MaxNamesListed)
         longest_round_msg = 'Longest round: %.1f seconds by %s' % (self._max_round_time[0], players)
         game.font_mgr.draw(screen, game.fnt, 24, longest_round_msg, rect, gnppygame.WHITE, 'center', 'center')
         # current win streak
         rect.move_ip(0, spacing)
         win_streak = self._current_win_streak
-        plyrs = ','.join([p.name for p in win_streak[1]])
+        plyrs = utils.names_summary([p.name for p in win_streak[1]], CFG.Score.MaxNamesListed)
         streak_msg = 'Current win streak: %d by %s' % (win_streak[0], plyrs)
         game.font_mgr.draw(screen, game.fnt, 24, streak_msg, rect, gnppygame.WHITE, 'center', 'center')
         # longest win streak
         rect.move_ip(0, spacing)
         win_streak = self._max_win_streak
-        plyrs = ','.join([p.name for p in win_streak[1]])
+        plyrs = utils.names_summary([p.name for p in win_streak[1]], CFG.Score.MaxNamesListed)
         streak_msg = 'Longest win streak: %d by %s' % (win_streak[0], plyrs)
         game.font_mgr.draw(screen, game.fnt, 24, streak_msg, rect, gnppygame.WHITE, 'center', 'center')
+        # most kills (not shown until someone has a kill, or everyone would be tied for it)
+        most_kills = max([p.kills for p in self._player_list])
+        if most_kills > 0:
+            rect.move_ip(0, spacing)
+            plyrs = utils.names_summary([p.name for p in self._player_list if p.kills >= most_kills],
+                                        CFG.Score.MaxNamesListed)
+            kills_msg = 'Most kills: %d by %s' % (most_kills, plyrs)
+            game.font_mgr.draw(screen, game.fnt, 24, kills_msg, rect, gnppygame.WHITE, 'center', 'center')
 
 
 class Snake(object):
@@ -250,6 +291,10 @@ class Snake(object):
         wrap_offset = 16
         self.wrap_boundary = self.screen_rect.inflate(-wrap_offset, -wrap_offset)
         self.do_wrap = False
+        self.boundary = None
+        self.owner_map = None
+        self.owner_id = trails.NO_OWNER
+        self.killed_by = None
 
         self._start_direction = start_direction
         self.head_color = CFG.Snake.HeadColorIdx
@@ -276,6 +321,10 @@ class Snake(object):
         self._controller = None
         self._both_turn_callback = None
         self._turn_state_callback = None
+        self._timed_turns = []  # (fraction of the next step, turn state, stamp) to apply part way through the next step
+        self.latency_meter = None  # latency.LatencyMeter told when a stamped turn changes the turn state, or None
+        self._unseen_stamps = []  # stamps of turns made at the very end of the last step, not moved with yet
+        self.kill_cam = None  # killcam.KillCam told about everything the snake draws, or None
 
     def set_initial_speed(self, speed):
         self.vel = self._start_direction.Normalize() * speed
@@ -284,6 +333,28 @@ class Snake(object):
         """Set speed of snake after it has been created"""
         self.vel = self.vel.Normalize() * speed
 
+    _STATE_ATTRIBUTES = ('turning_dir', 'is_head_dimmed', '_drawing_gap', '_cur_length', 'draw_size', 'whisker_length',
+                         'gap_size', 'wall_size', 'turn_rate_left', 'turn_rate_right', 'head_color', 'head_color_dim',
+                         'do_wrap')
+    _STATE_VECTORS = ('pos', 'last_pos', 'vel', '_start_direction')
+
+    def get_state(self):
+        """Copy of everything about the snake that changes during a round (see set_state())"""
+        state = {name: getattr(self, name) for name in self._STATE_ATTRIBUTES}
+        for name in self._STATE_VECTORS:
+            vect = getattr(self, name)
+            state[name] = None if vect is None else (vect.x, vect.y)
+        state['_timed_turns'] = [(fraction, turn, None) for fraction, turn, _ in self._timed_turns]
+        return state
+
+    def set_state(self, state):
+        for name in self._STATE_ATTRIBUTES:
+            setattr(self, name, state[name])
+        for name in self._STATE_VECTORS:
+            vect = state[name]
+            setattr(self, name, None if vect is None else gnipMath.cVector2(vect[0], vect[1]))
+        self._timed_turns = list(state['_timed_turns'])
+
     def possessed_by(self, controller):
         assert self._controller is None, 'Trying to set the controller for a snake that already has one'
         self._controller = controller
@@ -292,17 +363,29 @@ class Snake(object):
         self.is_head_dimmed = is_dimmed
 
     def draw(self, game_surface):
+        """Draw the snake to the game surface and return the rect of the area that was touched"""
         if self._drawing_gap:
-            pygame.draw.circle(game_surface, self.background_color, self.last_pos.AsIntTuple(), self.draw_size)
+            dirty = self._stamp(game_surface, self.background_color, self.last_pos.AsIntTuple(), self.draw_size)
         else:
-            pygame.draw.circle(game_surface, self.body_color.idx, self.last_pos.AsIntTuple(), self.draw_size)
+            dirty = self._stamp(game_surface, self.body_color.idx, self.last_pos.AsIntTuple(), self.draw_size)
+        if self.owner_map is not None:
+            body_owner = trails.NO_OWNER if self._drawing_gap else self.owner_id
+            self.owner_map.stamp(self.last_pos.AsIntTuple(), self.draw_size, body_owner)
         # draw head if alive
         if not self.is_dead(game_surface):
             # Draw head one pixel smaller than body as I would see occasional times where the head wouldn't
             # be completely covered by the body, leaving intermittent white slivers. This was noticed in
             # the Indigestion game mode.
             head_color = self.head_color_dim if self.is_head_dimmed else self.head_color
-            pygame.draw.circle(game_surface, head_color, self.pos.AsIntTuple(), self.draw_size - 1)
+            dirty.union_ip(self._stamp(game_surface, head_color, self.pos.AsIntTuple(), self.draw_size - 1))
+            if self.owner_map is not None:
+                self.owner_map.stamp(self.pos.AsIntTuple(), self.draw_size - 1, self.owner_id)
+        return dirty
+
+    def _stamp(self, game_surface, color, pos, radius):
+        if self.kill_cam is not None:
+            self.kill_cam.add_stamp(pos, radius, color)
+        return chunks.draw_circle(game_surface, color, pos, radius)
 
     def make_explosion(self):
         return gnpparticle.Emitter(
@@ -329,13 +412,25 @@ class Snake(object):
                 self._drawing_gap = True
                 self._cur_length = 0.0
 
-        if self.turning_dir == self.LEFTTURN:
-            self.turn_left(time_delta)
-        if self.turning_dir == self.RIGHTTURN:
-            self.turn_right(time_delta)
-
         self.last_pos = self.pos
-        self.pos = self.pos + (self.vel * time_delta)
+        if self._unseen_stamps:
+            for stamp in self._unseen_stamps:
+                self.latency_meter.on_input_applied(stamp)
+            self._unseen_stamps = []
+        # move in pieces, changing the turn state between them at the point in the step where the input happened
+        done = 0.0
+        for fraction, turn, stamp in self._timed_turns:
+            self._move(time_delta * (fraction - done))
+            done = fraction
+            prev_turn = self.turning_dir
+            self.set_turn_state(turn)
+            if stamp is not None and self.latency_meter is not None and self.turning_dir != prev_turn:
+                if fraction < 1.0:
+                    self.latency_meter.on_input_applied(stamp)
+                else:
+                    self._unseen_stamps.append(stamp)  # the snake only moves with it from the next step on
+        self._timed_turns = []
+        self._move(time_delta * (1.0 - done))
 
         if self.do_wrap:
             if self.pos.x > self.wrap_boundary.right:
@@ -347,6 +442,18 @@ class Snake(object):
             elif self.pos.y < self.wrap_boundary.top:
                 self.pos = gnipMath.cVector2(self.pos.x, self.wrap_boundary.bottom)
 
+    def _move(self, time_delta):
+        if self.turning_dir == self.LEFTTURN:
+            self.turn_left(time_delta)
+        if self.turning_dir == self.RIGHTTURN:
+            self.turn_right(time_delta)
+        self.pos = self.pos + (self.vel * time_delta)
+
+    def queue_turn_state(self, turn, fraction, stamp=None):
+        """Set the turn state part way (fraction from 0.0 to 1.0, in increasing order) through the next step. stamp is
+        the (kind of device, time) of the input that caused it, for latency measurement."""
+        self._timed_turns.append((fraction, turn, stamp))
+
     def set_turn_state(self, turn):
         if self._turn_state_callback:
             result = self._turn_state_callback(self, turn)
@@ -371,31 +478,43 @@ class Snake(object):
     def register_both_turn_callback(self, callback):
         self._both_turn_callback = callback
 
+    def get_whisker_pos(self):
+        return self.pos + (self.vel.Normalize() * self.whisker_length)
+
     def get_color_under_whisker(self, screen):
-        whisker_pos = self.pos + (self.vel.Normalize() * self.whisker_length)
+        whisker_pos = self.get_whisker_pos()
         # TODO: OPTIMIZE: Run performance test to see if get_at_mapped is faster. right now I'm getting and comparing RGB values.
         return screen.get_at(whisker_pos.AsIntTuple())
 
     def get_color_under_robot_whisker(self, screen):
         whisker_pos = self.pos + (self.vel.Normalize() * self.robot_whisker_length)
-        whisker_pos = gnppygame.clamp_point_to_rect(whisker_pos.AsIntTuple(), game.get_screen_rect())
+        whisker_pos = gnppygame.clamp_point_to_rect(whisker_pos.AsIntTuple(), self.screen_rect)
         return screen.get_at(whisker_pos)
 
-    def get_color_under_near_right_robot_whisker(self, screen):
+    def get_near_right_robot_whisker_pos(self):
         vel = self.vel.Normalize() * (self.robot_whisker_length * 0.1)
         vel.Rotate(3.1415926 / 1.8)
-        whisker_pos = self.pos + vel
-        whisker_pos = gnppygame.clamp_point_to_rect(whisker_pos.AsIntTuple(), game.get_screen_rect())
-        return screen.get_at(whisker_pos)
+        return self.pos + vel
 
-    def get_color_under_near_left_robot_whisker(self, screen):
+    def get_near_left_robot_whisker_pos(self):
         vel = self.vel.Normalize()
         vel.Rotate(-3.1415926 / 1.8)
-        whisker_pos = self.pos + (vel * (self.robot_whisker_length * 0.1))
-        whisker_pos = gnppygame.clamp_point_to_rect(whisker_pos.AsIntTuple(), game.get_screen_rect())
+        return self.pos + (vel * (self.robot_whisker_length * 0.1))
+
+    def get_color_under_near_right_robot_whisker(self, screen):
+        whisker_pos = self.get_near_right_robot_whisker_pos()
+        whisker_pos = gnppygame.clamp_point_to_rect(whisker_pos.AsIntTuple(), self.screen_rect)
+        return screen.get_at(whisker_pos)
+
+    def get_color_under_near_left_robot_whisker(self, screen):
+        whisker_pos = self.get_near_left_robot_whisker_pos()
+        whisker_pos = gnppygame.clamp_point_to_rect(whisker_pos.AsIntTuple(), self.screen_rect)
         return screen.get_at(whisker_pos)
 
     def is_dead(self, game_surface):
+        # walls of the arena are answered analytically, only trails need to be sampled from the game surface
+        if self.boundary is not None and self.boundary.is_colliding(self.get_whisker_pos()):
+            return True
         try:
             return self.get_color_under_whisker(game_surface) != CFG.Win.BackgroundColorRGB
         except IndexError as e:
@@ -405,6 +524,188 @@ class Snake(object):
             return True
 
 
+KEYBOARD = 'keyboard'  # input device ids. Joysticks (and other devices) are their own device id.
+MOUSE = 'mouse'
+GAMEPAD = 'gamepad'  # kinds of device (see get_device_kind()) for joysticks and netinput.NetClients
+NETWORK = 'network'
+
+
+def get_device_kind(device):
+    """Kind of device (KEYBOARD, MOUSE, GAMEPAD or NETWORK) for a device id"""
+    if device in (KEYBOARD, MOUSE):
+        return device
+    return NETWORK if isinstance(device, netinput.NetClient) else GAMEPAD
+
+
+def get_button_dispatch_key(button, is_hold=False):
+    """(event type, device id, button) of the event for pressing (or holding) a (device, button). Joysticks are
+    identified by their joystick id, like they are in pygame events. A hold has the event type (HOLD, original type)."""
+    device, idx = button
+    if device == KEYBOARD:
+        event_type, device_id = pygame.KEYDOWN, KEYBOARD
+    elif device == MOUSE:
+        event_type, device_id = pygame.MOUSEBUTTONDOWN, MOUSE
+    elif isinstance(device, netinput.NetClient):
+        event_type, device_id = netinput.NETBUTTONDOWN, device.client_id
+    else:
+        event_type, device_id = pygame.JOYBUTTONDOWN, device._joy.get_id()
+    if is_hold:
+        event_type = (gnpinput.HOLD, event_type)
+    return event_type, device_id, idx
+
+
+def get_event_dispatch_key(event):
+    """(event type, device id, button) of a button press or hold event, in the form of get_button_dispatch_key(), or
+    None for any other event"""
+    event_type = event.type
+    if event_type == gnpinput.HOLD:
+        event_type = event.origtype
+    if event_type == pygame.KEYDOWN:
+        key = (event_type, KEYBOARD, event.key)
+    elif event_type == pygame.MOUSEBUTTONDOWN:
+        key = (event_type, MOUSE, event.button)
+    elif event_type == pygame.JOYBUTTONDOWN:
+        key = (event_type, event.joyid if event.type == gnpinput.HOLD else event.joy, event.button)
+    elif event_type == netinput.NETBUTTONDOWN:
+        key = (event_type, event.client, event.button)
+    else:
+        return None
+    if event.type == gnpinput.HOLD:
+        key = ((gnpinput.HOLD, key[0]),) + key[1:]
+    return key
+
+
+class InputSnapshot(object):
+    """State of the buttons the players use, captured once per tick so everyone resolves against the same input"""
+
+    def __init__(self, pressed):
+        self._pressed = pressed  # (device, button) -> is pressed
+
+    def is_pressed(self, button):
+        return self._pressed.get(button, False)
+
+    @staticmethod
+    def capture(buttons):
+        """Sample the given (device, button) pairs. Each kind of device is read once no matter how many players use it.
+        Devices other than KEYBOARD and MOUSE must have a get_button(button) method."""
+        pressed = {}
+        keys = None
+        mouse = None
+        for button in buttons:
+            device, idx = button
+            if device == KEYBOARD:
+                if keys is None:
+                    keys = pygame.key.get_pressed()
+                pressed[button] = keys[idx]
+            elif device == MOUSE:
+                if mouse is None:
+                    mouse = pygame.mouse.get_pressed()
+                pressed[button] = mouse[idx - 1]
+            else:
+                pressed[button] = device.get_button(idx)
+        return InputSnapshot(pressed)
+
+
+class InputDispatcher(object):
+    """Captures one InputSnapshot per tick and hands it to every controller.
+
+    Button events are also drained from the pygame event queue, and stamped with the time they were drained, every
+    time poll() is called. Polling a few times a frame (not just when the tick starts) lets input() tell each
+    controller where in the tick its buttons changed, so turns can start and stop part way through a step. Events
+    drained when the tick starts came in at some unknown point while waiting for it, so they take effect at its start,
+    the way they always have."""
+    _EVENT_TYPES = (pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.JOYBUTTONDOWN,
+                    pygame.JOYBUTTONUP, netinput.NETBUTTONDOWN, netinput.NETBUTTONUP)
+    FRACTION_STEPS = 255  # where in the tick a button changed is rounded to this many steps, so replays can store it
+
+    def __init__(self, controllers, injector=None):
+        self._controllers = list(controllers)
+        self._injector = injector  # latency.SyntheticInput whose buttons count as pressed, or None
+        buttons = []
+        for controller in self._controllers:
+            buttons.extend(controller._input_config.get_buttons())
+        self._buttons = list(dict.fromkeys(buttons))  # unique, in a stable order
+        self._joys = {}  # joystick id -> device
+        self._net_clients = {}  # network client id -> device
+        for device, _ in self._buttons:
+            if isinstance(device, netinput.NetClient):
+                self._net_clients[device.client_id] = device
+            elif device not in (KEYBOARD, MOUSE):
+                self._joys[device._joy.get_id()] = device
+        self._events = []  # (time, (device, button), is_pressed, is_timed) drained since the last input()
+        self.sub_frame = CFG.Input.SubFrameTurns
+        self._snapshot = None
+        self._last_input_time = time.perf_counter()
+
+    def capture(self):
+        snapshot = InputSnapshot.capture(self._buttons)
+        if self._injector is not None:
+            for button in self._buttons:
+                if self._injector.is_pressed(button):
+                    snapshot._pressed[button] = True
+        return snapshot
+
+    def get_event_button(self, event):
+        """Return the (device, button) a pygame button event is for, or None"""
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+            return KEYBOARD, event.key
+        elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            return MOUSE, event.button
+        elif event.type in (netinput.NETBUTTONDOWN, netinput.NETBUTTONUP):
+            if event.client in self._net_clients:
+                return self._net_clients[event.client], event.button
+        elif event.joy in self._joys:
+            return self._joys[event.joy], event.button
+        return None
+
+    def poll(self, is_timed=True):
+        """Drain the button events that players are using from the event queue, and note when they were seen. Events
+        that aren't timed take effect at the start of the next tick."""
+        now = time.perf_counter()
+        for event in pygame.event.get(self._EVENT_TYPES):
+            button = self.get_event_button(event)
+            if button is not None and button in self._buttons:
+                is_pressed = event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.JOYBUTTONDOWN,
+                                            netinput.NETBUTTONDOWN)
+                self._events.append((getattr(event, 'input_time', now), button, is_pressed, is_timed))
+            else:
+                pygame.event.post(event)  # not ours, leave it for whoever else reads the queue
+
+    def input(self, is_stepping=False):
+        """Hand this tick's input to every controller. If the snakes are stepping this tick, the button changes since
+        the last tick are also handed over, as (fraction of the tick, turn state, stamp) tuples. Changes are placed at
+        the start of the tick (fraction 0.0) unless sub_frame is set and they were drained by a poll() between ticks.
+        The stamp is (kind of device, time of the input), for latency measurement."""
+        self.poll(False)
+        snapshot = self.capture()
+        now = time.perf_counter()
+        tick_length = now - self._last_input_time
+        for controller in self._controllers:
+            timed_turns = []
+            if is_stepping and self._snapshot is not None and self._events:
+                left_button, right_button = controller._input_config.get_buttons()
+                pressed = {left_button: self._snapshot.is_pressed(left_button),
+                           right_button: self._snapshot.is_pressed(right_button)}
+                for event_time, button, is_pressed, is_timed in self._events:
+                    if button in pressed:
+                        pressed[button] = is_pressed
+                        fraction = 0.0
+                        if self.sub_frame and is_timed and tick_length > 0:
+                            fraction = min(max((event_time - self._last_input_time) / tick_length, 0.0), 1.0)
+                            fraction = round(fraction * self.FRACTION_STEPS) / float(self.FRACTION_STEPS)
+                        turn = InputConfig.resolve(pressed[left_button], pressed[right_button])
+                        timed_turns.append((fraction, turn, (get_device_kind(button[0]), event_time)))
+                # a change placed at the start of the tick came after the ones before it, so they can't be later
+                for idx in range(len(timed_turns) - 2, -1, -1):
+                    if timed_turns[idx][0] > timed_turns[idx + 1][0]:
+                        timed_turns[idx] = (timed_turns[idx + 1][0],) + timed_turns[idx][1:]
+            controller.input(snapshot, timed_turns)
+        self._events = []
+        self._snapshot = snapshot
+        self._last_input_time = now
+        return snapshot
+
+
 class InputConfig(object):
     """for player checkin screen, watches different types of input and generates generic actions"""
     TURN_LEFT = 1
@@ -415,14 +716,42 @@ class InputConfig(object):
     def __init__(self):
         raise NotImplementedError
 
-    def input(self):
-        """Input routine for game. Polls state of input each frame of the game."""
+    def get_buttons(self):
+        """Return the ((device, button), (device, button)) pair used to turn left and right"""
         raise NotImplementedError
 
+    def input(self, snapshot=None):
+        """Input routine for game. Resolves the state of this config's buttons from the tick's InputSnapshot (or
+        samples them directly, if there isn't one) and returns left, right, both or None."""
+        left_button, right_button = self.get_buttons()
+        if snapshot is None:
+            snapshot = InputSnapshot.capture((left_button, right_button))
+        return self.resolve(snapshot.is_pressed(left_button), snapshot.is_pressed(right_button))
+
+    @classmethod
+    def resolve(cls, left_pressed, right_pressed):
+        """Turn state for the given button states"""
+        if left_pressed and right_pressed:
+            return cls.BOTH_TURN
+        elif left_pressed:
+            return cls.TURN_LEFT
+        elif right_pressed:
+            return cls.TURN_RIGHT
+        return None
+
     def parse_event(self, event):
         """Input routine for player registration UI. Processes input queue for events."""
         raise NotImplementedError
 
+    def get_dispatch_keys(self):
+        """Return the (dispatch key, action) pairs for every event that parse_event() acts on, where the keys are from
+        get_button_dispatch_key(). Lets the registration screen find the player an event is for with one lookup."""
+        left_button, right_button = self.get_buttons()
+        return [(get_button_dispatch_key(left_button), self.TURN_LEFT),
+                (get_button_dispatch_key(right_button), self.TURN_RIGHT),
+                (get_button_dispatch_key(left_button, True), self.REMOVE_PLAYER),
+                (get_button_dispatch_key(right_button, True), self.REMOVE_PLAYER)]
+
     def __str__(self):
         raise NotImplementedError
 
@@ -433,18 +762,8 @@ class KeyboardInputConfig(InputConfig):
         self._key_left = key_left
         self._key_right = key_right
 
-    def input(self):
-        """Reads pygame input system and returns left, right, None"""
-        left_pressed = pygame.key.get_pressed()[self._key_left]
-        right_pressed = pygame.key.get_pressed()[self._key_right]
-        if left_pressed and right_pressed:
-            return self.BOTH_TURN
-        elif left_pressed:
-            return self.TURN_LEFT
-        elif right_pressed:
-            return self.TURN_RIGHT
-        else:
-            return None
+    def get_buttons(self):
+        return (KEYBOARD, self._key_left), (KEYBOARD, self._key_right)
 
     def parse_event(self, event):
         """Given a pygame event, return whether this input config handles it. If this event doesn't apply, return None."""
@@ -472,15 +791,8 @@ class MouseInputConfig(InputConfig):
     def __init__(self, name):
         self.name = name
 
-    def input(self):
-        btn_left, btn_ctr, btn_right = pygame.mouse.get_pressed()
-        if btn_left and btn_right:
-            return self.BOTH_TURN
-        elif btn_left:
-            return self.TURN_LEFT
-        elif btn_right:
-            return self.TURN_RIGHT
-        return None
+    def get_buttons(self):
+        return (MOUSE, self._LEFT_BTN), (MOUSE, self._RIGHT_BTN)
 
     def parse_event(self, event):
         """Given a pygame event, return whether this input config handles it. If this event doesn't apply, return None."""
@@ -507,15 +819,9 @@ class JoystickInputConfig(InputConfig):
         """Generate ID used for pickling"""
         return '%s - %s' % (self.name, self._joy._joy.get_name())
 
-    def input(self):
+    def get_buttons(self):
         btn_left, btn_right = self._button_idx_pair
-        if self._joy.get_button(btn_left) and self._joy.get_button(btn_right):
-            return self.BOTH_TURN
-        elif self._joy.get_button(btn_left):
-            return self.TURN_LEFT
-        elif self._joy.get_button(btn_right):
-            return self.TURN_RIGHT
-        return None
+        return (self._joy, btn_left), (self._joy, btn_right)
 
     def parse_event(self, event):
         """Given pygame event, return action to take. If this input config doesn't handle event, return None."""
@@ -533,6 +839,47 @@ class JoystickInputConfig(InputConfig):
         return None
 
 
+class NetworkInputConfig(InputConfig):
+    """Left/right buttons of a player's device on the local network (see netinput)"""
+
+    def __init__(self, name, client):
+        self.name = name
+        self._client = client
+
+    def get_buttons(self):
+        return (self._client, netinput.LEFT_BUTTON), (self._client, netinput.RIGHT_BUTTON)
+
+    def parse_event(self, event):
+        """Given pygame event, return action to take. If this input config doesn't handle event, return None."""
+        if event.type == netinput.NETBUTTONDOWN and event.client == self._client.client_id:
+            if event.button == netinput.LEFT_BUTTON:
+                return self.TURN_LEFT
+            elif event.button == netinput.RIGHT_BUTTON:
+                return self.TURN_RIGHT
+        return None
+
+
+class NetplayInputConfig(InputConfig):
+    """Input of a player in a netplay match, local or remote: what the lockstep session says they pressed this tick"""
+
+    def __init__(self, name, session, player_idx):
+        self.name = name
+        self._session = session
+        self._player_idx = player_idx
+
+    def get_buttons(self):
+        return ()
+
+    def get_dispatch_keys(self):
+        return []
+
+    def input(self, snapshot=None):
+        return self._session.get_turn(self._player_idx)
+
+    def parse_event(self, event):
+        return None
+
+
 class Controller(object):
     def __init__(self, name, color, index):
         self._name = name
@@ -549,18 +896,51 @@ class PlayerController(Controller):
     def __init__(self, name, color, index, input_map):
         Controller.__init__(self, name, color, index)
         self._input_config = input_map
+        self.last_turns = (None, ())  # (turn state, timed turns) last handed to the snake
 
     def possess(self, snake):
         self._snake = snake
         self._snake.possessed_by(self)
 
-    def input(self):
-        input_result = self._input_config.input()
-        self._snake.set_turn_state(input_result)
+    def input(self, snapshot=None, timed_turns=()):
+        """Set the turn state of the snake from the input. Changes in timed_turns ((fraction, turn state, stamp) tuples)
+        are applied part way through the next step, and the turn state in the snapshot at the end of it."""
+        self.apply_turns(self._input_config.input(snapshot), timed_turns)
+
+    def apply_turns(self, turn, timed_turns=()):
+        """Hand turn states to the snake: the ones in timed_turns part way through the next step, then turn"""
+        self.last_turns = (turn, timed_turns)  # for replay recording
+        if timed_turns:
+            for fraction, timed_turn, stamp in timed_turns:
+                self._snake.queue_turn_state(timed_turn, fraction, stamp)
+            self._snake.queue_turn_state(turn, 1.0)
+        else:
+            self._snake.set_turn_state(turn)
+
+
+_player_colors = None
+
+
+def get_player_color_indices(count):
+    """Palette indices for player colors: everything from FirstColorIdx up, then the indices below the static colors"""
+    indices = list(range(CFG.Win.FirstColorIdx, 256)) + list(range(0, CFG.Win.BackgroundColorIdx))
+    assert count <= len(indices), 'Only %d player colors fit in the palette. Asked for %d.' % (len(indices), count)
+    return indices[:count]
+
+
+def get_player_colors():
+    """All of the colors players can choose from, each with its own palette index (see settings.Player.ExpandedMode)"""
+    global _player_colors
+    if _player_colors is None:
+        rgbs = list(CFG.Player.Colors)
+        if CFG.Player.ExpandedMode and CFG.Player.ExpandedColorCount > len(rgbs):
+            rgbs += utils.make_distinct_colors(CFG.Player.ExpandedColorCount - len(rgbs), rgbs)
+        _player_colors = [ColorIdxAndRGB(idx, rgb) for idx, rgb in zip(get_player_color_indices(len(rgbs)), rgbs)]
+    return _player_colors
 
 
 def make_palette(colors):
-    '''Generate a palette for the 8-bit color game surface'''
+    '''Generate a palette for the 8-bit color game surface from a list of ColorIdxAndRGB player colors'''
     pal = [(0, 255, 0)] * 256  # bright green for unused colors
     idx = 100  # starting index
     # add static colors
@@ -577,8 +957,7 @@ def make_palette(colors):
     # add player colors (dynamic-ish)
     assert idx == CFG.Win.FirstColorIdx
     for color in colors:
-        pal[idx] = color
-        idx += 1
+        pal[color.idx] = color.rgb
     # asserts for sanity checks on values in settings.py
     assert pal[CFG.Win.BackgroundColorIdx] == CFG.Win.BackgroundColorRGB
     assert pal[CFG.Win.BorderColorIdx] == CFG.Win.BorderColorRGB
@@ -601,7 +980,8 @@ class HitSpacebarToContinueState(gnppygame.GameState):
         pass
 
     def input(self):
-        if pygame.key.get_pressed()[pygame.K_SPACE]:
+        session = self.owner().netplay
+        if session.is_continue_pressed() if session is not None else pygame.key.get_pressed()[pygame.K_SPACE]:
             self.goto_next_state()
 
     def step(self, time_delta):
@@ -638,13 +1018,19 @@ class PlayerRegistrationState(gnppygame.GameState):
         gnppygame.GameState.__init__(self, owner)
 
         self.names = Nexter(CFG.Player.Names)
-        colors = [ColorIdxAndRGB(idx + CFG.Win.FirstColorIdx, color) for idx, color in enumerate(CFG.Player.Colors)]
-        self.colors = Nexter(colors)
-        self._dark_rect = gnpactor.AlphaRect(self.owner().get_screen_rect().inflate(-200, -20), (0, 0, 0, 220))
+        self.colors = Nexter(get_player_colors())
+        self._list_rect = self.owner().get_screen_rect().inflate(-200, -20)
+        self._dark_rect = gnpactor.AlphaRect(self._list_rect, (0, 0, 0, 220))
         self._actors = gnppygame.ActorList()
 
         pygame.event.pump()
         pygame.event.clear()
+        self._reserved_keys = {pygame.K_SPACE, pygame.K_F5, pygame.K_ESCAPE}
+        if CFG.Snapshot.On:
+            self._reserved_keys.update(pygame.key.key_code(name) for name in (
+                CFG.Snapshot.SaveKey, CFG.Snapshot.RestoreKey, CFG.Snapshot.WriteKey, CFG.Snapshot.RematchKey))
+        if CFG.Capture.On:
+            self._reserved_keys.add(pygame.key.key_code(CFG.Capture.ToggleKey))
 
         self.hold_watcher = gnpinput.HoldWatcher()
         axis_counts = [j._joy.get_numaxes() for j in self.owner().joys if j is not None]
@@ -666,6 +1052,10 @@ class PlayerRegistrationState(gnppygame.GameState):
         # start registration "script"
         self.header = ''
         self.script = self.registration_script()
+        self._dispatch_index = None  # dispatch key -> (controller, action), see InputConfig.get_dispatch_keys()
+        self._indexed_controllers = None  # the controllers the dispatch index was built for
+        self._registered_joy_ids = set()
+        self._registered_net_ids = set()
         self.script.send(None)  # give script a chance to init itself
 
         self.enable_input = False
@@ -725,10 +1115,16 @@ class PlayerRegistrationState(gnppygame.GameState):
             pygame.event.get()  # consume events in event queue
 
         dirty = False
+        now = time.perf_counter()
+        meter = self.owner().latency_meter
+        echo = CFG.Debug.EchoEvents
+        if self._indexed_controllers != self.owner()._controllers:
+            self._dispatch_index = None
         events = self.hold_watcher.get(pygame.event.get(), time_delta)
         events = self.joy_watcher.get(events)
         for e in events:
-            if e.type != pygame.JOYAXISMOTION: print('EVENT:', e)
+            if echo and e.type != pygame.JOYAXISMOTION:
+                print('EVENT:', e)
             if e.type == pygame.KEYDOWN and e.key == pygame.K_F5:
                 # don't delete player while a new registration is taking place
                 if not self.player_registration_in_flight:
@@ -737,40 +1133,47 @@ class PlayerRegistrationState(gnppygame.GameState):
                     ctrls = self.owner()._controllers
                     if len(ctrls) > 0:
                         ctrls.pop(len(ctrls) - 1)
+                        self._dispatch_index = None
                     continue  # prevent "else" clause below from handling F5 event
             if e.type == pygame.KEYDOWN and e.key == pygame.K_SPACE and self.can_start_game():
                 self.start_game()
             else:
-                # do not allow SPACE or F5 to be used for player input
-                if e.type == pygame.KEYDOWN and e.key in (pygame.K_SPACE, pygame.K_F5, pygame.K_ESCAPE):
+                # do not allow SPACE, F5 or the snapshot and capture keys to be used for player input
+                if e.type == pygame.KEYDOWN and e.key in self._reserved_keys:
                     self.owner().audio_mgr.play('HAMMER')
                     continue
 
                 # handle input of players who are already registered
-                for controller in self.owner()._controllers:
+                key = get_event_dispatch_key(e)
+                handler = self._get_dispatch_index().get(key) if key is not None else None
+                if handler is not None:
+                    controller, result = handler
                     input_config = controller._input_config
-                    result = input_config.parse_event(e)
-                    if result is not None:
-                        if result == InputConfig.TURN_LEFT:
-                            self.owner().audio_mgr.play('start')
-                            controller._name = self.names.get_next(controller._name)
-                            dirty = True
-                        elif result == InputConfig.TURN_RIGHT:
-                            self.owner().audio_mgr.play('start')
-                            controller._color = self.colors.get_next(controller._color)
-                            dirty = True
-                        elif result == InputConfig.REMOVE_PLAYER:
-                            self.owner().audio_mgr.play('HAMMER')
-                            print('removing %s via %s' % (controller._name, input_config.name))
-                            self.owner()._controllers.remove(controller)
-                            dirty = True
-                        break
-                else:  # else clause on for loop is executed when no "break" statement was encountered
+                    if meter is not None and result in (InputConfig.TURN_LEFT, InputConfig.TURN_RIGHT):
+                        device = input_config.get_buttons()[0][0]
+                        meter.on_input_applied((get_device_kind(device), getattr(e, 'input_time', now)))
+                    if result == InputConfig.TURN_LEFT:
+                        self.owner().audio_mgr.play('start')
+                        controller._name = self.names.get_next(controller._name)
+                        dirty = True
+                    elif result == InputConfig.TURN_RIGHT:
+                        self.owner().audio_mgr.play('start')
+                        controller._color = self.colors.get_next(controller._color)
+                        dirty = True
+                    elif result == InputConfig.REMOVE_PLAYER:
+                        self.owner().audio_mgr.play('HAMMER')
+                        print('removing %s via %s' % (controller._name, input_config.name))
+                        self.owner()._controllers.remove(controller)
+                        self._dispatch_index = None
+                        dirty = True
+                else:
                     # advance "register new players" input handler script
                     self.script.send(e)
+                    if self._indexed_controllers != self.owner()._controllers:
+                        self._dispatch_index = None  # the script registered a new player
                     dirty = True
 
-        if dirty:
+        if dirty and echo:
             print('-' * 20, 'Press button or move stick that you want to use for input')
             for c in self.owner()._controllers:
                 print(c._name, c._color, c._input_config.name)
@@ -782,6 +1185,8 @@ class PlayerRegistrationState(gnppygame.GameState):
         # now that the player list is set, set controller indexes
         for idx, c in enumerate(self.owner()._controllers):
             c._index = idx
+        if CFG.Netplay.On:
+            self.owner().begin_netplay()
         pygame.event.set_blocked(pygame.JOYAXISMOTION)
         self.owner().init_scoreboard()
         self.goto_next_state()
@@ -791,6 +1196,9 @@ class PlayerRegistrationState(gnppygame.GameState):
         font_mgr = self.owner().font_mgr
         if len(controllers) > 0:
             self._dark_rect.draw(surface)
+        if len(controllers) > 13:
+            self._draw_player_grid(surface, controllers)
+            return
         x = 150
         if len(controllers) < 7:
             y, y_delta = (50, 80)
@@ -807,6 +1215,21 @@ class PlayerRegistrationState(gnppygame.GameState):
             font_mgr.draw(surface, self.owner().fnt, 24, c._input_config.name, (x + 700, y + 20), c._color.rgb)
             y += y_delta
 
+    def _draw_player_grid(self, surface, controllers):
+        """Compact player list for big games: columns of small rows, as many columns as needed"""
+        font_mgr = self.owner().font_mgr
+        rect = self._list_rect
+        rows = CFG.Player.RegistrationListRows
+        cols = (len(controllers) + rows - 1) // rows
+        col_width = rect.width // cols
+        y_delta = (rect.height - 40) // rows
+        for idx, c in enumerate(controllers):
+            x = rect.left + 10 + (idx // rows) * col_width
+            y = rect.top + 10 + (idx % rows) * y_delta
+            pygame.draw.rect(surface, c._color.rgb, pygame.Rect(x, y + 6, 16, 16), 0)
+            label = c._name if col_width < 400 else '%s - %s' % (c._name, c._input_config.name)
+            font_mgr.draw(surface, self.owner().fnt, 24, label, (x + 24, y), c._color.rgb)
+
     def step(self, time_delta):
         self._actors.step(time_delta)
         if CFG.Debug.On:
@@ -828,6 +1251,9 @@ class PlayerRegistrationState(gnppygame.GameState):
             self.input(time_delta)
 
             s = pygame.display.get_surface()
+            meter = self.owner().latency_meter
+            if meter is not None:
+                meter.on_frame_drawn()
             if self.enable_input:
                 self.draw_player_list(s)
                 self.draw_player_instructions()
@@ -835,6 +1261,23 @@ class PlayerRegistrationState(gnppygame.GameState):
                 self.owner().font_mgr.draw(s, self.owner().fnt, 24, self.header, self.owner().get_screen_rect(),
                                            GLOBAL_RED, 'center', 'top')
             pygame.display.update()
+            if meter is not None:
+                meter.on_frame_presented()
+
+    def _get_dispatch_index(self):
+        """Map of dispatch key -> (controller, action) for the registered players. Rebuilt when the players change."""
+        if self._dispatch_index is None:
+            controllers = self.owner()._controllers
+            self._dispatch_index = {}
+            for controller in controllers:
+                for key, action in controller._input_config.get_dispatch_keys():
+                    self._dispatch_index.setdefault(key, (controller, action))  # first player wins, like parse_event()
+            self._registered_joy_ids = {c._input_config._joy._joy.get_id() for c in controllers if
+                                        isinstance(c._input_config, JoystickInputConfig)}
+            self._registered_net_ids = {c._input_config._client.client_id for c in controllers if
+                                        isinstance(c._input_config, NetworkInputConfig)}
+            self._indexed_controllers = list(controllers)
+        return self._dispatch_index
 
     def is_event_for_joy_that_is_alrady_registered(self, event):
         if not CFG.Input.OnePlayerPerJoy:
@@ -843,9 +1286,14 @@ class PlayerRegistrationState(gnppygame.GameState):
         if event.type != pygame.JOYBUTTONDOWN:
             return False
 
-        used_joy_ids = {c._input_config._joy._joy.get_id() for c in self.owner()._controllers if
-                        isinstance(c._input_config, JoystickInputConfig)}
-        return event.joy in used_joy_ids
+        self._get_dispatch_index()
+        return event.joy in self._registered_joy_ids
+
+    def is_event_for_net_client_that_is_already_registered(self, event):
+        if event.type != netinput.NETBUTTONDOWN:
+            return False
+        self._get_dispatch_index()
+        return event.client in self._registered_net_ids
 
     def registration_script(self):
         """Coroutine-based "script" that asynchronously drives player checkin and input config"""
@@ -856,8 +1304,18 @@ class PlayerRegistrationState(gnppygame.GameState):
             self.header = 'To add a new player, start by pressing a button to be their LEFT control.'
 
             event = yield from wait_until(lambda evt: evt and evt.type in (
-                pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.JOYBUTTONDOWN)
-                                                      and not self.is_event_for_joy_that_is_alrady_registered(evt))
+                pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.JOYBUTTONDOWN, netinput.NETBUTTONDOWN)
+                                                      and not self.is_event_for_joy_that_is_alrady_registered(evt)
+                                                      and not self.is_event_for_net_client_that_is_already_registered(evt))
+            if event.type == netinput.NETBUTTONDOWN:
+                # a network device only has the two buttons, so there's no need to ask which is which
+                self.owner().audio_mgr.play('Blip')
+                client = self.owner().net_server.get_client(event.client)
+                input_cfg = NetworkInputConfig(f'Phone #{client.client_id} - {client.address[0]}', client)
+                self.owner()._controllers.append(
+                    PlayerController(self.names.get_random(), self._select_new_player_color(), None, input_cfg))
+                yield  # consume the event that was handled above by yielding control
+                continue
             self.player_registration_in_flight = True
             self.owner().audio_mgr.play('start')
             joy_msg = ''
@@ -983,6 +1441,13 @@ class ShowScoreState(HitSpacebarToContinueState):
     def begin_state(self):
         print('entered ShowScoreState')
         HitSpacebarToContinueState.begin_state(self)
+        self._kill_cam = self.prevState.kill_cam
+        if self._kill_cam is not None and self._kill_cam.start_playback(self.prevState.game_surface):
+            self.prevState.actors = gnppygame.ActorList()  # the explosions happen again in the replay
+        else:
+            self._kill_cam = None
+        if self.can_rematch():
+            self.take_rematch_press()  # a press left over from the round isn't asking for a rematch
 
     def step_and_draw_scoreboard(self, time_delta, surface):
         self._screen_fader = gnppygame.ScreenFader(surface.get_rect().size, gnppygame.BLACK, 0, 140, 140)
@@ -993,9 +1458,45 @@ class ShowScoreState(HitSpacebarToContinueState):
     def goto_next_state(self):
         self.change_state(self.owner().make_next_round())
 
+    def can_rematch(self):
+        return self.prevState.start_snapshot is not None and self.owner().netplay is None
+
+    def take_rematch_press(self):
+        """True if settings.Snapshot.RematchKey went down since the last call. Other key presses are left on the queue."""
+        rematch_key = pygame.key.key_code(CFG.Snapshot.RematchKey)
+        is_pressed = False
+        for event in pygame.event.get(pygame.KEYDOWN):
+            if event.key == rematch_key:
+                is_pressed = True
+            else:
+                pygame.event.post(event)  # not ours, leave it for whoever else reads the queue
+        return is_pressed
+
+    def input(self):
+        if self.can_rematch() and self.take_rematch_press():
+            # rematch: the round starts over as if it hadn't been played (scores included)
+            snap = self.prevState.start_snapshot
+            print('Rematch of round %d' % (snap.round_idx + 1))
+            self.owner().round_idx = snap.round_idx
+            self.change_state(self.owner().make_round_from_snapshot(snap))
+            return
+        HitSpacebarToContinueState.input(self)
+
+    def draw_kill_cam_text(self, surface):
+        self.owner().font_mgr.draw(surface, self.owner().fnt, 36, 'Kill Cam', self.owner().get_playfield_rect(),
+                                   gnppygame.WHITE, 'center', 'top')
+
     def step(self, time_delta):
-        display = pygame.display.get_surface()
-        self.prevState.actors.step(time_delta)  # breach of encapsulation to draw explosion effects after round is over
-        self.prevState.draw(display)
-        self.step_and_draw_scoreboard(time_delta, display)
+        frame = self.owner().get_frame_surface()
+        if self._kill_cam is not None and self._kill_cam.is_playing():
+            # replay the end of the round in slow motion before showing the scores
+            self._kill_cam.step(time_delta, self.prevState.game_surface, self.prevState.actors)
+            self.prevState.actors.step(time_delta * CFG.KillCam.SlowMotion)
+            self.prevState.draw(frame)
+            self.draw_kill_cam_text(frame)
+        else:
+            self.prevState.actors.step(time_delta)  # breach of encapsulation to draw explosion effects after round is over
+            self.prevState.draw(frame)
+            self.step_and_draw_scoreboard(time_delta, frame)
+        self.owner().present_frame(frame)
         HitSpacebarToContinueState.step(self, time_delta)
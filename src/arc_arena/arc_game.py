@@ -1,4 +1,5 @@
 import sys
+import time
 from pathlib import Path
 import pygame
 import pygame.constants
@@ -9,6 +10,14 @@ from arc_arena import arc_core
 from arc_arena import settings
 from arc_arena import backgrounds
 from arc_arena import round
+from arc_arena import latency
+from arc_arena import netinput
+from arc_arena import netplay
+from arc_arena import replay
+from arc_arena import snapshot
+from arc_arena import capture
+from arc_arena import statefeed
+from arc_arena import utils
 import traceback
 
 
@@ -34,8 +43,27 @@ class ArcGame(gnppygame.GameWithStates):
         event_types = (gnpinput.HOLD, gnpinput.AXISPRESS, gnpinput.AXISRELEASE, pygame.USEREVENT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.KEYUP, pygame.MOUSEBUTTONUP, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYAXISMOTION)
         pygame.event.set_allowed(event_types)  # set_allowed is additive
 
+        # everything random that decides what happens in a match draws from this, so netplay instances can agree
+        self.rng = random.Random()
+        self.background_rng = random.Random()  # for looks only, so drawing backgrounds doesn't change what happens
+        self.netplay = None  # netplay.LockstepSession while playing a netplay match
+        self.round_seed = None  # seed for the next round instead of one from rng (ex: to play back a replay)
+        self.headless = False  # True to simulate rounds without drawing them (see playback.py)
+        self.snapshot = None  # snapshot.RoundSnapshot saved with settings.Snapshot.SaveKey
+        self.capture = None  # capture.FrameCapture while capturing the display (settings.Capture.ToggleKey)
+        self._is_capture_key_down = False
+        self.frame_publisher = None  # shmframes.FramePublisher, with settings.SharedFrames.On
+        if CFG.SharedFrames.On:
+            from arc_arena import shmframes
+            self.frame_publisher = shmframes.FramePublisher(CFG.SharedFrames.Name, pygame.display.get_surface(),
+                                                            CFG.SharedFrames.Slots)
+        self.state_feed = None  # statefeed.StateFeedWriter, with settings.StateFeed.On
+        if CFG.StateFeed.On:
+            self.state_feed = statefeed.StateFeedWriter(CFG.StateFeed.Filename, CFG.StateFeed.PlayerSlots)
+
         # graphics
-        self.palette = arc_core.make_palette(CFG.Player.Colors)
+        self.palette = arc_core.make_palette(arc_core.get_player_colors())
+        self._frame = None  # playfield sized surface, used when the display is a different size
 
         # backgrounds
         background_draw_functs = [
@@ -51,10 +79,19 @@ class ArcGame(gnppygame.GameWithStates):
             backgrounds.draw_horiz_lines,
         ]
         if CFG.Background.RandomizeOrder:
-            self.background_chooser = gnppygame.random_no_repeat(background_draw_functs)
+            self.background_chooser = utils.random_no_repeat(background_draw_functs, self.background_rng)
         else:
             self.background_chooser = gnppygame.cycle_through_items(background_draw_functs)
 
+        # latency measurement
+        self.latency_meter = None
+        if CFG.Latency.On:
+            self.latency_meter = latency.LatencyMeter(CFG.Latency.HistogramBucketMs, CFG.Latency.HistogramBuckets)
+        self.input_injector = None
+        if CFG.Latency.SyntheticInput:
+            self.input_injector = latency.SyntheticInput(CFG.Latency.SyntheticPressRate, CFG.Latency.SyntheticHoldMin,
+                                                         CFG.Latency.SyntheticHoldMax)
+
         # joysticks
         self.joys = [gnppygame.Joy.joy_factory(i) for i in range(CFG.Input.JoyCountMax)]
         for joy in self.joys:
@@ -62,10 +99,16 @@ class ArcGame(gnppygame.GameWithStates):
                 joy.set_deadzone(CFG.Input.JoyDeadzone)
         print('Found %d total joystick(s)' % len([j for j in self.joys if j is not None]))
 
+        # controllers on the local network
+        self.net_server = None
+        if CFG.NetInput.On:
+            self.net_server = netinput.NetInputServer(CFG.NetInput.Host, CFG.NetInput.Port)
+            self.net_server.start()
+
         # player and AI controllers
         if not CFG.Debug.On:
             try:
-                self._controllers = arc_core.load_player_controllers(self.joys)
+                self._controllers = arc_core.load_player_controllers(self.joys, self.net_server)
             except Exception as e:
                 print('WARNING: Problem loading previous player list from %s. Exception: %s' % (CFG.Player.Filename, type(e)))
                 print(traceback.print_exc())
@@ -116,6 +159,7 @@ class ArcGame(gnppygame.GameWithStates):
             round.SpeedCyclesRound,
             round.SqueezeReadyAimComboRound,
             round.BeamMeUpRound,
+            round.BigArenaRound,
         )
 
         basic_only_round = (
@@ -193,20 +237,125 @@ class ArcGame(gnppygame.GameWithStates):
             raise Exception('Unknown value for configuration value Round.RoundSet: %s' % CFG.Round.RoundSet)
 
     def make_next_round(self):
+        if CFG.Snapshot.StartFile is not None and self.round_idx == 0:
+            return self.make_round_from_snapshot(snapshot.RoundSnapshot.load(CFG.Snapshot.StartFile))
+
         if CFG.Debug.On:
             return BoostRound(self)
 
         if CFG.Round.RandomRoundSelection:
-            return random.choice(self._mode_sequence)(self)
+            return self.rng.choice(self._mode_sequence)(self)
 
         return self._mode_sequence[self.round_idx % len(self._mode_sequence)](self)
 
+    def make_round_from_snapshot(self, snap):
+        """Make a round of the kind the snapshot was taken of, that starts where the snapshot was taken"""
+        self.round_seed = snap.seed  # a round made from the same seed can take on the snapshot's state
+        state = getattr(round, snap.round_name)(self)
+        self.round_seed = None
+        state.start_from = snap
+        return state
+
+    def begin_netplay(self):
+        """Join the netplay match (see settings.Netplay). The players of every instance play together, and everyone's
+        input comes from the lockstep session."""
+        session = netplay.LockstepSession(CFG.Netplay.Addresses, CFG.Netplay.PeerIndex, CFG.Netplay.InputDelayTicks,
+                                          CFG.Netplay.TickRate)
+        local = self._controllers
+        print('Netplay: waiting for the other instances...')
+        players = session.connect([(c._name, c._color.idx) for c in local], [c._input_config for c in local],
+                                  CFG.Netplay.ConnectTimeout)
+        colors = {color.idx: color for color in arc_core.get_player_colors()}
+        self._controllers = []
+        for idx, (peer, name, color_idx) in enumerate(players):
+            input_cfg = arc_core.NetplayInputConfig('netplay instance %d' % peer, session, idx)
+            self._controllers.append(arc_core.PlayerController(name, colors[color_idx], idx, input_cfg))
+        self.rng.seed(session.seed)
+        self.background_rng.seed(session.seed)
+        self.netplay = session
+
     def step(self, time_delta):
+        if self.netplay is not None:
+            # one fixed size tick per step, and only once every instance's input for it is here
+            flags = netplay.FLAG_CONTINUE if pygame.key.get_pressed()[pygame.K_SPACE] else 0
+            if not self.netplay.advance(flags):
+                if self.netplay.stall_time > CFG.Netplay.StallTimeout:
+                    print('Netplay: no input from the other instances for %.1f seconds, giving up' %
+                          self.netplay.stall_time)
+                    self.request_exit()
+                return
+            time_delta = self.netplay.tick_length
+        time_delta = replay.quantize_time(time_delta)  # step with exactly the tick length a replay stores
         self.timers.step(time_delta)
+        if self.input_injector is not None:
+            self.input_injector.step(self._controllers, time_delta)
+        if CFG.Capture.On and not self.headless:
+            self.handle_capture_key()
         gnppygame.GameWithStates.step(self, time_delta)  # step the parent game class last because it can trigger a state transition
+        if self.capture is not None:
+            self.capture.add_frame(pygame.display.get_surface())  # the frame the state just put on the display
+        if self.frame_publisher is not None:
+            self.frame_publisher.publish(pygame.display.get_surface())
+
+    def handle_capture_key(self):
+        """Start or stop capturing the display when settings.Capture.ToggleKey goes down"""
+        is_down = pygame.key.get_pressed()[pygame.key.key_code(CFG.Capture.ToggleKey)]
+        if is_down and not self._is_capture_key_down:
+            if self.capture is None:
+                self.start_capture()
+            else:
+                self.stop_capture()
+        self._is_capture_key_down = is_down
+
+    def start_capture(self):
+        directory = Path(CFG.Capture.Directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = Path(directory, '%s.arccapture' % time.strftime('%Y%m%d_%H%M%S'))
+        self.capture = capture.FrameCapture(path, pygame.display.get_surface())
+        print('Capture: started, writing to %s' % path)
+
+    def stop_capture(self, wait=False):
+        """Stop capturing, if capturing. With wait, returns once every captured frame has been written."""
+        if self.capture is None:
+            return
+        self.capture.close()
+        print(self.capture.report())
+        if wait:
+            self.capture.wait()
+        self.capture = None
+
+    def get_playfield_rect(self):
+        """Rect of the logical playfield that gameplay runs in, independent of the display resolution"""
+        return pygame.Rect(0, 0, CFG.Win.PlayfieldX, CFG.Win.PlayfieldY)
+
+    def get_frame_surface(self):
+        """Surface to draw a playfield sized frame on. Is the display itself if the display is the playfield's size."""
+        display = pygame.display.get_surface()
+        size = self.get_playfield_rect().size
+        if display.get_size() == size:
+            return display
+        if self._frame is None or self._frame.get_size() != size:
+            self._frame = pygame.Surface(size, 0, display)
+        return self._frame
+
+    def present_frame(self, frame):
+        """Upscale a frame from get_frame_surface() onto the display, once per frame (no-op if drawn there directly)"""
+        display = pygame.display.get_surface()
+        if frame is display:
+            return
+        display_rect = display.get_rect()
+        rect = frame.get_rect().fit(display_rect)
+        pygame.transform.scale(frame, rect.size, display.subsurface(rect))
+        # letterbox bars
+        for bar in (pygame.Rect(0, 0, rect.left, display_rect.height),
+                    pygame.Rect(rect.right, 0, display_rect.right - rect.right, display_rect.height),
+                    pygame.Rect(0, 0, display_rect.width, rect.top),
+                    pygame.Rect(0, rect.bottom, display_rect.width, display_rect.bottom - rect.bottom)):
+            if bar.width > 0 and bar.height > 0:
+                display.fill(gnppygame.BLACK, bar)
 
     def init_scoreboard(self):
-        scoreboard_rect = self.get_screen_rect()
+        scoreboard_rect = self.get_playfield_rect()
         scoreboard_rect.height = 60
         self.scoreboard = arc_core.Scoreboard(scoreboard_rect.move(0, 15), scoreboard_rect.move(0, 85))  # needs to be called after RestartGame
         for controller in self._controllers:
@@ -225,6 +374,16 @@ if __name__ == '__main__':
     print("resource_path:", resource_path)
     print("local_path:", local_path)
     CFG.Player.Filename = Path(local_path, CFG.Player.Filename)
+    CFG.Replay.Directory = Path(local_path, CFG.Replay.Directory)
+    CFG.Snapshot.Directory = Path(local_path, CFG.Snapshot.Directory)
+    CFG.GameLog.Directory = Path(local_path, CFG.GameLog.Directory)
+    CFG.Capture.Directory = Path(local_path, CFG.Capture.Directory)
+    CFG.StateFeed.Filename = Path(local_path, CFG.StateFeed.Filename)
+    if '--start-snapshot' in sys.argv:
+        CFG.Snapshot.StartFile = sys.argv[sys.argv.index('--start-snapshot') + 1]
+    if '--netplay-peer' in sys.argv:
+        CFG.Netplay.On = True
+        CFG.Netplay.PeerIndex = int(sys.argv[sys.argv.index('--netplay-peer') + 1])
 
     arc_core.game = ArcGame(resource_path)  # global variable
 
@@ -238,4 +397,9 @@ if __name__ == '__main__':
         arc_core.game.run_game_loop()
         print('Time: %f' % arc_core.game._frame_timer.get_total_time())
         print('FPS:  %f' % arc_core.game._frame_timer.get_total_fps())
+    arc_core.game.stop_capture(wait=True)
+    if arc_core.game.frame_publisher is not None:
+        arc_core.game.frame_publisher.close()
+    if arc_core.game.state_feed is not None:
+        arc_core.game.state_feed.close()
 
@@ -0,0 +1,164 @@
+"""
+Analytic model of the walls that bound the arena
+
+Collision against these walls is answered with a little math instead of by sampling pixels on the game surface. The
+walls are still rasterized into the game surface so that they can be seen, but only when their shape changes.
+"""
+import math
+import pygame
+from gnp_pygame import gnipMath
+from arc_arena import settings
+from arc_arena import chunks
+
+CFG = settings  # quick alias
+
+
+class RectBorder(object):
+    """Solid border drawn along the inside edges of a rect"""
+
+    def __init__(self, rect, width):
+        self._rect = pygame.Rect(rect)
+        self._width = width
+        self._is_drawn = False
+
+    def is_colliding(self, pos):
+        return not (self._rect.left + self._width <= pos.x < self._rect.right - self._width and
+                    self._rect.top + self._width <= pos.y < self._rect.bottom - self._width)
+
+    def step(self, time_delta):
+        pass
+
+    def draw(self, surface):
+        if not self._is_drawn:
+            chunks.draw_rect(surface, CFG.Win.BorderColorIdx, self._rect, self._width)
+            self._is_drawn = True
+
+
+class ShrinkingCircle(object):
+    """Circular wall that shrinks over time. Everything outside of the circle is solid."""
+
+    def __init__(self, center, start_radius, end_radius, duration, width=3):
+        self.center = (int(center[0]), int(center[1]))
+        self._center_jitter = (self.center[0] + 1, self.center[1])
+        self._start_radius = start_radius
+        self._end_radius = end_radius
+        self._duration = duration
+        self._width = width
+        self._elapsed = 0.0
+        self.radius = int(start_radius)
+        self._drawn_radius = None
+
+    def is_colliding(self, pos):
+        dx = pos.x - self.center[0]
+        dy = pos.y - self.center[1]
+        inner_radius = self.radius - self._width
+        return dx * dx + dy * dy >= inner_radius * inner_radius
+
+    def step(self, time_delta):
+        self.radius = int(
+            gnipMath.Lerp(self._start_radius, self._end_radius, min(self._elapsed / self._duration, 1.0)))
+        self._elapsed += time_delta
+        # Maybe slow down shrink rate as it gets smaller?
+
+    def draw(self, surface):
+        """Rasterize the ring, but only when its integer radius has changed since it was last drawn.
+
+        Returns the (inner, outer) radius of the band that was drawn, or None if nothing was drawn."""
+        if self.radius == self._drawn_radius:
+            return None
+        # Also fill the band between the previous ring and this one, in case the radius jumped by more than the line
+        # width since the last draw (slow frame rate).
+        outer_radius = self.radius if self._drawn_radius is None else self._drawn_radius
+        width = outer_radius - self.radius + self._width
+        # Pygame bug: circles with width > 1 have missing pixels (moire pattern artifacts on concentric circles): Fixed in Pygame 1.9.4: https://stackoverflow.com/a/48720206
+        # Put in a hacky fix that draws two circles with a one pixel offset to get rid of circle drawing artifacts
+        pygame.draw.circle(surface, CFG.Win.BorderColorIdx, self.center, outer_radius, width)
+        pygame.draw.circle(surface, CFG.Win.BorderColorIdx, self._center_jitter, outer_radius, width)
+        self._drawn_radius = self.radius
+        return outer_radius - width, outer_radius + 1  # +1 for the jittered circle
+
+    def repair(self, surface, pos, radius):
+        """Redraw the part of the ring, and the solid area outside of it, that erasing a circle (ex: an explosion) on
+        the surface took out. The ring is only drawn again when its radius changes, which it stops doing once it is
+        fully shrunk.
+
+        Returns the (inner, outer) radius of the band that was drawn, or None if the circle didn't reach the ring."""
+        if self._drawn_radius is None:
+            return None
+        inner_radius = self._drawn_radius - self._width
+        reach = math.hypot(pos[0] - self.center[0], pos[1] - self.center[1]) + radius
+        if reach < inner_radius:
+            return None
+        outer_radius = int(math.ceil(reach)) + 1
+        width = outer_radius - inner_radius
+        pygame.draw.circle(surface, CFG.Win.BorderColorIdx, self.center, outer_radius, width)
+        pygame.draw.circle(surface, CFG.Win.BorderColorIdx, self._center_jitter, outer_radius, width)
+        return inner_radius, outer_radius + 1
+
+    def get_state(self):
+        return self._elapsed, self.radius, self._drawn_radius
+
+    def set_state(self, state):
+        self._elapsed, self.radius, self._drawn_radius = state
+
+
+class ChamberArcs(object):
+    """Ring of evenly spaced arcs, with openings between them, around a center point"""
+
+    def __init__(self, center, radius, arc_count, span_pct, angle_offset, width):
+        self._center = (center[0], center[1])
+        self._radius = radius
+        self._width = width
+        self._rect = pygame.Rect(0, 0, 2 * radius, 2 * radius)
+        self._rect.center = self._center
+        delta = (2 * math.pi) / arc_count
+        self._spans = [(i * delta + angle_offset, (i * delta) + (delta * span_pct) + angle_offset)
+                       for i in range(arc_count)]
+        self._is_drawn = False
+
+    def is_colliding(self, pos):
+        # pygame.draw.arc() angles run counterclockwise with the y axis pointing up, so flip y to match
+        dx = pos.x - self._center[0]
+        dy = self._center[1] - pos.y
+        dist = math.hypot(dx, dy)
+        if not self._radius - self._width <= dist <= self._radius:
+            return False
+        angle = math.atan2(dy, dx) % (2 * math.pi)
+        for start, stop in self._spans:
+            if start <= angle <= stop or start <= angle + (2 * math.pi) <= stop:
+                return True
+        return False
+
+    def step(self, time_delta):
+        pass
+
+    def draw(self, surface):
+        if not self._is_drawn:
+            for start, stop in self._spans:
+                pygame.draw.arc(surface, CFG.Win.BorderColorIdx, self._rect, start, stop, self._width)
+            self._is_drawn = True
+
+
+class Boundary(object):
+    """All of the walls that make up the boundary of the arena"""
+
+    def __init__(self):
+        self._walls = []
+
+    def add(self, wall):
+        self._walls.append(wall)
+        return wall
+
+    def is_colliding(self, pos):
+        for wall in self._walls:
+            if wall.is_colliding(pos):
+                return True
+        return False
+
+    def step(self, time_delta):
+        for wall in self._walls:
+            wall.step(time_delta)
+
+    def draw(self, surface):
+        for wall in self._walls:
+            wall.draw(surface)
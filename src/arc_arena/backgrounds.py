@@ -12,7 +12,13 @@ from arc_arena import settings
 CFG = settings  # quick alias
 
 
+def get_rng(gameobj):
+    """Random number generator to draw with: the game's (so it is the same on every netplay instance), if there is one"""
+    return random if gameobj is None else gameobj.background_rng
+
+
 def draw_grid(surf, gameobj):
+    rng = get_rng(gameobj)
     x_count = 8
     y_count = 5
     size = 140
@@ -20,7 +26,7 @@ def draw_grid(surf, gameobj):
     hide_color_count = 4
     accent_color_count = 2
     idxs = list(range(x_count * y_count))
-    random.shuffle(idxs)
+    rng.shuffle(idxs)
     hide_idxs = idxs[:hide_color_count]
     accent_idxs = idxs[-accent_color_count:]
     # extend grid as I need to draw grid larger than surface because I rotate it
@@ -39,6 +45,7 @@ def draw_grid(surf, gameobj):
 
 
 def draw_circles(surf, gameobj):
+    rng = get_rng(gameobj)
     colors = (
         (255, 0, 0, CFG.Background.CirclesAlpha),
         (0, 255, 0, CFG.Background.CirclesAlpha),
@@ -48,37 +55,39 @@ def draw_circles(surf, gameobj):
     for i in range(125):
         utils.withalpha(surf, lambda sf: pygame.draw.circle(
             sf,
-            random.choice(colors),
-            (random.randint(0, surf.get_rect().width), random.randint(0, surf.get_rect().height)),
-            random.randint(75, 200)
+            rng.choice(colors),
+            (rng.randint(0, surf.get_rect().width), rng.randint(0, surf.get_rect().height)),
+            rng.randint(75, 200)
         ))
 
 
 def draw_blue_circles(surf, gameobj):
+    rng = get_rng(gameobj)
     for i in range(125):
         utils.withalpha(surf, lambda sf: pygame.draw.circle(
             sf,
             (0, 0, 100, CFG.Background.BlueCirclesAlpha),
-            (random.randint(0, surf.get_rect().width), random.randint(0, surf.get_rect().height)),
-            random.randint(100, 200)
+            (rng.randint(0, surf.get_rect().width), rng.randint(0, surf.get_rect().height)),
+            rng.randint(100, 200)
         ))
 
 
 def draw_concentric_arcs(surf, gameobj):
+    rng = get_rng(gameobj)
     def eighths():
         return math.pi/4
     def quarters():
         return math.pi/2
     def random_angle():
-        return random.uniform(0, 2*math.pi)
+        return rng.uniform(0, 2*math.pi)
     def random_quarters():
-        return random.choice((0, math.pi/2, math.pi, 3*math.pi/2))
+        return rng.choice((0, math.pi/2, math.pi, 3*math.pi/2))
     def random_eighths():
-        return random.choice(
+        return rng.choice(
             [i * 2 * math.pi / 8 for i in range(8)]
         )
     def random_blue_scarlet_clrs():
-        return random.choice(
+        return rng.choice(
             (
                 CFG.Background.ConcentricArcsBaseColor,
                 CFG.Background.ConcentricArcsBaseColor,
@@ -92,7 +101,7 @@ def draw_concentric_arcs(surf, gameobj):
     def random_title_screen_clrs():
         base_color = (6, 0, 29)
         accent_color = (30, 0, 0)
-        return random.choice(
+        return rng.choice(
             (
                 base_color,
                 base_color,
@@ -121,11 +130,11 @@ def draw_concentric_arcs(surf, gameobj):
     win = surf.get_rect()
     win.inflate_ip(150, 150) # since make_grid_points() doesn't create points on the edges, inflate the rect first
     pts = utils.make_grid_points(win, 100)
-    pts = [p + utils.get_jitter_vect(15, 15) for p in pts]
-    random.shuffle(pts)
+    pts = [p + utils.get_jitter_vect(15, 15, rng) for p in pts]
+    rng.shuffle(pts)
     pts = pts[:30]
     for pt in pts:
-        setup = random.choice((
+        setup = rng.choice((
             (200, 7, 30),
             (80, 3, 30),
             (80, 3, 30),
@@ -193,6 +202,7 @@ def draw_geometric_scene(surf, gameobj):
 
 
 def draw_random_polys(surf, gameobj):
+    rng = get_rng(gameobj)
     win = surf.get_rect()
     alpha = CFG.Background.RandomPolysAlpha
     colors = (
@@ -205,21 +215,22 @@ def draw_random_polys(surf, gameobj):
         (255, 255, 255, alpha),
     )
     for _ in range(100):
-        pt = gnipMath.cVector2.RandInRect(win)
+        pt = utils.rand_in_rect(win, rng)
         jitter = 600
         utils.withalpha(surf, lambda sf: pygame.draw.polygon(
             sf,
-            random.choice(colors),
+            rng.choice(colors),
             (
-                (pt + gnipMath.cVector2().Rand(jitter, jitter)).AsIntTuple(),
-                (pt + gnipMath.cVector2().Rand(jitter, jitter)).AsIntTuple(),
-                (pt + gnipMath.cVector2().Rand(jitter, jitter)).AsIntTuple(),
-                (pt + gnipMath.cVector2().Rand(jitter, jitter)).AsIntTuple(),
+                (pt + utils.get_jitter_vect(jitter, jitter, rng)).AsIntTuple(),
+                (pt + utils.get_jitter_vect(jitter, jitter, rng)).AsIntTuple(),
+                (pt + utils.get_jitter_vect(jitter, jitter, rng)).AsIntTuple(),
+                (pt + utils.get_jitter_vect(jitter, jitter, rng)).AsIntTuple(),
             )
         ))
 
 
 def draw_player_names(surf, gameobj):
+    rng = get_rng(gameobj)
     win = surf.get_rect()
     alpha = CFG.Background.PlayerNamesAlpha
     count = 0
@@ -230,13 +241,14 @@ def draw_player_names(surf, gameobj):
         sf.set_alpha(alpha)
         sf.set_colorkey((0, 0, 0)) # surface with text doesn't have alpha, just a black background
         sf = sf.convert()
-        point = gnipMath.cVector2.RandInRect(win)
+        point = utils.rand_in_rect(win, rng)
         gameobj.font_mgr.draw(sf, gameobj.fnt, 160, ctrl._name, (point+gnipMath.cVector2(-300, -50)).AsIntTuple(), (255, 255, 255), antialias=True)
         sf = pygame.transform.rotate(sf, 3)
         surf.blit(sf, (0, 0))
 
 
 def draw_soft_circles(surf, gameobj):
+    rng = get_rng(gameobj)
     win = surf.get_rect()
     alpha = CFG.Background.SoftCirclesAlpha   # alpha of 3 and step in range of 4 below was nice, but slow
     colors = (
@@ -250,9 +262,9 @@ def draw_soft_circles(surf, gameobj):
     )
 
     for _ in range(16):
-        pt = gnipMath.cVector2.RandInRect(win)
-        clr = random.choice(colors)
-        start_radius = random.randint(70, 100)
+        pt = utils.rand_in_rect(win, rng)
+        clr = rng.choice(colors)
+        start_radius = rng.randint(70, 100)
         for radius in range(start_radius, start_radius+50, 7):
             utils.withalpha(surf, lambda sf: pygame.draw.circle(
                 sf,
@@ -263,11 +275,12 @@ def draw_soft_circles(surf, gameobj):
 
 
 def draw_wave_circles(surf, gameobj):
+    rng = get_rng(gameobj)
     win = surf.get_rect()
     center = gnipMath.cVector2(win.center)
     offset = gnipMath.cVector2(0, 1)
     max_radius = center.Magnitude()
-    choice = random.randint(0, 2)
+    choice = rng.randint(0, 2)
     if choice == 0:
         clr = CFG.Background.WaveCirclesIntensity  # color intensity
         clr_line = (0, 0, int(clr * 1.5))
@@ -285,7 +298,7 @@ def draw_wave_circles(surf, gameobj):
     # radial spikes
     for _ in range(30):
         pt = gnipMath.cVector2()
-        pt.SetFromPolar(random.uniform(0.0, math.pi * 2), random.randint(150, 700))
+        pt.SetFromPolar(rng.uniform(0.0, math.pi * 2), rng.randint(150, 700))
         pt = pt + center
         pygame.draw.line(surf, clr_line, center.AsIntTuple(), pt.AsIntTuple(), 5)
 
@@ -314,6 +327,7 @@ def draw_wave_circles(surf, gameobj):
 
 
 def draw_horiz_lines(surf, gameobj):
+    rng = get_rng(gameobj)
     win = surf.get_rect()
     colors = (
         CFG.Background.HorizLinesClr1,
@@ -323,8 +337,8 @@ def draw_horiz_lines(surf, gameobj):
     y_mid = win.centery + 75
     max_length = 500
     for _ in range(500):
-        length = max(0, random.normalvariate(100, 100))
-        x = random.randint(0-max_length, win.right)
-        y = random.normalvariate(y_mid, 90)
-        thickness = random.randint(1, 6)
-        pygame.draw.line(surf, random.choice(colors), (x, y), (x+length, y), thickness)
+        length = max(0, rng.normalvariate(100, 100))
+        x = rng.randint(0-max_length, win.right)
+        y = rng.normalvariate(y_mid, 90)
+        thickness = rng.randint(1, 6)
+        pygame.draw.line(surf, rng.choice(colors), (x, y), (x+length, y), thickness)
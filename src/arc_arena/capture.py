@@ -0,0 +1,163 @@
+"""
+Live capture of what is on the display, for recording party sessions without a screen recorder (see settings.Capture)
+
+settings.Capture.ToggleKey starts and stops capturing, on any screen. While capturing, the display is copied into one
+of a few preallocated buffers right after each pygame.display.update() (about half a millisecond at 1280x720, up to
+settings.Capture.FrameRate times a second). A background thread compresses the buffers to disk and hands them back.
+If it falls behind and no buffer is free, the frame is dropped (and counted) instead of making the game wait, so
+capturing never costs more than the copy.
+
+File format:
+
+    b'ARCC', uint8 version
+    varint length, then UTF-8 JSON header: display size, pitch (bytes per row), bits per pixel and color masks
+    frames, each: varint microseconds since the frame before it (since capturing started for the first one), varint
+    length, then the raw display pixels, zlib compressed
+
+Turn a capture into a GIF, a video or PNG frames with export.py:
+
+    python -m arc_arena.export CAPTURE_FILE [--out PATH] [--size WxH] [--fps N]
+"""
+import json
+import queue
+import time
+import zlib
+import numpy
+from arc_arena import settings
+from arc_arena import replay
+from arc_arena import utils
+
+CFG = settings  # quick alias
+MAGIC = b'ARCC'
+VERSION = 1
+
+
+def get_rgb(rows, width, masks):
+    """RGB pixels, as a (height, width, 3) array, of the rows (a (height, pitch) array of bytes) of a 32 bit surface
+    with the given color masks"""
+    pixels = numpy.ascontiguousarray(rows[:, :width * 4]).view(numpy.uint32)
+    rgb = numpy.empty(pixels.shape + (3,), numpy.uint8)
+    for channel, mask in enumerate(masks[:3]):
+        shift = (mask & -mask).bit_length() - 1
+        rgb[:, :, channel] = (pixels & mask) >> shift
+    return rgb
+
+
+class _Writer(utils.BackgroundFileWriter):
+    """Compresses and writes captured frames on a background thread, then hands their buffers back to the pool"""
+
+    def __init__(self, path, free_buffers):
+        self._free_buffers = free_buffers
+        utils.BackgroundFileWriter.__init__(self, path, 'FrameCaptureWriter')
+
+    def _handle(self, item):
+        if not isinstance(item, tuple):
+            self._write(item)
+            return
+        buffer, time_delta = item
+        data = zlib.compress(buffer, CFG.Capture.CompressLevel)
+        self._free_buffers.put(buffer)  # free for the next frame as soon as it's compressed
+        record = bytearray()
+        replay.write_varint(record, time_delta)
+        replay.write_varint(record, len(data))
+        self._write(record)
+        self._write(data)
+
+
+class FrameCapture(object):
+    """Captures the display to a file. Call add_frame() after every pygame.display.update(), and close() when done."""
+
+    def __init__(self, path, display):
+        self.path = path
+        self.size = display.get_size()
+        self.frame_count = 0  # frames captured
+        self.dropped_count = 0  # frames dropped because the writer had fallen behind
+        self._free_buffers = queue.Queue()
+        for _ in range(CFG.Capture.Buffers):
+            self._free_buffers.put(bytearray(display.get_pitch() * self.size[1]))
+        self._writer = _Writer(path, self._free_buffers)
+        header = json.dumps({'size': self.size, 'pitch': display.get_pitch(), 'bitsize': display.get_bitsize(),
+                             'masks': display.get_masks()}).encode('utf-8')
+        buf = bytearray(MAGIC)
+        buf.append(VERSION)
+        replay.write_varint(buf, len(header))
+        buf += header
+        self._writer.write(bytes(buf))
+        self._start_time = time.perf_counter()
+        self._last_time = self._start_time  # of the last frame captured
+        self._interval = 1.0 / CFG.Capture.FrameRate
+
+    def add_frame(self, display):
+        """Copy the display into a free buffer for the writer, if a frame is due and one is free"""
+        now = time.perf_counter()
+        if self.frame_count and now - self._last_time < self._interval:
+            return
+        if display.get_size() != self.size:
+            return  # display mode changed. Only frames of the size capturing started at fit the file.
+        try:
+            buffer = self._free_buffers.get_nowait()
+        except queue.Empty:
+            if self.dropped_count == 0:
+                print('Capture: falling behind, dropping frames')
+            self.dropped_count += 1
+            return
+        buffer[:] = display.get_view('0')
+        time_delta = int(round((now - self._last_time) * replay.MICROSECONDS))
+        self._last_time = now
+        self.frame_count += 1
+        self._writer.write((buffer, time_delta))
+
+    def close(self):
+        self._writer.close()
+
+    def wait(self):
+        """Wait for every frame to be written (after close())"""
+        self._writer.wait()
+
+    def report(self):
+        elapsed = max(self._last_time - self._start_time, 1e-9)
+        total = max(self.frame_count + self.dropped_count, 1)
+        return 'Captured %d frames in %.1f seconds (%.1f fps) to %s, %d dropped (%.1f%%)' % (
+            self.frame_count, elapsed, self.frame_count / elapsed, self.path, self.dropped_count,
+            100.0 * self.dropped_count / total)
+
+
+class Capture(object):
+    """A capture file read back in"""
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a capture file')
+        if data[len(MAGIC)] != VERSION:
+            raise ValueError('Capture version %d is not supported' % data[len(MAGIC)])
+        length, pos = replay.read_varint(data, len(MAGIC) + 1)
+        self.header = json.loads(bytes(data[pos:pos + length]).decode('utf-8'))
+        if self.header['bitsize'] != 32:
+            raise ValueError('Only captures of 32 bit displays can be read')
+        pos += length
+        self._data = data
+        self.frames = []  # (seconds since capturing started, offset of compressed pixels, their length)
+        frame_time = 0.0
+        while pos < len(data):
+            try:
+                time_delta, pos = replay.read_varint(data, pos)
+                length, pos = replay.read_varint(data, pos)
+            except IndexError:
+                break  # cut short (the game quit while capturing)
+            if pos + length > len(data):
+                break
+            frame_time += time_delta / float(replay.MICROSECONDS)
+            self.frames.append((frame_time, pos, length))
+            pos += length
+
+    def get_frame(self, idx):
+        """RGB pixels of a frame, as a (height, width, 3) array"""
+        frame_time, offset, length = self.frames[idx]
+        width, height = self.header['size']
+        rows = numpy.frombuffer(zlib.decompress(self._data[offset:offset + length]), numpy.uint8)
+        return get_rgb(rows.reshape(height, self.header['pitch']), width, self.header['masks'])
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return Capture(f.read())
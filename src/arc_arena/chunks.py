@@ -0,0 +1,216 @@
+"""
+Sparse, chunked storage for arenas that are bigger than the screen, and a camera to look at them with
+
+Memory and drawing cost follow how much trail has been drawn, not how big the arena is: a chunk is only allocated the
+first time something is drawn on it, and freed again once everything on it has been cleared.
+"""
+import math
+import pygame
+import pygame.surfarray
+from gnp_pygame import gnipMath
+
+
+def draw_circle(surface, color, pos, radius):
+    """pygame.draw.circle() that also works on a ChunkedSurface. Returns the rect that was touched."""
+    if isinstance(surface, ChunkedSurface):
+        return surface.draw_circle(color, pos, radius)
+    return pygame.draw.circle(surface, color, pos, radius)
+
+
+def draw_rect(surface, color, rect, width=0):
+    """pygame.draw.rect() that also works on a ChunkedSurface. Returns the rect that was touched."""
+    if isinstance(surface, ChunkedSurface):
+        return surface.draw_rect(color, rect, width)
+    return pygame.draw.rect(surface, color, rect, width)
+
+
+def copy_pixels(surface):
+    """Copy of the pixels of an 8-bit surface (or ChunkedSurface), that paste_pixels() can put back later"""
+    if isinstance(surface, ChunkedSurface):
+        return surface.copy_pixels()
+    return pygame.surfarray.array2d(surface)
+
+
+def paste_pixels(surface, pixels):
+    """Put pixels from copy_pixels() back onto the surface they were copied from"""
+    if isinstance(surface, ChunkedSurface):
+        surface.paste_pixels(pixels)
+        return
+    pygame.surfarray.pixels2d(surface)[...] = pixels
+
+
+class ChunkedSurface(object):
+    """8-bit surface stored as a grid of fixed size chunks, where chunks that hold only the fill value don't exist.
+
+    Supports the subset of the pygame.Surface interface the game needs from a game surface (get_at, get_at_mapped,
+    get_size, get_rect). Drawing goes through draw_circle()/draw_rect() in this module."""
+
+    def __init__(self, size, chunk_size, fill_value, palette=None):
+        self._size = (int(size[0]), int(size[1]))
+        self._chunk_size = chunk_size
+        self._fill_value = fill_value
+        self._palette = palette
+        self._chunks = {}  # (chunk x, chunk y) -> pygame.Surface
+        self._maybe_empty = set()  # chunks that have had fill value drawn on them since they were last checked
+
+    def get_size(self):
+        return self._size
+
+    def get_rect(self):
+        return pygame.Rect((0, 0), self._size)
+
+    def get_chunk_count(self):
+        return len(self._chunks)
+
+    def get_chunk(self, key):
+        """Return the surface of the chunk at (chunk x, chunk y), or None if it isn't allocated"""
+        return self._chunks.get(key)
+
+    def iter_chunks(self):
+        """Iterate over ((chunk x, chunk y), surface) for every allocated chunk"""
+        return iter(self._chunks.items())
+
+    def get_at_mapped(self, pos):
+        x, y = int(pos[0]), int(pos[1])
+        if not (0 <= x < self._size[0] and 0 <= y < self._size[1]):
+            raise IndexError('pixel index out of range')
+        chunk = self._chunks.get((x // self._chunk_size, y // self._chunk_size))
+        if chunk is None:
+            return self._fill_value
+        return chunk.get_at_mapped((x % self._chunk_size, y % self._chunk_size))
+
+    def get_at(self, pos):
+        return pygame.Color(*self._palette[self.get_at_mapped(pos)])
+
+    def draw_circle(self, color, pos, radius):
+        x, y = int(pos[0]), int(pos[1])
+        return self._draw(color, pygame.Rect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1),
+                          lambda chunk, left, top: pygame.draw.circle(chunk, color, (x - left, y - top), radius))
+
+    def draw_rect(self, color, rect, width=0):
+        rect = pygame.Rect(rect)
+        if width > 0:
+            # draw an outline as four filled edges, so the chunks in the middle aren't allocated
+            edges = (pygame.Rect(rect.left, rect.top, rect.width, width),
+                     pygame.Rect(rect.left, rect.bottom - width, rect.width, width),
+                     pygame.Rect(rect.left, rect.top, width, rect.height),
+                     pygame.Rect(rect.right - width, rect.top, width, rect.height))
+            dirty = self.draw_rect(color, edges[0])
+            for edge in edges[1:]:
+                dirty.union_ip(self.draw_rect(color, edge))
+            return dirty
+        return self._draw(color, rect, lambda chunk, left, top: pygame.draw.rect(chunk, color, rect.move(-left, -top),
+                                                                                  width))
+
+    def _draw(self, color, bounds, draw_func):
+        """Call draw_func(chunk, chunk left, chunk top) for every chunk that bounds overlaps"""
+        bounds = bounds.clip(self.get_rect())
+        if bounds.width == 0 or bounds.height == 0:
+            return pygame.Rect(bounds.topleft, (0, 0))
+        size = self._chunk_size
+        is_clearing = color == self._fill_value
+        for cx in range(bounds.left // size, (bounds.right - 1) // size + 1):
+            for cy in range(bounds.top // size, (bounds.bottom - 1) // size + 1):
+                chunk = self._chunks.get((cx, cy))
+                if chunk is None:
+                    if is_clearing:
+                        continue  # nothing to clear
+                    chunk = self._make_chunk()
+                    self._chunks[(cx, cy)] = chunk
+                draw_func(chunk, cx * size, cy * size)
+                if is_clearing:
+                    self._maybe_empty.add((cx, cy))
+        return bounds
+
+    def _make_chunk(self):
+        chunk = pygame.Surface((self._chunk_size, self._chunk_size), 0, 8)
+        if self._palette is not None:
+            chunk.set_palette(self._palette)
+        chunk.set_colorkey(self._fill_value)
+        chunk.fill(self._fill_value)
+        return chunk
+
+    def free_empty_chunks(self):
+        """Free chunks that have been completely cleared. Cheap to call often, only recently cleared chunks are checked."""
+        for key in self._maybe_empty:
+            chunk = self._chunks.get(key)
+            if chunk is not None:
+                pixels = pygame.surfarray.pixels2d(chunk)
+                is_empty = not (pixels != self._fill_value).any()
+                del pixels  # pixel arrays lock their surface until they are released
+                if is_empty:
+                    del self._chunks[key]
+        self._maybe_empty.clear()
+
+    def copy_pixels(self):
+        """{(chunk x, chunk y): array of the chunk's pixels} for every allocated chunk"""
+        return {key: pygame.surfarray.array2d(chunk) for key, chunk in self._chunks.items()}
+
+    def paste_pixels(self, pixels):
+        """Replace every chunk with the ones from copy_pixels()"""
+        self._chunks = {}
+        self._maybe_empty = set()
+        for key, chunk_pixels in pixels.items():
+            chunk = self._make_chunk()
+            pygame.surfarray.pixels2d(chunk)[...] = chunk_pixels
+            self._chunks[key] = chunk
+
+    def draw_view(self, surface, view_rect, zoom):
+        """Draw the part of the arena inside of view_rect (arena coordinates) onto surface, scaled by zoom. Only the
+        chunks that can be seen are drawn."""
+        size = self._chunk_size
+        view_rect = pygame.Rect(view_rect)
+        visible = view_rect.clip(self.get_rect())
+        if visible.width == 0 or visible.height == 0:
+            return
+        for cx in range(visible.left // size, (visible.right - 1) // size + 1):
+            for cy in range(visible.top // size, (visible.bottom - 1) // size + 1):
+                chunk = self._chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                # round both edges (instead of the size) so neighboring chunks meet without seams
+                left = int(round((cx * size - view_rect.left) * zoom))
+                top = int(round((cy * size - view_rect.top) * zoom))
+                right = int(round(((cx + 1) * size - view_rect.left) * zoom))
+                bottom = int(round(((cy + 1) * size - view_rect.top) * zoom))
+                if zoom == 1.0:
+                    surface.blit(chunk, (left, top))
+                else:
+                    surface.blit(pygame.transform.scale(chunk, (right - left, bottom - top)), (left, top))
+
+
+class Camera(object):
+    """Scrolls and zooms a view of the arena to keep a set of points (the alive snakes) framed"""
+
+    def __init__(self, view_size, arena_rect, margin, min_zoom, max_zoom, follow_rate):
+        self._view_size = view_size
+        self._arena_rect = pygame.Rect(arena_rect)
+        self._margin = margin
+        self._min_zoom = max(min_zoom, min(view_size[0] / float(self._arena_rect.width),
+                                           view_size[1] / float(self._arena_rect.height)))
+        self._max_zoom = max_zoom
+        self._follow_rate = follow_rate  # fraction of the way to the target to move each second
+        self.center = gnipMath.cVector2(self._arena_rect.centerx, self._arena_rect.centery)
+        self.zoom = self._min_zoom
+
+    def update(self, points, time_delta, snap=False):
+        """Move toward framing the given points. Jumps there immediately if snap is True."""
+        if not points:
+            return
+        left = min(p.x for p in points) - self._margin
+        right = max(p.x for p in points) + self._margin
+        top = min(p.y for p in points) - self._margin
+        bottom = max(p.y for p in points) + self._margin
+        target_zoom = min(self._view_size[0] / (right - left), self._view_size[1] / (bottom - top))
+        target_zoom = min(max(target_zoom, self._min_zoom), self._max_zoom)
+        target_center = gnipMath.cVector2((left + right) / 2.0, (top + bottom) / 2.0)
+        amount = 1.0 if snap else 1.0 - math.pow(1.0 - self._follow_rate, time_delta)
+        self.zoom = gnipMath.Lerp(self.zoom, target_zoom, amount)
+        self.center = self.center + ((target_center - self.center) * amount)
+
+    def get_view_rect(self):
+        """The part of the arena that is visible, kept inside of the arena when possible"""
+        width, height = self._view_size[0] / self.zoom, self._view_size[1] / self.zoom
+        rect = pygame.Rect(0, 0, int(math.ceil(width)), int(math.ceil(height)))
+        rect.center = self.center.AsIntTuple()
+        return rect.clamp(self._arena_rect)
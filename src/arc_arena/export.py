@@ -0,0 +1,397 @@
+"""
+Export replays (see replay.py) and live captures (see capture.py) to video, animated GIF or PNG frames, for highlight
+clips (see settings.Export)
+
+    python -m arc_arena.export REPLAY_FILE [--out PATH] [--size WxH] [--fps N] [--start SECONDS] [--end SECONDS]
+    python -m arc_arena.export CAPTURE_FILE [--out PATH] [--size WxH] [--fps N]
+
+The kind of export depends on --out:
+    clip.gif              animated GIF, encoded here
+    clip.mp4, clip.webm   video, encoded by ffmpeg (settings.Export.FfmpegCommand), which has to be installed
+    a directory           numbered PNG frames (frame000000.png, ...)
+
+The round is re-simulated headlessly from its replay (jumping to --start through the nearest keyframe, see
+playback.Seeker) and a frame is rendered every 1/fps seconds of gameplay. Rendered frames go through a bounded queue to
+a writer thread, which hands them to a pool of worker processes to encode (PNGs and GIFs) or pipes them to ffmpeg. So
+the simulation, the encoding and the disk all keep busy at once, and memory use doesn't grow with the length of the
+clip. Nothing is captured live: any recorded round can be exported after the fact.
+
+Captures (.arccapture files) are already frames, they are just resampled to the frame rate and size.
+"""
+import collections
+import multiprocessing
+import queue
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy
+import pygame
+from arc_arena import settings
+from arc_arena import arc_core
+from arc_arena import replay
+from arc_arena import playback
+from arc_arena import capture
+
+CFG = settings  # quick alias
+GIF_MAX_CODE = 4096  # LZW codes are at most 12 bits
+VIDEO_SUFFIXES = ('.mp4', '.webm', '.mkv', '.mov', '.avi')
+
+
+def get_clip_ticks(recording, start, end):
+    """First tick to simulate (the one after start seconds of gameplay), the gameplay time before it and the number of
+    ticks to simulate to reach end seconds (None for the end of the replay)"""
+    end_times = numpy.cumsum([time_delta for time_delta, inputs in recording.ticks])
+    first_tick = int(numpy.searchsorted(end_times, start, 'right'))
+    start_time = float(end_times[first_tick - 1]) if first_tick else 0.0
+    last_tick = len(recording.ticks) if end is None else int(numpy.searchsorted(end_times, end, 'left')) + 1
+    return first_tick, start_time, min(last_tick, len(recording.ticks))
+
+
+def render_frames(seeker, size, fps, start, end, frame_queue):
+    """Re-simulate the replay of a playback.Seeker from start to end seconds, putting an RGB frame (bytes) of the given
+    size on frame_queue every 1/fps seconds of gameplay. Returns the number of frames rendered."""
+    recording = seeker.recording
+    first_tick, game_time, last_tick = get_clip_ticks(recording, start, end)
+    if first_tick:
+        seeker.seek(first_tick - 1)
+    game, controllers = seeker.game, seeker.game._controllers
+    frame_count = 0
+    next_frame_time = max(start, game_time)
+    while True:
+        while next_frame_time <= game_time and (end is None or next_frame_time < end):
+            frame = game.get_frame_surface()
+            seeker.state.draw(frame)
+            if frame.get_size() != size:
+                frame = pygame.transform.smoothscale(frame, size)
+            frame_queue.put(pygame.image.tostring(frame, 'RGB'))
+            frame_count += 1
+            next_frame_time = start + frame_count / float(fps)
+        if seeker.tick >= last_tick or seeker.state.round_over:
+            break
+        time_delta, inputs = recording.ticks[seeker.tick]
+        playback.set_tick_inputs(controllers, inputs)
+        seeker.state.step(time_delta)
+        seeker.tick += 1
+        game_time += time_delta
+    return frame_count
+
+
+class FrameWriter(object):
+    """Takes rendered frames off a bounded queue on a thread of its own and hands them to a sink (PngSink, GifSink,
+    FfmpegSink). The renderer waits whenever the queue is full, so frames never pile up faster than they are
+    encoded."""
+
+    def __init__(self, sink):
+        self.queue = queue.Queue(CFG.Export.QueueFrames)
+        self.error = None
+        self._sink = sink
+        self._thread = threading.Thread(target=self._run, name='FrameWriter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error is None:  # after an error, keep emptying the queue so the renderer doesn't get stuck
+                try:
+                    self._sink.add(frame)
+                except Exception as exc:
+                    self.error = exc
+        try:
+            self._sink.close()
+        except Exception as exc:
+            self.error = self.error or exc
+
+    def wait(self):
+        """Wait for the last frame to be written (after None was put on the queue). Raises the sink's error, if any."""
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class PoolSink(object):
+    """Sink that has frames encoded by a pool of worker processes, in order, with a bounded number in flight"""
+
+    def __init__(self, initializer=None, init_args=()):
+        self._pool = multiprocessing.Pool(CFG.Export.Processes, initializer, init_args)
+        self._pending = collections.deque()  # AsyncResult of every frame handed to the pool and not yet collected
+        self._max_pending = 2 * (CFG.Export.Processes or multiprocessing.cpu_count())
+
+    def _submit(self, func, args):
+        if len(self._pending) >= self._max_pending:
+            self._collect(self._pending.popleft().get())
+        self._pending.append(self._pool.apply_async(func, args))
+
+    def _collect(self, result):
+        """Handle the result of a frame's encoding. Called in frame order."""
+        pass
+
+    def close(self):
+        while self._pending:
+            self._collect(self._pending.popleft().get())
+        self._pool.close()
+        self._pool.join()
+
+
+def encode_png(data, size, path):
+    """Write an RGB frame to a PNG file. Runs in the worker processes."""
+    pygame.image.save(pygame.image.frombuffer(data, size, 'RGB'), path)
+
+
+class PngSink(PoolSink):
+    """Numbered PNG frames in a directory"""
+
+    def __init__(self, directory, size):
+        PoolSink.__init__(self)
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._size = size
+        self._frame_count = 0
+
+    def add(self, data):
+        self._submit(encode_png, (data, self._size, str(self._directory / ('frame%06d.png' % self._frame_count))))
+        self._frame_count += 1
+
+
+def make_gif_palette(game_palette):
+    """256 color GIF palette: every color of the game's palette (the snakes, the arena), then an even spread of other
+    colors for effects and labels"""
+    colors = []
+    for color in game_palette:
+        color = tuple(color[:3])
+        if color not in colors:
+            colors.append(color)
+    levels = (0, 51, 102, 153, 204, 255)
+    for color in ((r, g, b) for r in levels for g in levels for b in levels):
+        if len(colors) == 256:
+            break
+        if color not in colors:
+            colors.append(color)
+    colors += [(0, 0, 0)] * (256 - len(colors))
+    return colors
+
+
+_gif_color_lookup = None  # palette index of every 15 bit color, in a GIF worker process
+
+
+def init_gif_worker(palette):
+    """Work out the nearest palette color to every 15 bit (5 bits per channel) color, once per worker process"""
+    global _gif_color_lookup
+    colors = numpy.array(palette, numpy.int32)
+    levels = numpy.arange(32, dtype=numpy.int32) * 255 // 31
+    lookup = numpy.empty(32 * 32 * 32, numpy.uint8)
+    for r in range(32):
+        rgb = numpy.stack(numpy.meshgrid([levels[r]], levels, levels, indexing='ij'), -1).reshape(-1, 3)
+        distances = ((rgb[:, numpy.newaxis, :] - colors[numpy.newaxis, :, :]) ** 2).sum(axis=2)
+        lookup[r * 1024:(r + 1) * 1024] = distances.argmin(axis=1)
+    _gif_color_lookup = lookup
+
+
+def lzw_encode(indices):
+    """GIF LZW compression of a sequence of 8 bit palette indices, split into data sub-blocks"""
+    clear_code = 256
+    end_code = 257
+    code_size = 9
+    next_code = 258
+    table = {}
+    out = bytearray()
+    bits = clear_code
+    bit_count = code_size
+    prefix = indices[0]
+    for idx in indices[1:]:
+        key = prefix << 8 | idx
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        bits |= prefix << bit_count
+        bit_count += code_size
+        if next_code < GIF_MAX_CODE:
+            table[key] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        else:  # the code table is full, start over
+            bits |= clear_code << bit_count
+            bit_count += code_size
+            table = {}
+            code_size = 9
+            next_code = 258
+        while bit_count >= 8:
+            out.append(bits & 0xff)
+            bits >>= 8
+            bit_count -= 8
+        prefix = idx
+    bits |= prefix << bit_count
+    bit_count += code_size
+    bits |= end_code << bit_count
+    bit_count += code_size
+    while bit_count > 0:
+        out.append(bits & 0xff)
+        bits >>= 8
+        bit_count -= 8
+
+    blocks = bytearray([8])  # minimum code size
+    for pos in range(0, len(out), 255):
+        chunk = out[pos:pos + 255]
+        blocks.append(len(chunk))
+        blocks += chunk
+    blocks.append(0)
+    return bytes(blocks)
+
+
+def encode_gif_frame(data, rect, delay):
+    """GIF graphic control extension and image of the part of a frame (RGB bytes) that changed. Runs in the worker
+    processes."""
+    left, top, width, height = rect
+    rgb = numpy.frombuffer(data, numpy.uint8).reshape(-1, 3) >> 3
+    color15 = (rgb[:, 0].astype(numpy.int32) << 10) | (rgb[:, 1].astype(numpy.int32) << 5) | rgb[:, 2]
+    indices = _gif_color_lookup[color15].tobytes()
+    header = bytearray(b'\x21\xf9\x04\x04')  # graphic control extension: leave the previous frame under this one
+    header += delay.to_bytes(2, 'little') + b'\x00\x00'
+    header += b'\x2c' + b''.join(value.to_bytes(2, 'little') for value in (left, top, width, height)) + b'\x00'
+    return bytes(header) + lzw_encode(indices)
+
+
+class GifSink(PoolSink):
+    """Looping animated GIF. Each frame only holds the rectangle that changed since the one before it, which keeps
+    both the file and the encoding work small (the arena changes little from frame to frame)."""
+
+    def __init__(self, path, size, fps, palette):
+        self._file = open(path, 'wb')
+        PoolSink.__init__(self, init_gif_worker, (palette,))
+        self._size = size
+        self._fps = fps
+        self._previous = None
+        self._frame_count = 0
+        width, height = size
+        self._file.write(b'GIF89a' + width.to_bytes(2, 'little') + height.to_bytes(2, 'little') + b'\xf7\x00\x00')
+        self._file.write(bytes(component for color in palette for component in color))
+        self._file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')  # loop forever
+
+    def add(self, data):
+        width, height = self._size
+        frame = numpy.frombuffer(data, numpy.uint8).reshape(height, width, 3)
+        if self._previous is None:
+            rect = (0, 0, width, height)
+        else:
+            changed = (frame != self._previous).any(axis=2)
+            rows = numpy.flatnonzero(changed.any(axis=1))
+            columns = numpy.flatnonzero(changed.any(axis=0))
+            if len(rows):
+                rect = (int(columns[0]), int(rows[0]), int(columns[-1] - columns[0] + 1), int(rows[-1] - rows[0] + 1))
+            else:
+                rect = (0, 0, 1, 1)  # nothing changed. A frame has to hold at least one pixel.
+        self._previous = frame
+        left, top, rect_width, rect_height = rect
+        # delays are in hundredths of a second. Rounded so they add up without drifting.
+        delay = round(100.0 * (self._frame_count + 1) / self._fps) - round(100.0 * self._frame_count / self._fps)
+        self._frame_count += 1
+        self._submit(encode_gif_frame, (frame[top:top + rect_height, left:left + rect_width].tobytes(), rect, delay))
+
+    def _collect(self, result):
+        self._file.write(result)
+
+    def close(self):
+        PoolSink.close(self)
+        self._file.write(b'\x3b')
+        self._file.close()
+
+
+class FfmpegSink(object):
+    """Video file, encoded by ffmpeg (which uses every core itself) from raw frames piped to it"""
+
+    def __init__(self, path, size, fps):
+        command = [CFG.Export.FfmpegCommand, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                   '-s', '%dx%d' % size, '-r', str(fps), '-i', '-', '-pix_fmt', 'yuv420p', str(path)]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def add(self, data):
+        self._process.stdin.write(data)
+
+    def close(self):
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError('ffmpeg failed with exit code %d' % self._process.returncode)
+
+
+def make_sink(out, size, fps, game_palette):
+    """Sink for the kind of export the out path asks for (see the module docstring)"""
+    out = Path(out)
+    suffix = out.suffix.lower()
+    if suffix == '.gif' or suffix in VIDEO_SUFFIXES:
+        out.parent.mkdir(parents=True, exist_ok=True)
+    if suffix == '.gif':
+        return GifSink(out, size, fps, make_gif_palette(game_palette))
+    if suffix in VIDEO_SUFFIXES:
+        return FfmpegSink(out, size, fps)
+    return PngSink(out, size)
+
+
+def export(recording, resource_path, out, size=None, fps=None, start=0.0, end=None):
+    """Render a replay.Replay, from start to end seconds of gameplay, to out (see the module docstring). Returns the
+    number of frames written."""
+    size = tuple(size or CFG.Export.Size)
+    fps = fps or CFG.Export.FrameRate
+    seeker = playback.Seeker(recording, resource_path)
+    writer = FrameWriter(make_sink(out, size, fps, seeker.game.palette))
+    try:
+        frame_count = render_frames(seeker, size, fps, start, end, writer.queue)
+    finally:
+        writer.queue.put(None)  # no more frames
+    writer.wait()
+    return frame_count
+
+
+def export_capture(recorded, out, size=None, fps=None):
+    """Write a capture.Capture to out (see the module docstring), resampled to fps frames a second. Returns the number
+    of frames written."""
+    size = tuple(size or CFG.Export.Size)
+    fps = fps or CFG.Export.FrameRate
+    writer = FrameWriter(make_sink(out, size, fps, arc_core.make_palette(arc_core.get_player_colors())))
+    frame_count = 0
+    try:
+        end_time = recorded.frames[-1][0] if recorded.frames else -1.0
+        idx = 0
+        while frame_count / float(fps) <= end_time:
+            while idx + 1 < len(recorded.frames) and recorded.frames[idx + 1][0] <= frame_count / float(fps):
+                idx += 1  # the last frame captured by then
+            rgb = recorded.get_frame(idx)
+            frame = pygame.image.frombuffer(rgb.tobytes(), (rgb.shape[1], rgb.shape[0]), 'RGB')
+            if frame.get_size() != size:
+                frame = pygame.transform.smoothscale(frame, size)
+            writer.queue.put(pygame.image.tostring(frame, 'RGB'))
+            frame_count += 1
+    finally:
+        writer.queue.put(None)  # no more frames
+    writer.wait()
+    return frame_count
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    out_path = sys.argv[sys.argv.index('--out') + 1] if '--out' in sys.argv else 'replay_export.gif'
+    frame_size = None
+    if '--size' in sys.argv:
+        frame_size = tuple(int(value) for value in sys.argv[sys.argv.index('--size') + 1].lower().split('x'))
+    frame_rate = int(sys.argv[sys.argv.index('--fps') + 1]) if '--fps' in sys.argv else None
+    start_time = float(sys.argv[sys.argv.index('--start') + 1]) if '--start' in sys.argv else 0.0
+    end_time = float(sys.argv[sys.argv.index('--end') + 1]) if '--end' in sys.argv else None
+    began = time.perf_counter()
+    if sys.argv[1].endswith('.arccapture'):
+        recorded = capture.Capture.load(sys.argv[1])
+        count = export_capture(recorded, out_path, frame_size, frame_rate)
+        print('Exported %d frames of %s (%d frames captured) to %s in %.1f seconds' % (
+            count, sys.argv[1], len(recorded.frames), out_path, time.perf_counter() - began))
+    else:
+        resources = Path(__file__).resolve().parent / 'resources'
+        recording = replay.Replay.load(sys.argv[1])
+        count = export(recording, resources, out_path, frame_size, frame_rate, start_time, end_time)
+        print('Exported %d frames of %s (%s, %d players) to %s in %.1f seconds' % (
+            count, sys.argv[1], recording.header['round'], len(recording.header['players']), out_path,
+            time.perf_counter() - began))
@@ -0,0 +1,146 @@
+"""
+Per-tick logs of where every snake was and what happened in a round, for batch analytics (see analytics.py and
+settings.GameLog)
+
+File format:
+
+    b'ARCL', uint8 version
+    varint length, then UTF-8 JSON header: round class, seed, round index, playfield size, player names
+    records, each a varint tag followed by the tag's payload:
+        TAG_TICKS  varint tick count, then that many tick records (see get_tick_dtype()): the tick length as float32,
+                   then x and y of every snake (in player order) as int16, or DEAD for snakes that have died
+        TAG_EVENT  varint kind (EVENT_*), varint tick (number of ticks logged before it), varint player index, zigzag
+                   varint other player index (the killer of a death, or -1), zigzag varint x, zigzag varint y
+        TAG_END    nothing
+
+Ticks are only logged while the snakes move (not during the countdown at the start of a round). Tick records have a
+fixed size, so a reader turns each block of them into a NumPy array without looking at every tick.
+"""
+import json
+import struct
+import numpy
+from arc_arena import replay
+from arc_arena import utils
+
+MAGIC = b'ARCL'
+VERSION = 1
+TAG_TICKS = 1
+TAG_EVENT = 2
+TAG_END = 3
+EVENT_DEATH = 1
+EVENT_APPLE = 2
+DEAD = -32768  # position of a snake that has died
+
+
+def get_tick_dtype(player_count):
+    """NumPy dtype of a tick record"""
+    return numpy.dtype([('time_delta', '<f4'), ('pos', '<i2', (player_count, 2))])
+
+
+class GameLogRecorder(object):
+    """Logs one round. Call add_tick() after every tick the snakes moved, add_event() when something happens, and
+    close() when the round is over."""
+    _FLUSH_TICKS = 120  # hand a block of ticks to the writer about every two seconds
+
+    def __init__(self, path, header, player_count):
+        self.path = path
+        self._writer = utils.BackgroundFileWriter(path, 'GameLogWriter')
+        self._tick_struct = struct.Struct('<f%dh' % (player_count * 2))
+        self._dead = (DEAD, DEAD)
+        header_bytes = json.dumps(header).encode('utf-8')
+        buf = bytearray(MAGIC)
+        buf.append(VERSION)
+        replay.write_varint(buf, len(header_bytes))
+        buf += header_bytes
+        self._writer.write(bytes(buf))
+        self._ticks = bytearray()
+        self._block_ticks = 0
+        self._events = bytearray()
+        self.tick_count = 0
+
+    def add_tick(self, time_delta, snakes, alive_snakes):
+        """Log the positions of snakes (every snake, in player order) after a tick"""
+        coords = []
+        for snake in snakes:
+            coords.extend((int(snake.pos.x), int(snake.pos.y)) if snake in alive_snakes else self._dead)
+        self._ticks += self._tick_struct.pack(time_delta, *coords)
+        self._block_ticks += 1
+        self.tick_count += 1
+        if self._block_ticks == self._FLUSH_TICKS:
+            self._flush()
+
+    def add_event(self, kind, player_idx, other_idx, pos):
+        """Log an event (EVENT_*) that happened to a player at pos. other_idx is another player it involved, or -1."""
+        buf = self._events
+        replay.write_varint(buf, TAG_EVENT)
+        replay.write_varint(buf, kind)
+        replay.write_varint(buf, self.tick_count)
+        replay.write_varint(buf, player_idx)
+        replay.write_varint(buf, replay.zigzag(other_idx))
+        replay.write_varint(buf, replay.zigzag(int(pos[0])))
+        replay.write_varint(buf, replay.zigzag(int(pos[1])))
+
+    def _flush(self):
+        # events go after the ticks they happened during, so a reader sees them in order
+        buf = bytearray()
+        if self._block_ticks:
+            replay.write_varint(buf, TAG_TICKS)
+            replay.write_varint(buf, self._block_ticks)
+            buf += self._ticks
+        buf += self._events
+        if buf:
+            self._writer.write(bytes(buf))
+        self._ticks = bytearray()
+        self._block_ticks = 0
+        self._events = bytearray()
+
+    def close(self):
+        self._flush()
+        self._writer.write(bytes([TAG_END]))
+        self._writer.close()
+
+    def wait(self):
+        """Wait for everything to be written to disk (after close())"""
+        self._writer.wait()
+
+
+class GameLog(object):
+    """A round log read back in: the header, a NumPy array of tick records and a list of events"""
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a round log file')
+        if data[len(MAGIC)] != VERSION:
+            raise ValueError('Round log version %d is not supported' % data[len(MAGIC)])
+        length, pos = replay.read_varint(data, len(MAGIC) + 1)
+        self.header = json.loads(bytes(data[pos:pos + length]).decode('utf-8'))
+        self.events = []  # (kind, tick, player index, other player index, x, y)
+        self.is_complete = False
+        dtype = get_tick_dtype(len(self.header['players']))
+        blocks = []
+        pos += length
+        while pos < len(data):
+            tag, pos = replay.read_varint(data, pos)
+            if tag == TAG_TICKS:
+                count, pos = replay.read_varint(data, pos)
+                blocks.append(numpy.frombuffer(data, dtype, count, pos))
+                pos += count * dtype.itemsize
+            elif tag == TAG_EVENT:
+                values = []
+                for _ in range(6):
+                    value, pos = replay.read_varint(data, pos)
+                    values.append(value)
+                kind, tick, player_idx, other_idx, x, y = values
+                self.events.append((kind, tick, player_idx, replay.unzigzag(other_idx), replay.unzigzag(x),
+                                    replay.unzigzag(y)))
+            elif tag == TAG_END:
+                self.is_complete = True
+                break
+            else:
+                raise ValueError('Unknown round log record tag %d at byte %d' % (tag, pos))
+        self.ticks = numpy.concatenate(blocks) if blocks else numpy.zeros(0, dtype)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return GameLog(f.read())
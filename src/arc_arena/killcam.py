@@ -0,0 +1,85 @@
+"""
+Kill cam: instant replay of the end of a round, in slow motion, on the score screen (see settings.KillCam)
+
+While a round is played, every circle stamped onto the game surface (trails, heads, bullet craters) and every explosion
+is kept for the last few seconds, in a ring buffer of compact per-frame records. No frames are stored, so memory use
+depends on neither the length of the round nor the resolution.
+
+To play it back, the buffered stamps are erased from the game surface, then drawn again frame by frame. Stamps are
+opaque, so once they have all been drawn again the game surface is exactly as the round left it. Drawing that didn't
+come from those stamps (ex: the squeeze circle, trails erased all at once) isn't replayed.
+"""
+import array
+import collections
+from arc_arena import settings
+from arc_arena import chunks
+
+CFG = settings  # quick alias
+
+
+class KillCam(object):
+    """Ring buffer of the last settings.KillCam.Seconds of a round, and its slow motion playback"""
+
+    def __init__(self, background_color):
+        self._background_color = background_color
+        # [frame length, stamps as flat x, y, radius, color array, snakes that exploded or None], oldest first
+        self._frames = collections.deque(maxlen=int(CFG.KillCam.Seconds * CFG.KillCam.MaxFrameRate))
+        self._buffered_time = 0.0
+        self._frame = None  # record of the frame being recorded
+        self._playback_idx = None  # next frame to draw again, while playing back
+        self._playback_time = 0.0
+        self._drawn_time = 0.0  # playback time up to the end of the last frame drawn again
+
+    def begin_frame(self, time_delta):
+        """Start recording a frame. Drops the oldest one once the buffer holds enough."""
+        if len(self._frames) == self._frames.maxlen:
+            self._buffered_time -= self._frames[0][0]
+        self._frame = [time_delta, array.array('i'), None]
+        self._frames.append(self._frame)
+        self._buffered_time += time_delta
+        while self._buffered_time - self._frames[0][0] >= CFG.KillCam.Seconds:
+            self._buffered_time -= self._frames.popleft()[0]
+
+    def add_stamp(self, pos, radius, color):
+        """Note a filled circle drawn on the game surface"""
+        if self._frame is not None:
+            self._frame[1].extend((pos[0], pos[1], radius, color))
+
+    def add_explosion(self, snake):
+        if self._frame is not None:
+            if self._frame[2] is None:
+                self._frame[2] = []
+            self._frame[2].append(snake)
+
+    def start_playback(self, game_surface):
+        """Rewind the game surface to the start of the buffer (by erasing everything stamped since). Returns False if
+        there is nothing to play back."""
+        if not self._frames:
+            return False
+        self._frame = None  # the round is over, stop recording
+        for time_delta, stamps, explosions in self._frames:
+            for idx in range(0, len(stamps), 4):
+                chunks.draw_circle(game_surface, self._background_color, (stamps[idx], stamps[idx + 1]),
+                                   stamps[idx + 2])
+        self._playback_idx = 0
+        self._playback_time = 0.0
+        self._drawn_time = 0.0
+        return True
+
+    def is_playing(self):
+        return self._playback_idx is not None and self._playback_idx < len(self._frames)
+
+    def step(self, time_delta, game_surface, actors):
+        """Advance the playback (at settings.KillCam.SlowMotion speed), drawing the stamps of every frame that is due
+        again and adding its explosions to actors"""
+        if not self.is_playing():
+            return
+        self._playback_time += time_delta * CFG.KillCam.SlowMotion
+        while self.is_playing() and self._drawn_time + self._frames[self._playback_idx][0] <= self._playback_time:
+            frame_time, stamps, explosions = self._frames[self._playback_idx]
+            for idx in range(0, len(stamps), 4):
+                chunks.draw_circle(game_surface, stamps[idx + 3], (stamps[idx], stamps[idx + 1]), stamps[idx + 2])
+            for snake in explosions or ():
+                actors.append(snake.make_explosion())  # dead snakes stay where they crashed
+            self._drawn_time += frame_time
+            self._playback_idx += 1
@@ -0,0 +1,138 @@
+"""
+Input-to-photon latency measurement (see settings.Latency)
+
+An input is stamped when it arrives, followed through to the point where it changes something (a snake's turn
+state, or a name/color on the registration screen), and measured when the first frame that shows that change is put on
+the display with pygame.display.update(). Latencies are kept per kind of device and reported as histograms.
+"""
+import random
+import time
+import pygame
+from arc_arena import arc_core
+from arc_arena import netinput
+
+KINDS = (arc_core.KEYBOARD, arc_core.MOUSE, arc_core.GAMEPAD, arc_core.NETWORK)
+
+
+class LatencyMeter(object):
+    """Collects input-to-photon latencies, from when an input arrived to when the display showed its effect"""
+
+    def __init__(self, bucket_ms, bucket_count):
+        self._bucket_ms = bucket_ms
+        self._bucket_count = bucket_count
+        self._applied = []  # (kind, input time) of inputs that took effect after the current frame was drawn
+        self._in_frame = []  # (kind, input time) of inputs whose effect is in the frame that is being drawn
+        self._samples = {kind: [] for kind in KINDS}  # kind -> latencies in seconds
+
+    def on_input_applied(self, stamp):
+        """An input, stamped with (device kind, time it arrived), has changed the state of the game. Call when it changes
+        something, not when it arrives."""
+        self._applied.append(stamp)
+
+    def on_frame_drawn(self):
+        """Call when drawing of a frame starts. Everything applied before this is visible in this frame."""
+        self._in_frame.extend(self._applied)
+        self._applied = []
+
+    def on_frame_presented(self):
+        """Call right after pygame.display.update()"""
+        now = time.perf_counter()
+        for kind, input_time in self._in_frame:
+            self._samples[kind].append(now - input_time)
+        self._in_frame = []
+
+    def get_histogram(self, kind):
+        """Count of samples in each bucket. The last bucket also counts everything longer than it."""
+        counts = [0] * self._bucket_count
+        for latency in self._samples[kind]:
+            counts[min(int(latency * 1000.0 / self._bucket_ms), self._bucket_count - 1)] += 1
+        return counts
+
+    def report(self):
+        """Return a text report of the histograms collected so far"""
+        lines = ['Input-to-photon latency']
+        for kind in KINDS:
+            samples = sorted(self._samples[kind])
+            if not samples:
+                continue
+            lines.append('  %s: %d inputs, median %.1f ms, 95th percentile %.1f ms, max %.1f ms' % (
+                kind, len(samples), samples[len(samples) // 2] * 1000.0, samples[int(len(samples) * 0.95)] * 1000.0,
+                samples[-1] * 1000.0))
+            counts = self.get_histogram(kind)
+            most = max(counts)
+            for idx, count in enumerate(counts):
+                if count == 0:
+                    continue
+                label = '%3d-%3d ms' % (idx * self._bucket_ms, (idx + 1) * self._bucket_ms)
+                if idx == self._bucket_count - 1:
+                    label = '%3d+    ms' % (idx * self._bucket_ms)
+                lines.append('    %s %5d %s' % (label, count, '#' * max(1, int(40 * count / most))))
+        if len(lines) == 1:
+            lines.append('  no inputs')
+        return '\n'.join(lines)
+
+    def reset(self):
+        self._applied = []
+        self._in_frame = []
+        self._samples = {kind: [] for kind in KINDS}
+
+
+def make_button_event(button, is_pressed, input_time):
+    """Make the pygame event for pressing or releasing a (device, button) from arc_core.InputConfig.get_buttons()"""
+    device, idx = button
+    if device == arc_core.KEYBOARD:
+        event_type = pygame.KEYDOWN if is_pressed else pygame.KEYUP
+        return pygame.event.Event(event_type, key=idx, mod=0, unicode='', scancode=0, input_time=input_time)
+    elif device == arc_core.MOUSE:
+        event_type = pygame.MOUSEBUTTONDOWN if is_pressed else pygame.MOUSEBUTTONUP
+        return pygame.event.Event(event_type, button=idx, pos=(0, 0), input_time=input_time)
+    elif isinstance(device, netinput.NetClient):
+        event_type = netinput.NETBUTTONDOWN if is_pressed else netinput.NETBUTTONUP
+        return pygame.event.Event(event_type, client=device.client_id, button=idx, input_time=input_time)
+    event_type = pygame.JOYBUTTONDOWN if is_pressed else pygame.JOYBUTTONUP
+    return pygame.event.Event(event_type, joy=device._joy.get_id(), instance_id=device._joy.get_id(), button=idx,
+                              input_time=input_time)
+
+
+class SyntheticInput(object):
+    """Presses and releases the registered players' buttons at random by posting events to the pygame event queue, so
+    the same input path can be measured without anyone at the controls (works with SDL_VIDEODRIVER=dummy). Only
+    presses buttons between start() and stop(), which rounds call, because the other screens (ex: registration) would
+    take the presses as players changing their names and colors."""
+
+    def __init__(self, press_rate, min_hold, max_hold, rng=random):
+        self._press_rate = press_rate  # average presses per second
+        self._min_hold = min_hold
+        self._max_hold = max_hold
+        self._rng = rng
+        self._pressed = {}  # (device, button) -> seconds left until it is released
+        self.is_active = False
+
+    def start(self):
+        self.is_active = True
+
+    def stop(self):
+        """Stop pressing buttons and forget the held ones. Their releases are never posted (pygame's own key state
+        never saw the presses, so there is nothing to undo)."""
+        self.is_active = False
+        self._pressed = {}
+
+    def is_pressed(self, button):
+        return button in self._pressed
+
+    def step(self, controllers, time_delta):
+        if not self.is_active:
+            return
+        for button, remaining in list(self._pressed.items()):
+            remaining -= time_delta
+            if remaining > 0.0:
+                self._pressed[button] = remaining
+            else:
+                del self._pressed[button]
+                pygame.event.post(make_button_event(button, False, time.perf_counter()))
+
+        if controllers and self._rng.random() < self._press_rate * time_delta:
+            button = self._rng.choice(self._rng.choice(controllers)._input_config.get_buttons())
+            if button not in self._pressed:
+                self._pressed[button] = self._rng.uniform(self._min_hold, self._max_hold)
+                pygame.event.post(make_button_event(button, True, time.perf_counter()))
@@ -0,0 +1,320 @@
+"""
+Controller server for players on the local network (ex: a phone running a two button controller page or app)
+
+Each client sends small packets with the state of its left and right buttons, either as UDP datagrams or, for web
+pages (browsers can't send UDP), as binary messages over a WebSocket (ws://HOST:PORT/, the same port number over TCP):
+
+    2 bytes   magic, b'AR'
+    uint16    client id, picked by the client (ex: random), identifies the player's device across packets
+    uint32    sequence number, incremented for every packet the client sends (wraps around)
+    uint8     button state bits (bit 0 is left, bit 1 is right)
+
+All values are big-endian. Packets are tiny and state (not changes) is sent, so a client should send its state every
+time it changes and also repeat it a few times a second, so that a lost packet is covered by the next one. Packets
+that arrive out of order (sequence number not newer than the last one from that client) are dropped.
+
+A WebSocket message holds exactly one packet. The server only answers the WebSocket handshake, pings and closes, it
+doesn't serve the controller page itself.
+
+The server runs an asyncio event loop on its own thread, so receiving never blocks the pygame loop. A packet updates
+the client's button state right away (read with NetClient.get_button(), like a joystick) and posts NETBUTTONDOWN /
+NETBUTTONUP events for any buttons that changed, so network input adds no latency beyond the next frame.
+"""
+import asyncio
+import base64
+import hashlib
+import random
+import socket
+import struct
+import threading
+import time
+import pygame
+
+PACKET = struct.Struct('!2sHIB')
+MAGIC = b'AR'
+LEFT_BUTTON = 0
+RIGHT_BUTTON = 1
+
+# pygame events for network buttons. Attributes: client (client id), button, input_time (when it was received)
+NETBUTTONDOWN = pygame.event.custom_type()
+NETBUTTONUP = pygame.event.custom_type()
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_BINARY = 0x2
+WS_CLOSE = 0x8
+WS_PING = 0x9
+WS_PONG = 0xa
+WS_MAX_PAYLOAD = 125  # packets are tiny, anything longer than a short frame is not a client of ours
+
+
+def is_newer_sequence(seq, last_seq):
+    """Is sequence number seq newer than last_seq, allowing for wrap around"""
+    diff = (seq - last_seq) % (1 << 32)
+    return 0 < diff < (1 << 31)
+
+
+class NetClient(object):
+    """One player's device on the network. Acts like a two button joystick."""
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.address = None
+        self.last_seq = None
+        self.last_receive_time = None
+        self._state = 0
+
+    def get_button(self, idx):
+        return bool(self._state & (1 << idx))
+
+    def __str__(self):
+        return 'network client #%d (%s)' % (self.client_id, self.address[0] if self.address else 'not connected')
+
+
+class _ServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self._server = server
+
+    def datagram_received(self, data, addr):
+        self._server.on_packet(data, addr)
+
+
+def get_websocket_accept(key):
+    """Sec-WebSocket-Accept value answering a Sec-WebSocket-Key"""
+    return base64.b64encode(hashlib.sha1(key.strip().encode('ascii') + WEBSOCKET_GUID).digest()).decode('ascii')
+
+
+def make_websocket_frame(opcode, payload, mask=None):
+    """A single, final WebSocket frame (short payloads only). Clients must mask their frames, servers must not."""
+    frame = bytearray((0x80 | opcode, len(payload) | (0x80 if mask is not None else 0)))
+    if mask is not None:
+        frame += mask
+        payload = bytes(b ^ mask[idx % 4] for idx, b in enumerate(payload))
+    return bytes(frame + payload)
+
+
+async def read_websocket_frame(reader):
+    """Returns (opcode, payload) of the next frame, or None if the frame is not one a client of ours would send"""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7f
+    if not first & 0x80 or not second & 0x80 or length > WS_MAX_PAYLOAD:
+        return None  # fragmented, unmasked or too long
+    mask = await reader.readexactly(4)
+    payload = await reader.readexactly(length)
+    return first & 0x0f, bytes(b ^ mask[idx % 4] for idx, b in enumerate(payload))
+
+
+class NetInputServer(object):
+    """UDP and WebSocket server that receives button state from NetClients (see module docstring for the protocol)"""
+
+    def __init__(self, host, port, post_events=True):
+        self._host = host
+        self._port = port
+        self._post_events = post_events  # False to only track state, ex: without a pygame event queue
+        self._clients = {}  # client id -> NetClient
+        self._lock = threading.Lock()
+        self._loop = None
+        self._transport = None
+        self._ws_server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._start_error = None
+        self.packet_count = 0
+        self.dropped_count = 0  # bad or out of order packets
+
+    def start(self):
+        """Start serving on a background thread. Returns once the socket is bound."""
+        if self._post_events:
+            pygame.event.set_allowed((NETBUTTONDOWN, NETBUTTONUP))
+        self._thread = threading.Thread(target=self._run, name='NetInputServer', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            raise self._start_error
+        print('Network input server listening on %s:%d (UDP and WebSocket)' % self.get_address())
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def get_address(self):
+        return self._transport.get_extra_info('sockname')[:2]
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._transport, _ = self._loop.run_until_complete(self._loop.create_datagram_endpoint(
+                lambda: _ServerProtocol(self), local_addr=(self._host, self._port)))
+            self._ws_server = self._loop.run_until_complete(asyncio.start_server(
+                self._serve_websocket, self._host, self.get_address()[1]))
+        except OSError as exc:
+            if self._transport is not None:
+                self._transport.close()
+            self._start_error = exc
+            self._loop.close()
+            self._loop = None
+            self._started.set()
+            return
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._transport.close()
+            self._ws_server.close()
+            self._loop.close()
+
+    async def _serve_websocket(self, reader, writer):
+        """Handle one WebSocket connection (on the server thread): the handshake, then a packet per binary message"""
+        addr = writer.get_extra_info('peername')
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            headers = {}
+            for line in request.decode('latin-1').split('\r\n')[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if 'sec-websocket-key' not in headers:
+                writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+                return
+            writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                          'Sec-WebSocket-Accept: %s\r\n\r\n' % get_websocket_accept(headers['sec-websocket-key'])
+                          ).encode('ascii'))
+            while True:
+                frame = await read_websocket_frame(reader)
+                if frame is None:
+                    self.dropped_count += 1
+                    return
+                opcode, payload = frame
+                if opcode == WS_BINARY:
+                    self.on_packet(payload, addr)
+                elif opcode == WS_PING:
+                    writer.write(make_websocket_frame(WS_PONG, payload))
+                elif opcode == WS_CLOSE:
+                    writer.write(make_websocket_frame(WS_CLOSE, payload[:2]))
+                    return
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            return  # the client went away
+        finally:
+            writer.close()
+
+    def get_client(self, client_id):
+        """Return the NetClient for a client id, making it if no packets have been seen from it yet"""
+        with self._lock:
+            client = self._clients.get(client_id)
+            if client is None:
+                client = NetClient(client_id)
+                self._clients[client_id] = client
+            return client
+
+    def get_clients(self):
+        with self._lock:
+            return list(self._clients.values())
+
+    def on_packet(self, data, addr):
+        """Handle one packet (called on the server thread)"""
+        now = time.perf_counter()
+        self.packet_count += 1
+        if len(data) != PACKET.size:
+            self.dropped_count += 1
+            return
+        magic, client_id, seq, state = PACKET.unpack(data)
+        if magic != MAGIC:
+            self.dropped_count += 1
+            return
+        client = self.get_client(client_id)
+        if client.last_seq is not None and not is_newer_sequence(seq, client.last_seq):
+            self.dropped_count += 1
+            return
+        client.address = addr
+        client.last_seq = seq
+        client.last_receive_time = now
+        changed = client._state ^ state
+        client._state = state
+        if self._post_events and changed:
+            for button in (LEFT_BUTTON, RIGHT_BUTTON):
+                if changed & (1 << button):
+                    event_type = NETBUTTONDOWN if state & (1 << button) else NETBUTTONUP
+                    pygame.event.post(pygame.event.Event(event_type, client=client_id, button=button,
+                                                         input_time=now))
+
+
+class LoopbackClient(object):
+    """Client that sends button state packets to a server over UDP, for testing without a phone"""
+
+    def __init__(self, client_id, address):
+        self.client_id = client_id
+        self._address = address
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._seq = random.getrandbits(32)  # start anywhere, so wrap around gets exercised too
+
+    def send(self, is_left_pressed, is_right_pressed):
+        self._seq = (self._seq + 1) % (1 << 32)
+        state = (1 << LEFT_BUTTON if is_left_pressed else 0) | (1 << RIGHT_BUTTON if is_right_pressed else 0)
+        self._sock.sendto(PACKET.pack(MAGIC, self.client_id, self._seq, state), self._address)
+
+    def close(self):
+        self._sock.close()
+
+
+class LoopbackWebSocketClient(LoopbackClient):
+    """Client that sends button state packets to a server over a WebSocket, like a controller page in a browser"""
+
+    def __init__(self, client_id, address):
+        self.client_id = client_id
+        self._sock = socket.create_connection(address)
+        self._seq = random.getrandbits(32)
+        key = base64.b64encode(bytes(random.getrandbits(8) for _ in range(16))).decode('ascii')
+        self._sock.sendall(('GET / HTTP/1.1\r\nHost: %s:%d\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                            'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n' % (address[0], address[1], key)
+                            ).encode('ascii'))
+        response = b''
+        while not response.endswith(b'\r\n\r\n'):
+            data = self._sock.recv(1)
+            if not data:
+                raise ConnectionError('WebSocket handshake with %s:%d failed' % address)
+            response += data
+        if get_websocket_accept(key).encode('ascii') not in response:
+            raise ConnectionError('WebSocket handshake with %s:%d failed' % address)
+
+    def send(self, is_left_pressed, is_right_pressed):
+        self._seq = (self._seq + 1) % (1 << 32)
+        state = (1 << LEFT_BUTTON if is_left_pressed else 0) | (1 << RIGHT_BUTTON if is_right_pressed else 0)
+        mask = bytes(random.getrandbits(8) for _ in range(4))
+        self._sock.sendall(make_websocket_frame(WS_BINARY, PACKET.pack(MAGIC, self.client_id, self._seq, state), mask))
+
+    def close(self):
+        self._sock.sendall(make_websocket_frame(WS_CLOSE, b'', bytes(4)))
+        self._sock.close()
+
+
+def simulate_clients(address, client_count, duration, send_rate=30.0, rng=random):
+    """Run client_count loopback clients (half of them over WebSockets) against a server, each sending random button
+    state send_rate times a second, for duration seconds. Returns {client id: (left, right) last sent}."""
+    clients = [(LoopbackWebSocketClient if idx % 2 else LoopbackClient)(client_id, address)
+               for idx, client_id in enumerate(rng.sample(range(1 << 16), client_count))]
+    last_sent = {}
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        for client in clients:
+            state = (rng.random() < 0.3, rng.random() < 0.3)
+            client.send(*state)
+            last_sent[client.client_id] = state
+        time.sleep(1.0 / send_rate)
+    for client in clients:
+        client.close()
+    return last_sent
+
+
+if __name__ == '__main__':
+    # loopback self test: simulated clients against a server on this machine
+    server = NetInputServer('127.0.0.1', 0, post_events=False)
+    server.start()
+    sent = simulate_clients(server.get_address(), 48, 2.0)
+    time.sleep(0.1)
+    mismatches = [client_id for client_id, (left, right) in sent.items()
+                  if (server.get_client(client_id).get_button(LEFT_BUTTON),
+                      server.get_client(client_id).get_button(RIGHT_BUTTON)) != (left, right)]
+    print('%d clients, %d packets, %d dropped, %d clients with the wrong final state' % (
+        len(sent), server.packet_count, server.dropped_count, len(mismatches)))
+    server.stop()
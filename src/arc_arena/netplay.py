@@ -0,0 +1,313 @@
+"""
+Deterministic lockstep netplay: two or more arc_arena instances playing one match over the network
+
+Every instance runs the same simulation, one fixed size tick at a time, and only the players' input is exchanged. Input
+sampled on tick t is scheduled for tick t + input delay, which gives it time to reach the other instances before it is
+needed. An instance that doesn't have everyone's input for its next tick waits. A CRC of the trail layer is exchanged
+every so often, so if the simulations ever drift apart (a desync), it is noticed and reported.
+
+For the simulations to stay identical, everything that decides what happens in a match must use the game's seeded
+random number generator (ArcGame.rng) instead of the global random module, and be stepped with the fixed tick length.
+
+Packets (UDP, big-endian):
+
+    HELLO  magic b'LS', uint8 1 (3 for a reply to a HELLO), uint8 peer index, then UTF-8 JSON:
+           {"seed": int, "players": [[name, color idx], ...]}
+    INPUT  magic b'LS', uint8 2, uint8 peer index, uint32 hash tick, uint32 hash crc, uint32 first tick,
+           uint8 tick count, then for each tick: one byte per player on that peer (turn state), one byte of flags
+
+Every INPUT packet repeats the last few ticks of input, so a lost packet is covered by the next one.
+
+Check that instances stay in sync, with two headless instances playing a round over loopback:
+
+    python -m arc_arena.netplay [ROUND_CLASS]
+"""
+import json
+import random
+import socket
+import struct
+import sys
+import time
+import zlib
+from pathlib import Path
+import pygame
+from arc_arena import chunks
+
+MAGIC = b'LS'
+HELLO = 1
+INPUT = 2
+HELLO_REPLY = 3
+_HEADER = struct.Struct('!2sBB')
+_INPUT_HEADER = struct.Struct('!IIIB')
+NO_HASH_TICK = 0xffffffff
+FLAG_CONTINUE = 1  # "press SPACE to continue" is held on that peer
+
+
+def hash_surface(surface):
+    """CRC32 of the pixels of an 8-bit surface (or chunks.ChunkedSurface)"""
+    if isinstance(surface, chunks.ChunkedSurface):
+        crc = 0
+        for key, chunk in sorted(surface.iter_chunks()):
+            crc = zlib.crc32(struct.pack('!ii', *key), crc)
+            crc = zlib.crc32(pygame.image.tostring(chunk, 'P'), crc)
+        return crc
+    return zlib.crc32(pygame.image.tostring(surface, 'P'))
+
+
+def parse_address(text):
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+
+class LockstepSession(object):
+    """One instance's side of a lockstep match"""
+
+    def __init__(self, addresses, peer_index, input_delay, tick_rate, redundancy=8):
+        self._addresses = [parse_address(a) if isinstance(a, str) else a for a in addresses]
+        self.peer_index = peer_index
+        self._input_delay = input_delay
+        self.tick_length = 1.0 / tick_rate
+        self._redundancy = max(redundancy, input_delay + 1)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(self._addresses[peer_index])
+        self._sock.setblocking(False)
+        self._hello = None
+        self._hellos = {}  # peer index -> hello dict
+        self._inputs = [{} for _ in self._addresses]  # per peer: tick -> bytes of input for that tick
+        self._local_hashes = {}  # tick -> crc
+        self._last_local_hash = (NO_HASH_TICK, 0)
+        self._local_configs = []
+        self._player_counts = []
+        self._current = None  # input bytes for every peer, for the tick being run
+        self._turns = []  # turn state for every player in the match, for the tick being run
+        self._next_tick_time = None
+        self._last_local_tick = -1  # the last tick that local input has been sampled for
+        self.tick = 0  # number of ticks that have been started
+        self.seed = None
+        self.desync_tick = None
+        self.stall_time = 0.0  # how long this instance has been waiting for a peer's input
+
+    def get_peer_count(self):
+        return len(self._addresses)
+
+    def connect(self, local_players, local_configs, timeout, seed=None):
+        """Exchange player lists with every peer. local_players is a list of (name, color idx), local_configs the
+        arc_core.InputConfig of each. Returns the players of the match, [(peer index, name, color idx)], in the same
+        order on every instance. The random seed for the match is picked by peer 0 and is in self.seed afterward."""
+        self._local_configs = list(local_configs)
+        self._hello = {'seed': random.getrandbits(32) if seed is None else seed, 'players': list(local_players)}
+        self._hellos[self.peer_index] = self._hello
+        end_time = time.perf_counter() + timeout
+        next_send = 0.0
+        while len(self._hellos) < len(self._addresses):
+            now = time.perf_counter()
+            if now > end_time:
+                raise TimeoutError('Timed out waiting for netplay peers %s' % [
+                    '%s:%d' % a for idx, a in enumerate(self._addresses) if idx not in self._hellos])
+            if now >= next_send:
+                for idx in range(len(self._addresses)):
+                    if idx != self.peer_index:
+                        self._send_hello(idx)
+                next_send = now + 0.1
+            self._receive()
+            time.sleep(0.005)
+        self.seed = self._hellos[0]['seed']
+        self._player_counts = [len(self._hellos[idx]['players']) for idx in range(len(self._addresses))]
+        # input for the ticks before the first local input can arrive: nobody is turning
+        for peer, count in enumerate(self._player_counts):
+            for tick in range(self._input_delay):
+                self._inputs[peer][tick] = bytes(count + 1)
+        self._next_tick_time = time.perf_counter()
+        print('Netplay: connected to %d peer(s) as peer %d. Seed: %d' % (len(self._addresses) - 1, self.peer_index,
+                                                                        self.seed))
+        return [(peer, name, color_idx) for peer in range(len(self._addresses))
+                for name, color_idx in self._hellos[peer]['players']]
+
+    def _send_hello(self, peer, msg_type=HELLO):
+        self._sock.sendto(_HEADER.pack(MAGIC, msg_type, self.peer_index) + json.dumps(self._hello).encode('utf-8'),
+                          self._addresses[peer])
+
+    def _send_inputs(self):
+        last_tick = self._last_local_tick
+        first_tick = max(self._input_delay, last_tick - self._redundancy + 1)
+        if last_tick < first_tick:
+            return
+        payload = b''.join(self._inputs[self.peer_index][tick] for tick in range(first_tick, last_tick + 1))
+        packet = _HEADER.pack(MAGIC, INPUT, self.peer_index) + _INPUT_HEADER.pack(
+            self._last_local_hash[0], self._last_local_hash[1], first_tick, last_tick - first_tick + 1) + payload
+        for idx, address in enumerate(self._addresses):
+            if idx != self.peer_index:
+                self._sock.sendto(packet, address)
+
+    def _receive(self):
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError:
+                continue  # a peer isn't listening yet (reported on some platforms)
+            if len(data) < _HEADER.size:
+                continue
+            magic, msg_type, peer = _HEADER.unpack_from(data)
+            if magic != MAGIC or peer == self.peer_index or peer >= len(self._addresses):
+                continue
+            if msg_type in (HELLO, HELLO_REPLY):
+                if peer not in self._hellos:
+                    self._hellos[peer] = json.loads(data[_HEADER.size:].decode('utf-8'))
+                if msg_type == HELLO and self._hello is not None:
+                    self._send_hello(peer, HELLO_REPLY)  # in case they haven't heard from us yet
+            elif msg_type == INPUT and self._player_counts:
+                self._on_input(peer, data)
+
+    def _on_input(self, peer, data):
+        hash_tick, crc, first_tick, count = _INPUT_HEADER.unpack_from(data, _HEADER.size)
+        size = self._player_counts[peer] + 1
+        offset = _HEADER.size + _INPUT_HEADER.size
+        for idx in range(count):
+            tick = first_tick + idx
+            if tick >= self.tick:
+                self._inputs[peer].setdefault(tick, data[offset + idx * size:offset + (idx + 1) * size])
+        if hash_tick != NO_HASH_TICK and hash_tick in self._local_hashes and self.desync_tick is None:
+            if self._local_hashes[hash_tick] != crc:
+                self.desync_tick = hash_tick
+                print('WARNING: Netplay desync with peer %d at tick %d' % (peer, hash_tick))
+
+    def advance(self, flags=0):
+        """Try to start the next tick. flags (FLAG_CONTINUE, etc.) are this instance's, for the tick that input sampled
+        now will be used on. Returns False if it isn't time for the next tick yet, or a peer's input for it hasn't
+        arrived (the game should wait and try again next frame). On True, get_turn() and is_continue_pressed() give
+        everyone's input for the tick."""
+        now = time.perf_counter()
+        if now < self._next_tick_time:
+            return False
+        input_tick = self.tick + self._input_delay
+        if input_tick not in self._inputs[self.peer_index]:
+            local = bytes((config.input() or 0) for config in self._local_configs)
+            self._inputs[self.peer_index][input_tick] = local + bytes((flags,))
+            self._last_local_tick = input_tick
+        self._receive()
+        self._send_inputs()
+        if any(self.tick not in inputs for inputs in self._inputs):
+            self.stall_time = now - self._next_tick_time
+            return False
+        self.stall_time = 0.0
+        self._current = [inputs[self.tick] for inputs in self._inputs]
+        for inputs in self._inputs:
+            inputs.pop(self.tick - self._redundancy, None)  # old enough that it won't be resent
+        self._turns = [turn or None for peer_input in self._current for turn in peer_input[:-1]]
+        self.tick += 1
+        # don't try to catch up on time lost waiting, that would just make the game jump ahead
+        self._next_tick_time = max(self._next_tick_time + self.tick_length, now - self.tick_length)
+        return True
+
+    def get_turn(self, player_idx):
+        """Turn state (InputConfig.TURN_LEFT, etc. or None) of a player (index into connect()'s list) for this tick"""
+        return self._turns[player_idx] if self._turns else None
+
+    def is_continue_pressed(self):
+        return self._current is not None and any(peer_input[-1] & FLAG_CONTINUE for peer_input in self._current)
+
+    def on_state_hash(self, crc):
+        """Record the hash of the game state at the end of the current tick, and share it with the peers"""
+        tick = self.tick - 1
+        self._local_hashes[tick] = crc
+        self._last_local_hash = (tick, crc)
+        for old_tick in [t for t in self._local_hashes if t < tick - 600]:
+            del self._local_hashes[old_tick]
+
+    def close(self):
+        self._sock.close()
+
+
+class _SelfTestConfig(object):
+    """Stand-in for an arc_core.InputConfig that holds a random turn state for a random number of ticks"""
+
+    def __init__(self, rng):
+        self._rng = rng
+        self._turn = None
+        self._ticks_left = 0
+
+    def input(self, snapshot=None):
+        if self._ticks_left <= 0:
+            self._turn = self._rng.choice((None, None, 1, 2, 3))
+            self._ticks_left = self._rng.randint(5, 60)
+        self._ticks_left -= 1
+        return self._turn
+
+
+def _run_self_test_peer(addresses, peer_index, ticks, round_name, results):
+    try:
+        _self_test_peer(addresses, peer_index, ticks, round_name, results)
+    except Exception as exc:
+        results.put((peer_index, None, repr(exc)))
+        raise
+
+
+def _self_test_peer(addresses, peer_index, ticks, round_name, results):
+    """Play a round of the game, headless, as one peer of a lockstep match. Runs in a process of its own."""
+    from arc_arena import arc_core, playback, replay, settings  # playback imports the game, which imports this module
+    session = LockstepSession(addresses, peer_index, input_delay=3, tick_rate=240)
+    header = {'round': round_name, 'round_idx': 0, 'seed': None,
+              'playfield': [settings.Win.PlayfieldX, settings.Win.PlayfieldY], 'players': [],
+              'settings': replay.get_settings_snapshot()}
+    game = playback.make_headless_game(header, Path(__file__).resolve().parent / 'resources')
+    settings.Debug.FastStart = True
+    colors = arc_core.get_player_colors()
+    rng = random.Random(peer_index)
+    configs = [_SelfTestConfig(rng) for _ in range(2 + peer_index)]
+    local_players = [('p%d.%d' % (peer_index, idx), colors[peer_index * 4 + idx].idx) for idx in range(len(configs))]
+    players = session.connect(local_players, configs, timeout=10.0)
+    # set up like ArcGame.begin_netplay()
+    colors_by_idx = {color.idx: color for color in colors}
+    game._controllers = [arc_core.PlayerController(name, colors_by_idx[color_idx], idx,
+                                                   arc_core.NetplayInputConfig('netplay instance %d' % peer, session,
+                                                                               idx))
+                         for idx, (peer, name, color_idx) in enumerate(players)]
+    game.init_scoreboard()
+    game.rng.seed(session.seed)
+    game.background_rng.seed(session.seed)
+    game.netplay = session
+    state = playback.make_round(game, header)
+    while session.tick < ticks and not state.round_over:
+        if not session.advance():
+            if session.stall_time > 5.0:
+                raise TimeoutError('peer %d stalled at tick %d' % (peer_index, session.tick))
+            time.sleep(0.0005)
+            continue
+        state.step(session.tick_length)  # shares a hash of the trails every settings.Netplay.HashIntervalTicks
+    # keep sending so the other peers can finish and compare the last hashes
+    end_time = time.perf_counter() + 0.5
+    while time.perf_counter() < end_time:
+        session._receive()
+        session._send_inputs()
+        time.sleep(0.01)
+    session.close()
+    scores = tuple((p.name, p.score_delta, p.kills) for p in game.scoreboard._player_list)
+    results.put((peer_index, (session.tick, hash_surface(state.game_surface), scores), session.desync_tick))
+
+
+def run_self_test(peer_count=2, ticks=2400, round_name='BasicRound', base_port=47500):
+    """Play a round between peer_count local processes over loopback, with random input. Returns True if they all
+    ended up in the same state (same tick, trails and scores) without noticing a desync."""
+    import multiprocessing
+    addresses = ['127.0.0.1:%d' % (base_port + idx) for idx in range(peer_count)]
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_run_self_test_peer, args=(addresses, idx, ticks, round_name, results))
+             for idx in range(peer_count)]
+    for proc in procs:
+        proc.start()
+    outcomes = sorted(results.get(timeout=60) for _ in procs)
+    for proc in procs:
+        proc.join()
+    for peer_index, state, desync_tick in outcomes:
+        if state is None:
+            print('peer %d: failed: %s' % (peer_index, desync_tick))
+            continue
+        print('peer %d: tick %d, trails crc %d, scores %s, desync: %s' % ((peer_index,) + state[:2] + (
+            ', '.join('%s %+d' % (name, score) for name, score, kills in state[2]), desync_tick)))
+    return len({state for _, state, _ in outcomes}) == 1 and all(d is None for _, _, d in outcomes)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_self_test(round_name=sys.argv[1] if len(sys.argv) > 1 else 'BasicRound') else 1)
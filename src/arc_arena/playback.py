@@ -0,0 +1,257 @@
+"""
+Headless playback of recorded rounds (see replay.py)
+
+    python -m arc_arena.playback REPLAY_FILE [--frames TICK,TICK,...] [--out DIRECTORY]
+    python -m arc_arena.playback REPLAY_FILE --seek TICK,TICK,... [--out DIRECTORY]
+
+Re-simulates a round from its replay file as fast as the CPU allows, without drawing (or a window, or sound), and
+prints the final scores and the order the players died in. With --frames, the playfield is also rendered to a PNG
+file after each of the given ticks. Handy for settling scoring disputes, reproducing bugs, and checking that a
+change didn't alter gameplay (the same replay should give the same result before and after).
+
+With --seek, jumps straight to each of the given ticks (see Seeker) and renders it, instead of playing the round
+through.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+import pygame
+from arc_arena import settings
+from arc_arena import arc_core
+from arc_arena import arc_game
+from arc_arena import round
+from arc_arena import replay
+
+CFG = settings  # quick alias
+
+
+def apply_settings_snapshot(snapshot):
+    """Set the settings to the values in a snapshot from replay.get_settings_snapshot()"""
+    for class_name, values in snapshot.items():
+        cls = getattr(settings, class_name, None)
+        if not isinstance(cls, type):
+            continue
+        for name, value in values.items():
+            if isinstance(getattr(cls, name, None), tuple):
+                value = _to_tuple(value)  # JSON turns tuples into lists
+            setattr(cls, name, value)
+
+
+def _to_tuple(value):
+    if isinstance(value, list):
+        return tuple(_to_tuple(item) for item in value)
+    return value
+
+
+class ReplayInputConfig(arc_core.InputConfig):
+    """Input of a player in a replay. Has no buttons, ReplayController hands over the recorded turn states."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_buttons(self):
+        return ()
+
+    def get_dispatch_keys(self):
+        return []
+
+    def input(self, snapshot=None):
+        return None
+
+    def parse_event(self, event):
+        return None
+
+
+class ReplayController(arc_core.PlayerController):
+    """Plays back the turn states one player was recorded making"""
+
+    def __init__(self, name, color, index):
+        arc_core.PlayerController.__init__(self, name, color, index, ReplayInputConfig('replay of %s' % name))
+        self._turn = None
+        self._tick_inputs = []  # (when, turn state) recorded for the coming tick
+
+    def set_tick_inputs(self, inputs):
+        self._tick_inputs = inputs
+
+    def input(self, snapshot=None, timed_turns=()):
+        timed_turns = []
+        for when, turn in self._tick_inputs:
+            if when != replay.IMMEDIATE:
+                timed_turns.append((when / float(replay.FRACTION_STEPS), turn, None))
+            self._turn = turn
+        self._tick_inputs = []
+        self.apply_turns(self._turn, timed_turns)
+
+
+class PlaybackResult(object):
+    def __init__(self):
+        self.ticks = 0  # ticks simulated
+        self.game_time = 0.0  # seconds of gameplay simulated
+        self.wall_time = 0.0  # seconds it took
+        self.is_round_over = False
+        self.scores = []  # (name, points this round, kills), in player order
+        self.death_order = []  # (tick, name), first death first
+        self.frames = []  # paths of rendered frames
+
+    def report(self):
+        lines = ['%d ticks (%.1f seconds of gameplay) simulated in %.2f seconds, %.0fx real time' % (
+            self.ticks, self.game_time, self.wall_time, self.game_time / max(self.wall_time, 1e-9))]
+        if not self.is_round_over:
+            lines.append('The replay ended before the round did')
+        lines.append('Scores:')
+        for name, score_delta, kills in self.scores:
+            lines.append('  %s: %+d (%d kills)' % (name, score_delta, kills))
+        lines.append('Death order:')
+        for tick, name in self.death_order:
+            lines.append('  tick %d: %s' % (tick, name))
+        return '\n'.join(lines)
+
+
+def make_headless_game(header, resource_path):
+    """Make an ArcGame, set up like the game the replay was recorded in, that simulates without drawing"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    apply_settings_snapshot(header['settings'])
+    CFG.Win.Fullscreen = False
+    CFG.Win.ResolutionX, CFG.Win.ResolutionY = header['playfield']  # so rendered frames need no scaling
+    CFG.Sound.EnableSFX = False
+    CFG.Background.Visible = False
+    CFG.Replay.On = False
+    CFG.KillCam.On = False
+    CFG.Snapshot.On = False
+    CFG.GameLog.On = False
+    CFG.Capture.On = False
+    CFG.SharedFrames.On = False
+    CFG.StateFeed.On = False
+    CFG.Latency.On = False
+    CFG.Latency.SyntheticInput = False
+    CFG.NetInput.On = False
+    CFG.Netplay.On = False
+    CFG.Profiler.On = False
+
+    game = arc_game.ArcGame(resource_path)
+    arc_core.game = game  # global variable
+    game.headless = True
+    colors = {color.idx: color for color in arc_core.get_player_colors()}
+    game._controllers = [ReplayController(name, colors[color_idx], idx) for name, color_idx, idx in header['players']]
+    game.init_scoreboard()
+    game.round_idx = header['round_idx']
+    return game
+
+
+def make_round(game, header):
+    """Make and begin the round a replay was recorded in"""
+    game.round_seed = header['seed']
+    state = getattr(round, header['round'])(game)
+    game.round_seed = None
+    state.begin_state()
+    return state
+
+
+def set_tick_inputs(controllers, inputs):
+    for controller in controllers:
+        controller.set_tick_inputs([(when, turn) for idx, when, turn in inputs if idx == controller._index])
+
+
+def save_frame(game, state, path):
+    frame = game.get_frame_surface()
+    state.draw(frame)
+    pygame.image.save(frame, str(path))
+
+
+def play(recording, resource_path, frame_ticks=(), frame_dir=None):
+    """Re-simulate the round in a replay.Replay. Frames are rendered to frame_dir after each tick in frame_ticks.
+    Returns a PlaybackResult."""
+    game = make_headless_game(recording.header, resource_path)
+    state = make_round(game, recording.header)
+    frame_ticks = set(frame_ticks)
+    if frame_ticks:
+        Path(frame_dir).mkdir(parents=True, exist_ok=True)
+
+    result = PlaybackResult()
+    controllers = game._controllers
+    dead = set()
+    start_time = time.perf_counter()
+    for tick, (time_delta, inputs) in enumerate(recording.ticks):
+        set_tick_inputs(controllers, inputs)
+        state.step(time_delta)
+        result.ticks += 1
+        result.game_time += time_delta
+        for controller in controllers:
+            if controller not in dead and controller._snake not in state.alive_snakes:
+                dead.add(controller)
+                result.death_order.append((tick, controller._name))
+        if tick in frame_ticks:
+            path = Path(frame_dir, 'tick%06d.png' % tick)
+            save_frame(game, state, path)
+            result.frames.append(path)
+        if state.round_over:
+            break
+    result.wall_time = time.perf_counter() - start_time
+    result.is_round_over = state.round_over
+    result.scores = [(p.name, p.score_delta, p.kills) for p in game.scoreboard._player_list]
+    return result
+
+
+class Seeker(object):
+    """Jumps to any tick of a replay: restores the nearest keyframe before it and simulates the rest of the way, so
+    seeking costs at most settings.Replay.KeyframeIntervalTicks ticks of simulation however long the round is"""
+
+    def __init__(self, recording, resource_path):
+        self.recording = recording
+        self.game = make_headless_game(recording.header, resource_path)
+        self.state = make_round(self.game, recording.header)
+        self.tick = 0  # ticks simulated, the next tick to simulate
+
+    def seek(self, tick):
+        """Put the round in the state it was in after tick (or as close as the replay goes). Moving forward less than
+        a keyframe interval just simulates onward."""
+        tick = min(tick + 1, len(self.recording.ticks))
+        idx = self.recording.find_keyframe(tick)
+        if idx is not None and (tick < self.tick or self.recording.get_keyframe_tick(idx) > self.tick):
+            self._restore(idx)
+        elif tick < self.tick:  # no keyframe to go back to. Start over.
+            self.state = make_round(self.game, self.recording.header)
+            self.tick = 0
+        controllers = self.game._controllers
+        while self.tick < tick and not self.state.round_over:
+            set_tick_inputs(controllers, self.recording.ticks[self.tick][1])
+            self.state.step(self.recording.ticks[self.tick][0])
+            self.tick += 1
+
+    def _restore(self, idx):
+        self.tick, round_state, turns = self.recording.get_keyframe(idx)
+        self.state.set_state(round_state)
+        for controller, turn in zip(self.game._controllers, turns):
+            controller._turn = turn
+
+    def save_frame(self, path):
+        save_frame(self.game, self.state, path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    frames = []
+    if '--frames' in sys.argv:
+        frames = [int(tick) for tick in sys.argv[sys.argv.index('--frames') + 1].split(',')]
+    out = sys.argv[sys.argv.index('--out') + 1] if '--out' in sys.argv else 'replay_frames'
+    resources = Path(__file__).resolve().parent / 'resources'
+    recording = replay.Replay.load(sys.argv[1])
+    print('Playing back %s: %s, seed %d, %d players, %d ticks, %d keyframes' % (
+        sys.argv[1], recording.header['round'], recording.header['seed'], len(recording.header['players']),
+        len(recording.ticks), recording.get_keyframe_count()))
+    if '--seek' in sys.argv:
+        seeker = Seeker(recording, resources)
+        Path(out).mkdir(parents=True, exist_ok=True)
+        for seek_tick in [int(tick) for tick in sys.argv[sys.argv.index('--seek') + 1].split(',')]:
+            start = time.perf_counter()
+            seeker.seek(seek_tick)
+            elapsed = time.perf_counter() - start
+            frame_path = Path(out, 'seek%06d.png' % seek_tick)
+            seeker.save_frame(frame_path)
+            print('Seeked to tick %d in %.1f ms: %s' % (seek_tick, elapsed * 1000, frame_path))
+    else:
+        print(play(recording, resources, frames, out).report())
@@ -0,0 +1,309 @@
+"""
+Compact, input-based recordings of rounds (see settings.Replay)
+
+A round is deterministic given its random seed, the length of every tick and what each player pressed, so that is all
+a replay stores. Everything else is re-simulated from it.
+
+File format:
+
+    b'ARCR', uint8 version
+    varint length, then UTF-8 JSON header: round class, seed, settings snapshot, players, start positions, ...
+    records, each a varint tag followed by the tag's payload:
+        TAG_TICK   zigzag varint: tick length in microseconds, minus the previous tick's length
+        TAG_INPUT  varint controller index, varint (when << 2 | turn bits). when is how far through the tick (0 to
+                   FRACTION_STEPS) the turn state changed, or IMMEDIATE if it was set before the tick started.
+                   After changes part way through a tick, an IMMEDIATE one is the turn state the tick ends on (when it
+                   isn't the last change's). Turn bits: 1 is left, 2 is right, 3 is both. Belongs to the tick of the
+                   last TAG_TICK.
+        TAG_KEYFRAME  varint tick, varint length, then the zlib compressed pickle of (MainGameState.get_state(), turn
+                   state of every controller) from right before that tick
+        TAG_END    varint number of ticks
+        TAG_INDEX  varint keyframe count, then varint tick, offset and length (of its compressed data) of each
+                   keyframe
+    uint64 offset of the TAG_INDEX record, b'ARCX'
+
+Input is only recorded when a player's turn state changes (or a button changed part way through the tick), so an idle
+tick takes two or three bytes. Keyframes (every
+settings.Replay.KeyframeIntervalTicks) let a player jump to any point of a round without simulating it from the start
+(see playback.Seeker). The index at the end finds them without reading the whole file. Files are read through mmap.
+"""
+import bisect
+import json
+import mmap
+import pickle
+import struct
+import zlib
+from arc_arena import settings
+from arc_arena import arc_core
+from arc_arena import utils
+
+CFG = settings  # quick alias
+
+MAGIC = b'ARCR'
+VERSION = 2
+TAG_TICK = 1
+TAG_INPUT = 2
+TAG_END = 3
+TAG_KEYFRAME = 4
+TAG_INDEX = 5
+TRAILER = struct.Struct('!Q4s')
+TRAILER_MAGIC = b'ARCX'
+FRACTION_STEPS = arc_core.InputDispatcher.FRACTION_STEPS
+IMMEDIATE = FRACTION_STEPS + 1
+MICROSECONDS = 1000000
+
+
+def quantize_time(time_delta):
+    """Tick length, rounded to what a replay stores (the game steps with the rounded length, so replays are exact)"""
+    return round(time_delta * MICROSECONDS) / float(MICROSECONDS)
+
+
+def write_varint(buf, value):
+    while value >= 0x80:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def read_varint(data, pos):
+    """Return (value, position after it)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def get_settings_snapshot():
+    """{settings class name: {name: value}} of every setting that can be stored as JSON"""
+    snapshot = {}
+    for class_name, cls in vars(settings).items():
+        if not isinstance(cls, type) or class_name.startswith('_'):
+            continue
+        values = {}
+        for name, value in vars(cls).items():
+            if name.startswith('_'):
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            values[name] = value
+        snapshot[class_name] = values
+    return snapshot
+
+
+class _Writer(utils.BackgroundFileWriter):
+    """Writes a replay file on a background thread, so the game never waits on the disk (or on compression)"""
+    _COMPRESS_LEVEL = 1  # fast: keyframes are mostly empty playfield, which squeezes down well at any level
+
+    def __init__(self, path):
+        self._keyframes = []  # (tick, offset of compressed data, its length)
+        utils.BackgroundFileWriter.__init__(self, path, 'ReplayWriter')
+
+    def write_keyframe(self, tick, keyframe):
+        """Write a keyframe, compressed on the writer thread. keyframe must not be changed after this."""
+        self._queue.put((tick, keyframe))
+
+    def _handle(self, item):
+        if not isinstance(item, tuple):
+            self._write(item)
+            return
+        tick, keyframe = item
+        data = zlib.compress(pickle.dumps(keyframe, pickle.HIGHEST_PROTOCOL), self._COMPRESS_LEVEL)
+        record = bytearray()
+        write_varint(record, TAG_KEYFRAME)
+        write_varint(record, tick)
+        write_varint(record, len(data))
+        self._write(record)
+        self._keyframes.append((tick, self._offset, len(data)))
+        self._write(data)
+
+    def _finish(self):
+        index_offset = self._offset
+        record = bytearray()
+        write_varint(record, TAG_INDEX)
+        write_varint(record, len(self._keyframes))
+        for keyframe in self._keyframes:
+            for value in keyframe:
+                write_varint(record, value)
+        self._write(record)
+        self._write(TRAILER.pack(index_offset, TRAILER_MAGIC))
+
+
+class ReplayRecorder(object):
+    """Records one round. Call begin_tick() at the start of every tick (after adding a keyframe if one is due),
+    record_inputs() after the players' input has been handed to their snakes, and close() when the round is over."""
+    _FLUSH_TICKS = 60  # hand data to the writer about once a second
+
+    def __init__(self, path, header, keyframe_interval=None):
+        self.path = path
+        self._writer = _Writer(path)
+        self._keyframe_interval = keyframe_interval  # ticks between keyframes, or None for no keyframes
+        header_bytes = json.dumps(header).encode('utf-8')
+        buf = bytearray(MAGIC)
+        buf.append(VERSION)
+        write_varint(buf, len(header_bytes))
+        buf += header_bytes
+        self._buf = buf
+        self._tick_count = 0
+        self._last_tick_us = 0
+        self._turn_bits = {}  # controller index -> turn bits as of the last recorded input
+
+    def is_keyframe_due(self):
+        return self._keyframe_interval is not None and self._tick_count % self._keyframe_interval == 0
+
+    def add_keyframe(self, round_state, turns):
+        """Add a keyframe of the round (from MainGameState.get_state()) and the turn state of every controller, as of
+        right before the coming tick"""
+        self._flush()
+        self._writer.write_keyframe(self._tick_count, (round_state, turns))
+
+    def begin_tick(self, time_delta):
+        tick_us = int(round(time_delta * MICROSECONDS))
+        write_varint(self._buf, TAG_TICK)
+        write_varint(self._buf, zigzag(tick_us - self._last_tick_us))
+        self._last_tick_us = tick_us
+        self._tick_count += 1
+        if self._tick_count % self._FLUSH_TICKS == 0:
+            self._flush()
+
+    def record_input(self, controller_idx, when, turn):
+        """Record a change to a controller's turn state (None or a Snake turn state), at when (see module docstring)"""
+        if self._turn_bits.get(controller_idx, 0) != (turn or 0):
+            self._write_input(controller_idx, when, turn)
+
+    def _write_input(self, controller_idx, when, turn):
+        bits = turn or 0
+        self._turn_bits[controller_idx] = bits
+        write_varint(self._buf, TAG_INPUT)
+        write_varint(self._buf, controller_idx)
+        write_varint(self._buf, (when << 2) | bits)
+
+    def record_inputs(self, controllers):
+        """Record the turn state changes the controllers have handed their snakes this tick. Turns part way through the
+        tick are recorded even when they don't change anything, because the snake moves in pieces split at them. The
+        turn state the tick ends on (from the input snapshot) can differ from the last of them, so it follows them when
+        it does."""
+        for controller in controllers:
+            turn, timed_turns = controller.last_turns
+            for fraction, timed_turn, _ in timed_turns:
+                self._write_input(controller._index, int(round(fraction * FRACTION_STEPS)), timed_turn)
+            self.record_input(controller._index, IMMEDIATE, turn)
+
+    def _flush(self):
+        if self._buf:
+            self._writer.write(bytes(self._buf))
+            self._buf = bytearray()
+
+    def close(self):
+        write_varint(self._buf, TAG_END)
+        write_varint(self._buf, self._tick_count)
+        self._flush()
+        self._writer.close()
+
+    def wait(self):
+        """Wait for everything to be written to disk (after close())"""
+        self._writer.wait()
+
+
+class Replay(object):
+    """A replay file read back in: the header, each tick's length and the inputs recorded for it, and the keyframes"""
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a replay file')
+        version = data[len(MAGIC)]
+        if version not in (1, VERSION):
+            raise ValueError('Replay file version %d is not supported' % version)
+        self._data = data
+        length, pos = read_varint(data, len(MAGIC) + 1)
+        self.header = json.loads(bytes(data[pos:pos + length]).decode('utf-8'))
+        self.ticks = []  # [(tick length, [(controller index, when, turn), ...]), ...]
+        self.is_complete = False
+        self._keyframe_ticks = []
+        self._keyframe_locations = []  # (offset, length) of each keyframe's compressed data
+        self._parse(data, pos + length)
+
+    @staticmethod
+    def load(path):
+        """Load a replay file. The file is memory mapped, so keyframes are only read when they are used."""
+        with open(path, 'rb') as f:
+            return Replay(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _parse(self, data, pos):
+        keyframes = self._read_index(data)
+        tick_us = 0
+        inputs = None
+        while pos < len(data):
+            tag, pos = read_varint(data, pos)
+            if tag == TAG_TICK:
+                delta, pos = read_varint(data, pos)
+                tick_us += unzigzag(delta)
+                inputs = []
+                self.ticks.append((tick_us / float(MICROSECONDS), inputs))
+            elif tag == TAG_INPUT:
+                controller_idx, pos = read_varint(data, pos)
+                value, pos = read_varint(data, pos)
+                inputs.append((controller_idx, value >> 2, (value & 3) or None))
+            elif tag == TAG_KEYFRAME:
+                tick, pos = read_varint(data, pos)
+                length, pos = read_varint(data, pos)
+                if keyframes is None:
+                    self._keyframe_ticks.append(tick)
+                    self._keyframe_locations.append((pos, length))
+                pos += length
+            elif tag == TAG_END:
+                tick_count, pos = read_varint(data, pos)
+                self.is_complete = tick_count == len(self.ticks)
+            elif tag == TAG_INDEX:
+                break
+            else:
+                raise ValueError('Unknown replay record tag %d at byte %d' % (tag, pos))
+
+    def _read_index(self, data):
+        """Read the keyframe index at the end of the file. Returns None if there isn't one (ex: the game quit before the
+        round was over), then keyframes are found while reading the rest of the file."""
+        if len(data) < TRAILER.size:
+            return None
+        index_offset, magic = TRAILER.unpack(bytes(data[len(data) - TRAILER.size:]))
+        if magic != TRAILER_MAGIC:
+            return None
+        tag, pos = read_varint(data, index_offset)
+        count, pos = read_varint(data, pos)
+        for _ in range(count):
+            tick, pos = read_varint(data, pos)
+            offset, pos = read_varint(data, pos)
+            length, pos = read_varint(data, pos)
+            self._keyframe_ticks.append(tick)
+            self._keyframe_locations.append((offset, length))
+        return self._keyframe_ticks
+
+    def get_keyframe_count(self):
+        return len(self._keyframe_ticks)
+
+    def find_keyframe(self, tick):
+        """Index of the last keyframe at or before tick, or None if there isn't one"""
+        idx = bisect.bisect_right(self._keyframe_ticks, tick) - 1
+        return idx if idx >= 0 else None
+
+    def get_keyframe_tick(self, idx):
+        return self._keyframe_ticks[idx]
+
+    def get_keyframe(self, idx):
+        """Return (tick, round state, controller turn states) of a keyframe"""
+        offset, length = self._keyframe_locations[idx]
+        round_state, turns = pickle.loads(zlib.decompress(self._data[offset:offset + length]))
+        return self._keyframe_ticks[idx], round_state, turns
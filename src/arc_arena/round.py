@@ -2,9 +2,10 @@
 Code for the different rounds
 """
 import math
-import random
 import functools
 import copy
+import time
+from pathlib import Path
 import pygame
 from gnp_pygame import gnipMath
 from gnp_pygame import gnppygame
@@ -13,27 +14,83 @@ from gnp_pygame import gnpparticle
 from arc_arena import settings
 from arc_arena import utils
 from arc_arena import arc_core
+from arc_arena import arena
+from arc_arena import trails
+from arc_arena import spatial
+from arc_arena import chunks
+from arc_arena import netplay
+from arc_arena import replay
+from arc_arena import killcam
+from arc_arena import snapshot
+from arc_arena import gamelog
 
 CFG = settings  # quick alias
 
 
+class RoundTimers(object):
+    """One-shot timers for things that happen during a round. Unlike the game's timers, these are stepped by the round
+    and are part of its state, so they can be saved and restored with it (see MainGameState.get_state())."""
+
+    def __init__(self):
+        self._timers = []  # [seconds left, callback], in the order they were added
+
+    def add(self, delay, callback):
+        self._timers.append([delay, callback])
+
+    def step(self, time_delta):
+        due = []
+        for timer in self._timers:
+            timer[0] -= time_delta
+            if timer[0] <= 0.0:
+                due.append(timer)
+        for timer in due:
+            self._timers.remove(timer)  # before calling, as the callback may add timers
+            timer[1]()
+
+    def get_timers(self):
+        """(seconds left, callback) of every pending timer"""
+        return [tuple(timer) for timer in self._timers]
+
+    def set_timers(self, timers):
+        self._timers = [list(timer) for timer in timers]
+
+
 class MainGameState(gnppygame.GameState):
     _LABEL = None
     _SUB_LABEL = None
+    _REGIONS_ARE_PERMANENT = True  # False for rounds where trails get erased or snakes can jump over them
+    _CHUNK_SIZE = None  # set for arenas that store their trails in chunks (see chunks.ChunkedSurface)
+    # plain attributes that change during a round, saved by get_state(). Rounds with more extend it.
+    _STATE_ATTRIBUTES = ('_paused', 'round_over', '_region_ticks', '_sealed_count', '_is_fast_forwarding', 'tick_count')
 
     def __init__(self, game_obj):
         super(MainGameState, self).__init__(game_obj)
+        # everything random in the round follows from this seed, so a replay only needs it and the input
+        self.seed = self.owner().round_seed
+        if self.seed is None:
+            self.seed = self.owner().rng.getrandbits(32)
+        self.owner().rng.seed(self.seed)
+        self.recorder = None  # replay.ReplayRecorder, while the round is being recorded
+        self.game_log = None  # gamelog.GameLogRecorder, while the round is being logged
+        self.start_from = None  # snapshot.RoundSnapshot to start the round from, instead of the beginning
+        self.start_snapshot = None  # snapshot.RoundSnapshot of the round as it started, for a rematch
+        self.tick_count = 0
+        self._has_begun_play = False
+        self.timers = RoundTimers()
         self.round_over = False
         self.do_wrap = False
         self.background_color = CFG.Win.BackgroundColorIdx
+        self.kill_cam = killcam.KillCam(self.background_color) if CFG.KillCam.On else None
         self.alive_snakes = []
+        self.boundary = arena.Boundary()
         self.owner().scoreboard.start_round()
         self.actors = gnppygame.ActorList()
         self._label_actors = gnppygame.ActorList()
         self._add_round_labels()
         display = pygame.display.get_surface()
+        playfield_size = self.owner().get_playfield_rect().size
         # Optimization: Blitting is faster than filling. So, fill a surface once and blit it each frame.
-        self._surface_eraser = pygame.Surface(display.get_size(), 0, display)
+        self._surface_eraser = pygame.Surface(playfield_size, 0, display)
         self._surface_eraser.fill(CFG.Win.BackgroundColorRGB)
         if CFG.Background.Visible:
             draw_bg_func = next(self.owner().background_chooser)
@@ -43,34 +100,72 @@ class MainGameState(gnppygame.GameState):
         # causing the state's first tick to be seconds long...
         self.owner()._frame_timer.tick()
 
-        # initialize Snakes
-        rect = self.owner().get_screen_rect()
-        center = gnipMath.cVector2(rect.centerx, rect.centery)
-        start_positions = self.get_snake_starting_positions(len(self.owner()._controllers),
-                                                            self.owner().get_screen_rect())
+        # per-pixel record of who drew each trail pixel, for kill attribution
+        rect = self.get_arena_rect()
+        self.owner_map = trails.OwnerMap(rect.size, self._CHUNK_SIZE)
+        self._snakes_by_owner_id = {}
+        self._snakes = []  # every snake, alive or not, in controller order
+
+        # initialize Snakes (after the round's walls are known, so nobody starts on or inside of one)
+        self.add_boundaries(rect)
+        starts = self.get_snake_starts(len(self.owner()._controllers), rect)
         if CFG.Round.ShuffleStartLocations:
-            random.shuffle(start_positions)
-        assert len(start_positions) == len(
+            self.owner().rng.shuffle(starts)
+        assert len(starts) == len(
             self.owner()._controllers), 'Did not get the same number of start positions as controllers'
         for idx, controller in enumerate(self.owner()._controllers):
-            start_dir = gnipMath.cVector2(1.0, 0.05) if CFG.Debug.On else center - start_positions[idx]
-            snake = arc_core.Snake(controller._color, self.background_color, start_positions[idx], start_dir, rect)
+            start_pos, start_dir = starts[idx]
+            if CFG.Debug.On:
+                start_dir = gnipMath.cVector2(1.0, 0.05)
+            snake = arc_core.Snake(controller._color, self.background_color, start_pos, start_dir, rect)
+            snake.boundary = self.boundary
+            snake.latency_meter = self.owner().latency_meter
+            snake.kill_cam = self.kill_cam
+            snake.owner_map = self.owner_map
+            snake.owner_id = trails.OwnerMap.get_owner_id(idx)
+            self._snakes_by_owner_id[snake.owner_id] = snake
+            self._snakes.append(snake)
             self.alive_snakes.append(snake)
             controller.possess(snake)
 
         # setup gameplay surface (visual effects are drawn to main display before game surface is blitted on top of main display)
-        self.game_surface = pygame.Surface(pygame.display.get_surface().get_size(), pygame.HWPALETTE, 8)
-        self.game_surface.set_palette(self.owner().palette)
         assert isinstance(CFG.Win.BackgroundColorIdx, int)
-        self.game_surface.set_colorkey(CFG.Win.BackgroundColorIdx)
-        self.game_surface.fill(CFG.Win.BackgroundColorIdx)
         assert isinstance(CFG.Win.BorderColorIdx, int)
+        if self._CHUNK_SIZE is None:
+            self.game_surface = pygame.Surface(rect.size, pygame.HWPALETTE, 8)
+            self.game_surface.set_palette(self.owner().palette)
+            self.game_surface.set_colorkey(CFG.Win.BackgroundColorIdx)
+            self.game_surface.fill(CFG.Win.BackgroundColorIdx)
+            # hierarchical occupancy map of game_surface for fast long-range queries (robots, look-ahead)
+            self.occupancy = spatial.OccupancyPyramid(self.game_surface, CFG.Win.BackgroundColorIdx)
+            # distance from each part of the playfield to the nearest trail or wall. Built the first time it is asked
+            # for (see get_distance_field()), then kept current by the occupancy pyramid.
+            self.distance_field = None
+            # connected pockets of free space, to notice when the survivors are sealed off from each other
+            self.regions = spatial.FreeSpaceRegions(self.occupancy, CFG.RegionAnalysis.CellSize,
+                                                    self.game_surface.get_size())
+        else:
+            self.game_surface = chunks.ChunkedSurface(rect.size, self._CHUNK_SIZE, CFG.Win.BackgroundColorIdx,
+                                                      self.owner().palette)
+            # the spatial indexes work on a game surface that is in one piece
+            self.occupancy = None
+            self.distance_field = None
+            self.regions = None
+        self.reachable_areas = {}  # snake -> area (in square pixels) of the pocket it is in, as of the last analysis
+        self._region_ticks = 0
+        self._sealed_count = 0
+        self._is_fast_forwarding = False
+
+        # input for every controller is sampled once per tick
+        self._input_dispatcher = arc_core.InputDispatcher(self.owner()._controllers, self.owner().input_injector)
 
         self._paused = True
         self._fps_timer = gnppygame.FrameTimer()
 
     def enable_wrapping(self):
         self.do_wrap = True
+        if self.regions is not None:
+            self.regions.do_wrap = True
         for snake in self.alive_snakes:
             snake.do_wrap = True
 
@@ -82,7 +177,7 @@ class MainGameState(gnppygame.GameState):
                 game.fnt,
                 60,
                 self._LABEL,
-                game.get_screen_rect(),
+                game.get_playfield_rect(),
                 gnppygame.WHITE,
                 'center',
                 'center',
@@ -93,7 +188,7 @@ class MainGameState(gnppygame.GameState):
                 game.fnt,
                 60,
                 self._LABEL,
-                game.get_screen_rect().move(3, 3),
+                game.get_playfield_rect().move(3, 3),
                 gnppygame.BLACK,
                 'center',
                 'center',
@@ -108,7 +203,7 @@ class MainGameState(gnppygame.GameState):
                 game.fnt,
                 24,
                 self._SUB_LABEL,
-                game.get_screen_rect().move(0, 50),
+                game.get_playfield_rect().move(0, 50),
                 gnppygame.WHITE,
                 'center',
                 'center',
@@ -120,9 +215,14 @@ class MainGameState(gnppygame.GameState):
         """Called right as state beings. Meant to be overridden by subclasses."""
         super(MainGameState, self).begin_state()
         print('start round:', self.__class__.__name__)
+        if self.owner().input_injector is not None:
+            self.owner().input_injector.start()
 
         if not self.do_wrap:
-            pygame.draw.rect(self.game_surface, CFG.Win.BorderColorIdx, self.owner().get_screen_rect(), 15)
+            self.boundary.add(arena.RectBorder(self.get_arena_rect(), 15))
+        self.boundary.draw(self.game_surface)
+        if self.occupancy is not None:
+            self.occupancy.rebuild()  # rounds may have drawn to the game surface directly in their constructors
 
         shrink_time = 0.5 if CFG.Debug.On or CFG.Debug.FastStart else 4.8
         for snake in self.alive_snakes:
@@ -132,9 +232,199 @@ class MainGameState(gnppygame.GameState):
         # trigger stutter-start beginning snake animation
         start_delta = 0.1 if CFG.Debug.On or CFG.Debug.FastStart else CFG.Round.StartDelta
         self.on_timer_first_step(play_beep=False)
-        arc_core.game.timers.add(1 * start_delta, self.on_timer_first_step)
-        arc_core.game.timers.add(2 * start_delta, self.on_timer_first_step)
-        arc_core.game.timers.add(3 * start_delta, self.on_timer_first_step_and_start)
+        self.timers.add(1 * start_delta, self.on_timer_first_step)
+        self.timers.add(2 * start_delta, self.on_timer_first_step)
+        self.timers.add(3 * start_delta, self.on_timer_first_step_and_start)
+
+    def begin_play(self):
+        """Called at the start of the first step, once the round (and any subclass) has finished setting itself up"""
+        self._has_begun_play = True
+        if self.start_from is not None:
+            self.start_from.restore(self)
+        if CFG.Snapshot.On:
+            self.start_snapshot = snapshot.RoundSnapshot.take(self)
+        if CFG.Replay.On and self.tick_count == 0:  # replays are simulated from the beginning of the round
+            self.start_recording()
+        if CFG.GameLog.On and self.tick_count == 0:
+            self.start_game_log()
+
+    def start_recording(self):
+        """Start recording the round to a file in the replay directory"""
+        game = self.owner()
+        directory = Path(CFG.Replay.Directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        filename = '%s_round%02d_%s.arcreplay' % (time.strftime('%Y%m%d_%H%M%S'), game.round_idx,
+                                                  self.__class__.__name__)
+        header = {
+            'round': self.__class__.__name__,
+            'round_idx': game.round_idx,
+            'seed': self.seed,
+            'playfield': list(game.get_playfield_rect().size),
+            'players': [[c._name, c._color.idx, c._index] for c in game._controllers],
+            'starts': [[s.pos.x, s.pos.y, s.vel.x, s.vel.y] for s in self.alive_snakes],
+            'settings': replay.get_settings_snapshot(),
+        }
+        self.recorder = replay.ReplayRecorder(Path(directory, filename), header, CFG.Replay.KeyframeIntervalTicks)
+
+    def start_game_log(self):
+        """Start logging snake positions and events to a file in the log directory (for analytics.py)"""
+        game = self.owner()
+        directory = Path(CFG.GameLog.Directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        filename = '%s_round%02d_%s.arclog' % (time.strftime('%Y%m%d_%H%M%S'), game.round_idx, self.__class__.__name__)
+        header = {
+            'round': self.__class__.__name__,
+            'round_idx': game.round_idx,
+            'seed': self.seed,
+            'playfield': list(self.get_arena_rect().size),
+            'players': [c._name for c in game._controllers],
+        }
+        self.game_log = gamelog.GameLogRecorder(Path(directory, filename), header, len(self._snakes))
+
+    def log_event(self, kind, snake, other=None):
+        """Log an event (gamelog.EVENT_*) that happened to a snake, at its position"""
+        if self.game_log is not None:
+            other_idx = -1 if other is None else other._controller._index
+            self.game_log.add_event(kind, snake._controller._index, other_idx, snake.pos.AsTuple())
+
+    def get_state(self):
+        """Copy of everything about the round that changes as it is played (trails, snakes, timers, scores, random
+        number generator, ...), that set_state() can put back. Visual effects aren't included. Rounds with more state
+        extend it."""
+        state = {name: getattr(self, name) for name in self._STATE_ATTRIBUTES}
+        state['rng'] = self.owner().rng.getstate()
+        state['scores'] = self.owner().scoreboard.get_state()
+        state['trails'] = chunks.copy_pixels(self.game_surface)
+        state['owners'] = self.owner_map.copy_pixels()
+        state['snakes'] = [snake.get_state() for snake in self._snakes]
+        state['alive'] = [self._snakes.index(snake) for snake in self.alive_snakes]
+        state['both_turn_callbacks'] = [self._encode_callback(snake._both_turn_callback) for snake in self._snakes]
+        state['timers'] = [(time_left, self._encode_callback(callback))
+                           for time_left, callback in self.timers.get_timers()]
+        return state
+
+    def set_state(self, state):
+        """Put the round back the way it was when get_state() was called"""
+        for name in self._STATE_ATTRIBUTES:
+            setattr(self, name, state[name])
+        self.owner().rng.setstate(state['rng'])
+        self.owner().scoreboard.set_state(state['scores'])
+        chunks.paste_pixels(self.game_surface, state['trails'])
+        self.owner_map.paste_pixels(state['owners'])
+        if self.occupancy is not None:
+            self.occupancy.rebuild()
+        for snake, snake_state, callback in zip(self._snakes, state['snakes'], state['both_turn_callbacks']):
+            snake.set_state(snake_state)
+            snake.register_both_turn_callback(self._decode_callback(callback))
+        self.alive_snakes[:] = [self._snakes[idx] for idx in state['alive']]  # in place, others hold on to the list
+        self.timers.set_timers([(time_left, self._decode_callback(callback))
+                                for time_left, callback in state['timers']])
+        if not self._paused and not hasattr(self, 'round_timer'):
+            self.round_timer = gnppygame.Stopwatch()
+
+    def _encode_callback(self, callback):
+        """Describe a callback to a method of the round (optionally a functools.partial() with snakes as the
+        arguments) as (method name, snake indices), so it can be saved"""
+        if callback is None:
+            return None
+        args = ()
+        if isinstance(callback, functools.partial):
+            callback, args = callback.func, callback.args
+        assert getattr(self, callback.__name__, None) is not None, 'Callback is not a method of the round'
+        return callback.__name__, [self._snakes.index(snake) for snake in args]
+
+    def _decode_callback(self, encoded):
+        if encoded is None:
+            return None
+        name, snake_idxs = encoded
+        if snake_idxs:
+            return functools.partial(getattr(self, name), *[self._snakes[idx] for idx in snake_idxs])
+        return getattr(self, name)
+
+    def handle_snapshot_keys(self):
+        """Save the round to memory, go back to the saved snapshot, or write it to a file, on the keys in
+        settings.Snapshot. Only sees keys that aren't used by the players (the input dispatcher has taken those)."""
+        keys = {pygame.key.key_code(CFG.Snapshot.SaveKey): self.save_snapshot,
+                pygame.key.key_code(CFG.Snapshot.RestoreKey): self.restore_snapshot,
+                pygame.key.key_code(CFG.Snapshot.WriteKey): self.write_snapshot}
+        for event in pygame.event.get(pygame.KEYDOWN):
+            if event.key in keys:
+                keys[event.key]()
+            else:
+                pygame.event.post(event)  # not ours, leave it for whoever else reads the queue
+
+    def save_snapshot(self):
+        start = time.perf_counter()
+        self.owner().snapshot = snapshot.RoundSnapshot.take(self)
+        print('Snapshot saved at tick %d (%d KB, %.1f ms)' % (self.tick_count, self.owner().snapshot.get_size() // 1024,
+                                                              (time.perf_counter() - start) * 1000))
+
+    def restore_snapshot(self):
+        """Put the round back the way it was when the snapshot was saved"""
+        snap = self.owner().snapshot
+        if snap is None or not snap.is_of(self):
+            print('No snapshot of this round to go back to')
+            return
+        start = time.perf_counter()
+        snap.restore(self)
+        if self.recorder is not None:  # the replay can't follow the round back in time. Keep what led up to here.
+            self.recorder.close()
+            print('Replay saved to %s (recording stopped by going back to a snapshot)' % self.recorder.path)
+            self.recorder = None
+        if self.game_log is not None:  # same for the log, which would count the ticks since the snapshot twice
+            self.game_log.close()
+            self.game_log = None
+        if self.kill_cam is not None:
+            self.kill_cam = killcam.KillCam(self.background_color)
+            for snake in self._snakes:
+                snake.kill_cam = self.kill_cam
+        print('Snapshot restored to tick %d (%.1f ms)' % (self.tick_count, (time.perf_counter() - start) * 1000))
+
+    def write_snapshot(self):
+        """Write the saved snapshot to the snapshot directory, ex: to start benchmark rounds from"""
+        snap = self.owner().snapshot
+        if snap is None:
+            print('No snapshot to write. Save one first.')
+            return
+        directory = Path(CFG.Snapshot.Directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = Path(directory, '%s_%s.arcsnapshot' % (time.strftime('%Y%m%d_%H%M%S'), snap.round_name))
+        snap.save(path)
+        print('Snapshot written to %s' % path)
+
+    def get_arena_rect(self):
+        """Rect of the whole arena. Meant to be overridden by rounds with arenas that aren't the playfield's size."""
+        return self.owner().get_playfield_rect()
+
+    def mark_dirty(self, rect):
+        """Let the spatial indexes know that the given rect of the game surface has been drawn on"""
+        if self.occupancy is not None:
+            self.occupancy.mark_dirty(rect)
+
+    def add_boundaries(self, arena_rect):
+        """Add the round's own walls to self.boundary. Called before the snakes are placed. Meant to be overridden."""
+        pass
+
+    def is_valid_start(self, pos):
+        """Can a snake start at pos? Meant to be overridden by rounds with areas that are off limits."""
+        return not self.boundary.is_colliding(pos)
+
+    def get_snake_starts(self, num_players, playfield_rect):
+        """Return a (position, direction) pair for each player. Everyone starts on a circle facing the center, unless
+        there are so many players that the circle would be crowded. Then they are scattered around the playfield."""
+        radius = self.get_playfield_radius(playfield_rect) * .85
+        if num_players == 1 or 2 * math.pi * radius / num_players >= CFG.StartPositions.MinClearance:
+            center = gnipMath.cVector2(playfield_rect.centerx, playfield_rect.centery)
+            return [(pos, center - pos) for pos in self.get_snake_starting_positions(num_players, playfield_rect)]
+        return self.get_scattered_starts(num_players, playfield_rect)
+
+    def get_scattered_starts(self, num_players, playfield_rect):
+        """Return (position, direction) pairs for players scattered randomly (but not too close together) around the
+        playfield, each heading where it has some room"""
+        rect = pygame.Rect(playfield_rect).inflate(-2 * CFG.StartPositions.EdgeMargin, -2 * CFG.StartPositions.EdgeMargin)
+        return utils.get_scattered_starts(num_players, rect, CFG.StartPositions.MinClearance,
+                                          CFG.StartPositions.SmallestClearance, CFG.StartPositions.LookAhead,
+                                          is_valid=self.is_valid_start, rng=self.owner().rng)
 
     def get_snake_starting_positions(self, num_players, playfield_rect):
         assert num_players > 0, 'There are zero players. Can not create starting positions for zero players.'
@@ -153,8 +443,11 @@ class MainGameState(gnppygame.GameState):
         return (min(playfield_rect.width, playfield_rect.height) / 2)
 
     def input(self):
-        for controller in self.owner()._controllers:
-            controller.input()
+        self._input_dispatcher.input(not self._paused and not self.round_over)
+        if self.recorder is not None:
+            self.recorder.record_inputs(self.owner()._controllers)
+        if CFG.Snapshot.On and self.owner().netplay is None and not self.owner().headless:
+            self.handle_snapshot_keys()
 
         # self.do_robot(self.owner()._controllers[0]._snake)
         # self.do_robot(self.owner()._controllers[1]._snake)
@@ -163,19 +456,26 @@ class MainGameState(gnppygame.GameState):
         """Robot doesn't do much. Just ultra-simple wall avoidance, and it doesn't even do that very well."""
         if snake in self.alive_snakes:
             if snake.turning_dir == None:  # only allow robot to take control if there is no key being pressed
-                whisk_ctr = snake.get_color_under_robot_whisker(self.game_surface) != CFG.Win.BackgroundColorRGB
-                whisk_near_r = snake.get_color_under_near_right_robot_whisker(
-                    self.game_surface) != CFG.Win.BackgroundColorRGB
-                whisk_near_l = snake.get_color_under_near_left_robot_whisker(
-                    self.game_surface) != CFG.Win.BackgroundColorRGB
+                if self.occupancy is not None:
+                    # look along the whole whisker, not just at its tip. Empty space is skipped by the occupancy pyramid.
+                    whisk_ctr = self.occupancy.raycast(snake.get_whisker_pos().AsTuple(),
+                                                       snake.vel.Normalize().AsTuple(),
+                                                       snake.robot_whisker_length) is not None
+                    whisk_near_r = self.occupancy.is_occupied(snake.get_near_right_robot_whisker_pos().AsTuple())
+                    whisk_near_l = self.occupancy.is_occupied(snake.get_near_left_robot_whisker_pos().AsTuple())
+                else:
+                    bg = CFG.Win.BackgroundColorRGB
+                    whisk_ctr = snake.get_color_under_robot_whisker(self.game_surface) != bg
+                    whisk_near_r = snake.get_color_under_near_right_robot_whisker(self.game_surface) != bg
+                    whisk_near_l = snake.get_color_under_near_left_robot_whisker(self.game_surface) != bg
 
                 if whisk_near_r or whisk_ctr:
-                    snake.set_turn_state(Snake.LEFTTURN)
+                    snake.set_turn_state(arc_core.Snake.LEFTTURN)
                 else:
                     if whisk_near_l:
-                        snake.set_turn_state(Snake.RIGHTTURN)
+                        snake.set_turn_state(arc_core.Snake.RIGHTTURN)
                     else:
-                        snake.set_turn_state(Snake.NOTURN)
+                        snake.set_turn_state(arc_core.Snake.NOTURN)
 
     def on_timer_first_step(self, play_beep=True):
         if play_beep:
@@ -184,7 +484,7 @@ class MainGameState(gnppygame.GameState):
         for snake in self.alive_snakes:
             for _ in range(2):
                 snake.step(0.025)  # get the snake to have a bit of color showing
-                snake.draw(self.game_surface)
+                self.mark_dirty(snake.draw(self.game_surface))
 
     def on_timer_first_step_and_start(self):
         self.owner().audio_mgr.play('SOUND19')
@@ -196,9 +496,107 @@ class MainGameState(gnppygame.GameState):
         """Meant to be overridden by rounds if needed"""
         pass
 
+    def clear_circle(self, pos, radius):
+        """Erase trails (and who owned them) inside of a circle on the game surface"""
+        self.mark_dirty(chunks.draw_circle(self.game_surface, CFG.Win.BackgroundColorIdx, pos, radius))
+        self.owner_map.clear(pos, radius)
+        if self.kill_cam is not None:
+            self.kill_cam.add_stamp(pos, radius, CFG.Win.BackgroundColorIdx)
+
+    def erase_trail(self, snake):
+        """Erase every trail pixel drawn by the given snake"""
+        self.owner_map.erase_owner(snake.owner_id, self.game_surface, CFG.Win.BackgroundColorIdx)
+        if self.occupancy is not None:
+            self.occupancy.rebuild()
+
+    def get_killer(self, snake):
+        """Return the snake whose trail the given (dead) snake ran into, or None if it hit a wall of the arena"""
+        whisker_pos = snake.get_whisker_pos()
+        if self.boundary.is_colliding(whisker_pos):
+            return None
+        return self._snakes_by_owner_id.get(self.owner_map.get_owner(whisker_pos.AsIntTuple()))
+
+    @staticmethod
+    def get_look_ahead_pos(snake, distance):
+        """Point the given distance in front of the edge of the snake's head, past its own fresh trail"""
+        return snake.pos + (snake.vel.Normalize() * (snake.draw_size + distance))
+
+    def get_room(self, snake):
+        """How far it is from just in front of the snake to the nearest trail or wall (up to the distance field's max).
+        Looks a couple of cells ahead so that the snake's own fresh trail doesn't count. None if there's no distance field."""
+        distance_field = self.get_distance_field()
+        if distance_field is None:
+            return None
+        look_ahead = self.get_look_ahead_pos(snake, 2 * CFG.DistanceField.CellSize)
+        return distance_field.get_distance(look_ahead.AsTuple())
+
+    def get_distance_field(self):
+        """The distance field of the playfield, built on first use so that rounds nobody asks about don't pay to keep
+        it current. None if the game surface is chunked (no occupancy pyramid)."""
+        if self.distance_field is None and self.occupancy is not None:
+            self.distance_field = spatial.DistanceField(self.occupancy, CFG.DistanceField.CellSize,
+                                                        CFG.DistanceField.MaxDistance)
+        return self.distance_field
+
+    def analyze_regions(self):
+        """Find the pocket of free space each alive snake is in (and how big it is). Returns a dict of snake -> region,
+        where snakes that have no free space in front of them are in the None region."""
+        self.regions.analyze()
+        snake_regions = {}
+        for snake in self.alive_snakes:
+            look_ahead = self.get_look_ahead_pos(snake, 2 * CFG.RegionAnalysis.CellSize)
+            snake_regions[snake] = self.regions.get_region(look_ahead.AsTuple())
+        self.reachable_areas = {snake: self.regions.get_area(region) for snake, region in snake_regions.items()}
+        return snake_regions
+
+    def check_sealed_snakes(self):
+        """Every so often, check if all of the survivors are sealed into separate pockets, where they can no longer
+        affect each other. If they stay that way, either fast forward or resolve the round by remaining area."""
+        if not CFG.RegionAnalysis.On or CFG.RegionAnalysis.SealedAction is None or not self._REGIONS_ARE_PERMANENT or \
+                self.regions is None or len(self.alive_snakes) < 2:
+            return
+        self._region_ticks += 1
+        if self._region_ticks < CFG.RegionAnalysis.IntervalTicks:
+            return
+        self._region_ticks = 0
+        regions = list(self.analyze_regions().values())
+        # a snake with no free space in front of it (None) can't be placed in a pocket, so it doesn't count as sealed
+        is_sealed = None not in regions and len(regions) == len(set(regions))
+        self._sealed_count = self._sealed_count + 1 if is_sealed else 0
+        if self._sealed_count < CFG.RegionAnalysis.ConfirmCount:
+            return
+        if CFG.RegionAnalysis.SealedAction == 'resolve':
+            self.resolve_by_area()
+        elif CFG.RegionAnalysis.SealedAction == 'fast_forward' and not self._is_fast_forwarding:
+            print('Survivors are sealed apart. Fast forwarding.')
+            self._is_fast_forwarding = True
+
+    def resolve_by_area(self):
+        """End the round as if the survivors had filled their pockets: snakes die in order of the area they had left"""
+        print('Survivors are sealed apart. Resolving round by remaining area.')
+        by_area = sorted(self.alive_snakes, key=lambda snake: self.reachable_areas.get(snake, 0))
+        for snake in by_area[:-1]:
+            print('Snake %s is dead. Sealed in with %d pixels of room.' % (snake._controller._name,
+                                                                         self.reachable_areas.get(snake, 0)))
+            self.kill_snake(snake)
+            self.alive_snakes.remove(snake)
+
+    def kill_snake(self, snake, crashed=()):
+        """Blow up a snake and give points to everyone that outlived it (snakes that crashed this tick didn't)"""
+        self.actors.append(snake.make_explosion())
+        self.log_event(gamelog.EVENT_DEATH, snake, snake.killed_by if snake.killed_by is not snake else None)
+        if self.kill_cam is not None:
+            self.kill_cam.add_explosion(snake)
+        self.owner().audio_mgr.play('EXPLODE')
+        # go thru all snakes still in list and give them points for living
+        for scoringSnake in self.alive_snakes:
+            # if this snake is dead (probably just died), dont give him a point
+            if scoringSnake is not snake and scoringSnake not in crashed:
+                self.owner().scoreboard.change_score(scoringSnake._controller._index, CFG.Score.PointsForSurviving)
+
     def draw(self, surface):
         # Working with two main surfaces (so that I can do special effects while also preserving the ability to query a surface for snake collisions):
-        # - pygame.display: contains effects (particles, starting circle) and round labels, erased every frame
+        # - surface (the display, or a playfield sized frame upscaled to it): contains effects (particles, starting circle) and round labels, erased every frame
         # - self.game_surface: snakes and border, erase once at the beginning of each round
         surface.blit(self._surface_eraser, (0, 0))  # erase main display
         self.actors.draw(surface)  # draw visual effects actors (explosions, starting circle)
@@ -217,6 +615,18 @@ class MainGameState(gnppygame.GameState):
         # self.owner().font_mgr.draw(screen, self.fnt, 16, '%s crashed' % ', '.join(whoCrashed), pygame.Rect((0, 280), (self.owner().get_screen_rect().width, 40)), kBlack, 'center', 'center')
         print('Game State FPS: %.4f (time: %.3f ticks: %d)' % (
         self._fps_timer.get_total_fps(), self._fps_timer.get_total_time(), self._fps_timer.get_total_ticks()))
+        if self.owner().latency_meter is not None:
+            print(self.owner().latency_meter.report())
+            self.owner().latency_meter.reset()
+        if self.owner().input_injector is not None:
+            self.owner().input_injector.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+            print('Replay saved to %s' % self.recorder.path)
+            self.recorder = None
+        if self.game_log is not None:
+            self.game_log.close()
+            self.game_log = None
         if CFG.Profiler.On:
             self.owner().request_exit()
         else:
@@ -225,42 +635,76 @@ class MainGameState(gnppygame.GameState):
             self.owner().round_idx += 1
 
     def step(self, time_delta):
+        if not self._has_begun_play:
+            self.begin_play()
+        self.tick_count += 1
+        if self.recorder is not None:
+            if self.recorder.is_keyframe_due():
+                self.recorder.add_keyframe(self.get_state(), [c.last_turns[0] for c in self.owner()._controllers])
+            self.recorder.begin_tick(time_delta)
+        if self.kill_cam is not None:
+            self.kill_cam.begin_frame(time_delta)
+        self.timers.step(time_delta)
         self._fps_timer.tick()
         self.actors.step(time_delta)
         self._label_actors.step(time_delta)
-        display = pygame.display.get_surface()
-        self.draw(display)
+        headless = self.owner().headless
+        meter = self.owner().latency_meter
+        if not headless:
+            frame = self.owner().get_frame_surface()
+            if meter is not None:
+                meter.on_frame_drawn()
+            self.draw(frame)
+            self.owner().present_frame(frame)
         self.input()
 
         if not self._paused:
             if not self.round_over:
-                crashed = []
-
-                for snake in self.alive_snakes:
-                    snake.step(time_delta)
-                    snake.draw(self.game_surface)
-
-                for idx, snake in enumerate(self.alive_snakes):
-                    if snake.is_dead(self.game_surface):
-                        print('Snake %s is dead.' % snake._controller._name)
-                        self.actors.append(snake.make_explosion())
-                        self.owner().audio_mgr.play('EXPLODE')
-                        crashed.append(snake)
-                        # go thru all snakes still in list and give them points for living
-                        for scoringSnake in self.alive_snakes:
-                            # if this snake is dead (probably just died), dont give him a point
-                            if not scoringSnake.is_dead(self.game_surface):
-                                self.owner().scoreboard.change_score(scoringSnake._controller._index,
-                                                                     CFG.Score.PointsForSurviving)
-
-                for crashed_snake in crashed:
-                    self.alive_snakes.remove(crashed_snake)
-                # end round if all but one snake is dead (if a one player game, end round when that one player dies)
-                if (len(self.owner()._controllers) > 1 and len(self.alive_snakes) < 2) or (
-                        len(self.owner()._controllers) == 1 and not self.alive_snakes):
-                    self.end_round()
-
+                for _ in range(CFG.RegionAnalysis.FastForwardRate if self._is_fast_forwarding else 1):
+                    self.step_snakes(time_delta)
+                    if self.round_over:
+                        break
+
+        session = self.owner().netplay
+        if session is not None and session.tick % CFG.Netplay.HashIntervalTicks == 0:
+            session.on_state_hash(netplay.hash_surface(self.game_surface))
+        if self.owner().state_feed is not None:
+            self.owner().state_feed.write(self)
+
+        if headless:
+            return
         pygame.display.update()
+        if meter is not None:
+            meter.on_frame_presented()
+        self._input_dispatcher.poll()  # note input that came in while waiting on the display
+
+    def step_snakes(self, time_delta):
+        """Move the snakes one tick and deal with any that crashed"""
+        for snake in self.alive_snakes:
+            snake.step(time_delta)
+            self.mark_dirty(snake.draw(self.game_surface))
+
+        # test each snake once per tick (scoring used to re-test every survivor for every crash)
+        crashed = [snake for snake in self.alive_snakes if snake.is_dead(self.game_surface)]
+        crashed_set = set(crashed)
+        for snake in crashed:
+            snake.killed_by = self.get_killer(snake)
+            if snake.killed_by is not None and snake.killed_by is not snake:
+                print('Snake %s is dead. Killed by %s.' % (snake._controller._name, snake.killed_by._controller._name))
+                self.owner().scoreboard.add_kill(snake.killed_by._controller._index)
+            else:
+                print('Snake %s is dead.' % snake._controller._name)
+            self.kill_snake(snake, crashed_set)
+
+        for crashed_snake in crashed:
+            self.alive_snakes.remove(crashed_snake)
+        self.check_sealed_snakes()
+        if self.game_log is not None:
+            self.game_log.add_tick(time_delta, self._snakes, self.alive_snakes)
+        # end round if all but one snake is dead (if a one player game, end round when that one player dies)
+        if (len(self.owner()._controllers) > 1 and len(self.alive_snakes) < 2) or (
+                len(self.owner()._controllers) == 1 and not self.alive_snakes):
+            self.end_round()
 
 
 class Apple(object):
@@ -299,8 +743,8 @@ class AppleRound(MainGameState):
     def __init__(self, game_obj):
         super(AppleRound, self).__init__(game_obj)
         self._apple = None
-        self.owner().timers.add(random.uniform(CFG.AppleRound.SpawnStartTime, CFG.AppleRound.SpawnEndTime),
-                                self._on_timer_spawn_apple)
+        self.timers.add(self.owner().rng.uniform(CFG.AppleRound.SpawnStartTime, CFG.AppleRound.SpawnEndTime),
+                        self._on_timer_spawn_apple)
 
     def _on_timer_spawn_apple(self):
         if self.round_over:
@@ -309,6 +753,18 @@ class AppleRound(MainGameState):
         spawn_pt = gnipMath.cVector2(self.game_surface.get_rect().center)
         self._apple = Apple(spawn_pt, CFG.AppleRound.AppleRadius, CFG.AppleRound.AppleColor)
 
+    def get_state(self):
+        state = super(AppleRound, self).get_state()
+        state['apple'] = None if self._apple is None else self._apple.pos.AsTuple()
+        return state
+
+    def set_state(self, state):
+        super(AppleRound, self).set_state(state)
+        self._apple = None
+        if state['apple'] is not None:
+            self._apple = Apple(gnipMath.cVector2(*state['apple']), CFG.AppleRound.AppleRadius,
+                                CFG.AppleRound.AppleColor)
+
     def step(self, time_delta):
         super(AppleRound, self).step(time_delta)
         if self._apple:
@@ -318,6 +774,7 @@ class AppleRound(MainGameState):
             if self._apple is not None and self._apple.is_touching(snake.pos):
                 self._apple.reap()
                 self._apple = None
+                self.log_event(gamelog.EVENT_APPLE, snake)
                 self.owner().audio_mgr.play('SOUND53')  # CAMERA SOUND43 SOUND53 SOUND528 P735
                 self.owner().scoreboard.change_score(snake._controller._index, CFG.AppleRound.PointsPerApple)
 
@@ -335,21 +792,33 @@ class AppleRushRound(MainGameState):
     def __init__(self, game_obj):
         super(AppleRushRound, self).__init__(game_obj)
         self._apples = gnppygame.ActorList()
-        self.owner().timers.add(3.0, self._on_timer_spawn_apple)
+        self.timers.add(3.0, self._on_timer_spawn_apple)
         self.enable_wrapping()
 
     def _on_timer_spawn_apple(self):
         if self.round_over:
             return
-        self.owner().timers.add(0.5, self._on_timer_spawn_apple)
+        self.timers.add(0.5, self._on_timer_spawn_apple)
         if len(self._apples) >= CFG.AppleRushRound.MaxApples:
             return
         self.owner().audio_mgr.play('SOUND528')  # CAMERA SOUND43 SOUND53 SOUND528 P735z
         spawn_rect = self.game_surface.get_rect()
         spawn_rect.inflate_ip(-30, -30)  # Keep apple away from edges a bit
-        self._apples.append(Apple(gnipMath.cVector2.RandInRect(spawn_rect), CFG.AppleRushRound.AppleRadius,
+        self._apples.append(Apple(utils.rand_in_rect(spawn_rect, self.owner().rng), CFG.AppleRushRound.AppleRadius,
                                   CFG.AppleRushRound.AppleColor))
 
+    def get_state(self):
+        state = super(AppleRushRound, self).get_state()
+        state['apples'] = [apple.pos.AsTuple() for apple in self._apples if not apple.can_reap()]
+        return state
+
+    def set_state(self, state):
+        super(AppleRushRound, self).set_state(state)
+        self._apples = gnppygame.ActorList()
+        for pos in state['apples']:
+            self._apples.append(Apple(gnipMath.cVector2(*pos), CFG.AppleRushRound.AppleRadius,
+                                      CFG.AppleRushRound.AppleColor))
+
     def step(self, time_delta):
         super(AppleRushRound, self).step(time_delta)
         self._apples.step(time_delta)
@@ -357,6 +826,7 @@ class AppleRushRound(MainGameState):
         for snake in self.alive_snakes:
             for apple in self._apples:
                 if apple.is_touching(snake.pos):
+                    self.log_event(gamelog.EVENT_APPLE, snake)
                     self.owner().audio_mgr.play('SOUND53')  # CAMERA SOUND43 SOUND53 SOUND528 P735
                     self.owner().scoreboard.change_score(snake._controller._index, CFG.AppleRushRound.PointsPerApple)
                     apple.reap()
@@ -418,12 +888,11 @@ class JitterRoundBase(MainGameState):
         self.set_timer()
 
     def set_timer(self):
-        game = self.owner()
-        game.timers.add(self.jitter_interval, functools.partial(self.on_do_jitter))
+        self.timers.add(self.jitter_interval, functools.partial(self.on_do_jitter))
 
     def on_do_jitter(self):
         """Callback to fire when the snake's cooldown has reset"""
-        jitter_amount = random.choice(self.jitter_amounts)
+        jitter_amount = self.owner().rng.choice(self.jitter_amounts)
         if not self.round_over:
             game = self.owner()
             for snake in self.alive_snakes:
@@ -466,6 +935,7 @@ class JukeRound(MainGameState):
 class IndigestionRound(MainGameState):
     """Change width of snake as round progresses"""
     _LABEL = 'Indigestion'
+    _STATE_ATTRIBUTES = MainGameState._STATE_ATTRIBUTES + ('_elapsed',)
 
     def __init__(self, game_obj):
         super(IndigestionRound, self).__init__(game_obj)
@@ -489,6 +959,7 @@ class GoliathRound(MainGameState):
 
     Author: Kaelan E."""
     _LABEL = 'Goliath'
+    _STATE_ATTRIBUTES = MainGameState._STATE_ATTRIBUTES + ('_elapsed',)
 
     def __init__(self, game_obj):
         super(GoliathRound, self).__init__(game_obj)
@@ -511,6 +982,7 @@ class SpeedCyclesRound(MainGameState):
 
     Author: Kaelan E."""
     _LABEL = 'Speed Cycles'
+    _STATE_ATTRIBUTES = MainGameState._STATE_ATTRIBUTES + ('_elapsed',)
 
     def __init__(self, game_obj):
         super(SpeedCyclesRound, self).__init__(game_obj)
@@ -534,6 +1006,7 @@ class LeadFootRound(MainGameState):
 
     Author: Kaelan E."""
     _LABEL = 'Lead Foot'
+    _STATE_ATTRIBUTES = MainGameState._STATE_ATTRIBUTES + ('_elapsed',)
 
     def __init__(self, game_obj):
         super(LeadFootRound, self).__init__(game_obj)
@@ -554,6 +1027,7 @@ class ReadyAimRound(MainGameState):
     """Snakes fire projectiles to break through walls"""
     _LABEL = 'Ready, Aim... Fire!'
     _SUB_LABEL = 'Press both buttons to fire!'
+    _REGIONS_ARE_PERMANENT = False
 
     class Bullet(object):
         def __init__(self, position, velocity, source_color):
@@ -606,7 +1080,7 @@ class ReadyAimRound(MainGameState):
             game.audio_mgr.play('SOUND999')  # SOUND49 SOUND58 # SOUND12
             self._bullets.append(self.Bullet(snake.pos, snake.vel, snake.body_color))
             snake.set_head_dim(True)
-            game.timers.add(CFG.ReadyAimRound.FiringCooldown,
+            self.timers.add(CFG.ReadyAimRound.FiringCooldown,
                             functools.partial(ReadyAimRound.on_timer_reset_firing, snake))
 
     @staticmethod
@@ -614,6 +1088,21 @@ class ReadyAimRound(MainGameState):
         """Callback to fire when the snake's cooldown has reset"""
         snake.set_head_dim(False)
 
+    def get_state(self):
+        state = super(ReadyAimRound, self).get_state()
+        state['bullets'] = [(bullet.pos.AsTuple(), bullet._vel.AsTuple(), bullet.source_color)
+                            for bullet in self._bullets if not bullet.can_reap()]
+        return state
+
+    def set_state(self, state):
+        super(ReadyAimRound, self).set_state(state)
+        self._bullets = gnppygame.ActorList()
+        for pos, vel, source_color in state['bullets']:
+            bullet = self.Bullet(gnipMath.cVector2(*pos), gnipMath.cVector2(*vel), source_color)
+            bullet.pos = gnipMath.cVector2(*pos)
+            bullet._vel = gnipMath.cVector2(*vel)
+            self._bullets.append(bullet)
+
     def draw(self, surface):
         super(ReadyAimRound, self).draw(surface)
         self._vfx_actors.draw(surface)
@@ -630,8 +1119,7 @@ class ReadyAimRound(MainGameState):
                 bullet.reap()
             if bullet.is_touching_wall(game_surface):
                 self.owner().audio_mgr.play('SOUND49D')
-                pygame.draw.circle(game_surface, CFG.Win.BackgroundColorIdx, bullet.pos.AsIntTuple(),
-                                   CFG.ReadyAimRound.ExplosionRadius)
+                self.clear_circle(bullet.pos.AsIntTuple(), CFG.ReadyAimRound.ExplosionRadius)
                 self._vfx_actors.extend(self._explosion_factory(bullet.pos, bullet.source_color.rgb))
                 bullet.reap()
 
@@ -663,26 +1151,27 @@ class SqueezeRound(MainGameState):
     """Have the playfield slowly shrink"""
     _LABEL = 'Squeeze'
 
-    def __init__(self, game_obj):
-        super(SqueezeRound, self).__init__(game_obj)
-        game_rect = self.game_surface.get_rect()
-        self._center_point = (game_rect.centerx, game_rect.centery)
-        self._center_point_jitter = (game_rect.centerx + 1, game_rect.centery)
-        self._radius = gnipMath.cVector2(self._center_point[0], self._center_point[1]).Magnitude()  # rectangle diagonal
-        self._radius = int(self._radius * CFG.SqueezeRound.StartDelayMultiplier)  # delay start of squeeze for a bit
-        self._total_time = CFG.SqueezeRound.SqueezeDuration
-        self._elapsed = 0.0
+    def add_boundaries(self, arena_rect):
+        radius = gnipMath.cVector2(arena_rect.centerx, arena_rect.centery).Magnitude()  # rectangle diagonal
+        radius = int(radius * CFG.SqueezeRound.StartDelayMultiplier)  # delay start of squeeze for a bit
+        self._squeeze = self.boundary.add(arena.ShrinkingCircle(
+            arena_rect.center, radius, CFG.SqueezeRound.MinCircleRadius, CFG.SqueezeRound.SqueezeDuration))
+
+    def get_state(self):
+        state = super(SqueezeRound, self).get_state()
+        state['squeeze'] = self._squeeze.get_state()
+        return state
+
+    def set_state(self, state):
+        super(SqueezeRound, self).set_state(state)
+        self._squeeze.set_state(state['squeeze'])
 
     def step(self, time_delta):
         super(SqueezeRound, self).step(time_delta)
-        radius = int(
-            gnipMath.Lerp(self._radius, CFG.SqueezeRound.MinCircleRadius, min(self._elapsed / self._total_time, 1.0)))
-        # Pygame bug: circles with width > 1 have missing pixels (moire pattern artifacts on concentric circles): Fixed in Pygame 1.9.4: https://stackoverflow.com/a/48720206
-        # Put in a hacky fix that draws two circles with a one pixel offset to get rid of circle drawing artifacts
-        pygame.draw.circle(self.game_surface, CFG.Win.BorderColorIdx, self._center_point, radius, 3)
-        pygame.draw.circle(self.game_surface, CFG.Win.BorderColorIdx, self._center_point_jitter, radius, 3)
-        self._elapsed += time_delta
-        # Maybe slow down shrink rate as it gets smaller?
+        self._squeeze.step(time_delta)
+        band = self._squeeze.draw(self.game_surface)  # only touches the game surface when the radius changes
+        if band is not None:
+            self.occupancy.mark_dirty_ring(self._squeeze.center, *band)
 
 
 class TreasureChamberRound(MainGameState):
@@ -697,24 +1186,36 @@ class TreasureChamberRound(MainGameState):
         center_point = (game_rect.centerx, game_rect.centery)
         self._apples = gnppygame.ActorList()
         for a in range(CFG.TreasureChamberRound.AppleCount):
-            pos = gnipMath.cVector2.RandInCircle(center_point,
-                                                 CFG.TreasureChamberRound.ChamberInnerRadius - 10)  # -10 is buffer
+            pos = utils.rand_in_circle(center_point, CFG.TreasureChamberRound.ChamberInnerRadius - 10,  # -10 is buffer
+                                       self.owner().rng)
             apple = Apple(pos, CFG.TreasureChamberRound.AppleRadius, CFG.TreasureChamberRound.AppleColor)
             self._apples.append(apple)
 
-        outer_width = 2 * CFG.TreasureChamberRound.ChamberOuterRadius
-        outer_rect = pygame.Rect(0, 0, outer_width, outer_width)
-        outer_rect.center = game_rect.center
-        inner_width = 2 * CFG.TreasureChamberRound.ChamberInnerRadius
-        inner_rect = pygame.Rect(0, 0, inner_width, inner_width)
-        inner_rect.center = game_rect.center
-
+    def add_boundaries(self, arena_rect):
+        # chamber walls are rasterized into the game surface when the round begins
+        center_point = arena_rect.center
         arc_count = 8
-        delta = (2 * math.pi) / arc_count
-        for i in range(arc_count):
-            pygame.draw.arc(game_surface, CFG.Win.BorderColorIdx, inner_rect, i * delta, (i * delta) + (delta * .7), 5)
-            pygame.draw.arc(game_surface, CFG.Win.BorderColorIdx, outer_rect, i * delta + 0.3,
-                            (i * delta) + (delta * .7) + 0.3, 5)
+        self.boundary.add(arena.ChamberArcs(center_point, CFG.TreasureChamberRound.ChamberInnerRadius, arc_count, .7, 0.0, 5))
+        self.boundary.add(arena.ChamberArcs(center_point, CFG.TreasureChamberRound.ChamberOuterRadius, arc_count, .7, 0.3, 5))
+
+    def is_valid_start(self, pos):
+        """Keep out of the chamber, and far enough from its outer wall to have room to turn away"""
+        center = self.get_arena_rect().center
+        keep_out = CFG.TreasureChamberRound.ChamberOuterRadius + CFG.StartPositions.SmallestClearance
+        return math.hypot(pos.x - center[0], pos.y - center[1]) > keep_out and \
+            super(TreasureChamberRound, self).is_valid_start(pos)
+
+    def get_state(self):
+        state = super(TreasureChamberRound, self).get_state()
+        state['apples'] = [apple.pos.AsTuple() for apple in self._apples if not apple.can_reap()]
+        return state
+
+    def set_state(self, state):
+        super(TreasureChamberRound, self).set_state(state)
+        self._apples = gnppygame.ActorList()
+        for pos in state['apples']:
+            self._apples.append(Apple(gnipMath.cVector2(*pos), CFG.TreasureChamberRound.AppleRadius,
+                                      CFG.TreasureChamberRound.AppleColor))
 
     def step(self, time_delta):
         super(TreasureChamberRound, self).step(time_delta)
@@ -723,6 +1224,7 @@ class TreasureChamberRound(MainGameState):
             for snake in self.alive_snakes:
                 if apple.is_touching(snake.pos):
                     apple.reap()
+                    self.log_event(gamelog.EVENT_APPLE, snake)
                     self.owner().audio_mgr.play('SOUND53')  # CAMERA SOUND43 SOUND53 SOUND528 P735
                     self.owner().scoreboard.change_score(snake._controller._index,
                                                          CFG.TreasureChamberRound.PointsPerApple)
@@ -749,18 +1251,11 @@ class ScatterRound(MainGameState):
         super(ScatterRound, self).__init__(game_obj)
         # The algorithm for randomly placing the snakes makes sure no two snakes
         # randomly get placed right next to each other where a crash is unavoidable.
-        rect = self.game_surface.get_rect()
-        pts = utils.make_grid_points(rect, 140)
-        # [self.actors.append(gnpactor.Circle(p, 3, gnppygame.WHITE, 10.0)) for p in pts]  # for visualizing the grid
-        pts = [p + utils.get_jitter_vect(15, 15) for p in pts]
-        # [self.actors.append(gnpactor.Circle(p, 3, gnppygame.DARKGRAY, 10.0)) for p in pts]  # for visualizing the grid with jitter
-        assert len(pts) >= len(
-            self.alive_snakes), 'Can not shuffle positions for %d snakes from %d possible positions' % (
-        len(self.alive_snakes), len(pts))
-        random.shuffle(pts)
-        for snake in self.alive_snakes:
-            snake.pos = pts.pop()
-            snake._start_direction = gnipMath.cVector2.RandomDirection()
+        starts = self.get_scattered_starts(len(self.alive_snakes), self.game_surface.get_rect())
+        # [self.actors.append(gnpactor.Circle(p, 3, gnppygame.WHITE, 10.0)) for p, d in starts]  # for visualizing the points
+        for snake, (pos, direction) in zip(self.alive_snakes, starts):
+            snake.pos = pos
+            snake._start_direction = direction
             snake.set_initial_speed(CFG.Snake.Speed)
 
 
@@ -787,6 +1282,7 @@ class FollowerRound(MainGameState):
     """An enemy that follows closest snake and eats walls"""
     _LABEL = 'Followers'
     _SUB_LABEL = 'Harmless but hungry...'
+    _REGIONS_ARE_PERMANENT = False
 
     class FollowerController(object):
         def __init__(self, target_actor, snakes, boundary_rect):
@@ -848,12 +1344,23 @@ class FollowerRound(MainGameState):
         self._enemies = gnppygame.ActorList()
         self._controllers = gnppygame.ActorList()
         for _ in range(len(self.alive_snakes)):
-            pos = gnipMath.cVector2.RandInCircle(game_rect.center, radius)
+            pos = utils.rand_in_circle(game_rect.center, radius, self.owner().rng)
             self._enemies.append(FollowerRound.Follower(pos, gnppygame.DARKGRAY))
         for enemy in self._enemies:
             self._controllers.append(
                 FollowerRound.FollowerController(enemy, self.alive_snakes, self.game_surface.get_rect()))
 
+    def get_state(self):
+        state = super(FollowerRound, self).get_state()
+        state['followers'] = [(enemy.pos.AsTuple(), enemy.vel.AsTuple()) for enemy in self._enemies]
+        return state
+
+    def set_state(self, state):
+        super(FollowerRound, self).set_state(state)
+        for enemy, (pos, vel) in zip(self._enemies, state['followers']):
+            enemy.pos = gnipMath.cVector2(*pos)
+            enemy.vel = gnipMath.cVector2(*vel)
+
     def step(self, time_delta):
         super(FollowerRound, self).step(time_delta)
         if self._paused:
@@ -863,8 +1370,7 @@ class FollowerRound(MainGameState):
         self._enemies.step(time_delta)
         for enemy in self._enemies:
             if enemy.is_touching_something(game_surface):
-                pygame.draw.circle(game_surface, CFG.Win.BackgroundColorIdx, enemy.pos.AsIntTuple(),
-                                   CFG.FollowerRound.FollowerClearRadius)
+                self.clear_circle(enemy.pos.AsIntTuple(), CFG.FollowerRound.FollowerClearRadius)
 
     def draw(self, surface):
         super(FollowerRound, self).draw(surface)
@@ -916,8 +1422,21 @@ class AlternateTurnsRound(MainGameState):
 
     def __init__(self, game_obj):
         super(AlternateTurnsRound, self).__init__(game_obj)
+        self._shims = []
         for snake in self.alive_snakes:
-            snake._turn_state_callback = self.CallbackShim().turn_state_callback
+            shim = self.CallbackShim()
+            snake._turn_state_callback = shim.turn_state_callback
+            self._shims.append(shim)
+
+    def get_state(self):
+        state = super(AlternateTurnsRound, self).get_state()
+        state['shims'] = [(shim.last_turn, shim.blocked_state) for shim in self._shims]
+        return state
+
+    def set_state(self, state):
+        super(AlternateTurnsRound, self).set_state(state)
+        for shim, (last_turn, blocked_state) in zip(self._shims, state['shims']):
+            shim.last_turn, shim.blocked_state = last_turn, blocked_state
 
 
 class BoostRound(MainGameState):
@@ -942,8 +1461,8 @@ class BoostRound(MainGameState):
             game.audio_mgr.play('SOUND28')  # newemail, PUSH
             snake.set_head_dim(True)
             snake.set_speed(CFG.BoostRound.Speed)
-            game.timers.add(CFG.BoostRound.BoostDuration, functools.partial(BoostRound.on_boost_complete, snake))
-            game.timers.add(CFG.BoostRound.BoostCooldown, functools.partial(BoostRound.on_boost_timer_reset, snake))
+            self.timers.add(CFG.BoostRound.BoostDuration, functools.partial(BoostRound.on_boost_complete, snake))
+            self.timers.add(CFG.BoostRound.BoostCooldown, functools.partial(BoostRound.on_boost_timer_reset, snake))
 
     @staticmethod
     def on_boost_complete(snake):
@@ -960,6 +1479,7 @@ class BeamMeUpRound(MainGameState):
     """Teleport your snake. Do you want to take the risk?"""
     _LABEL = 'Beam me up'
     _SUB_LABEL = 'Press both buttons to teleport'
+    _REGIONS_ARE_PERMANENT = False
 
     def __init__(self, game_obj):
         super(BeamMeUpRound, self).__init__(game_obj)
@@ -978,8 +1498,8 @@ class BeamMeUpRound(MainGameState):
             game = self.owner()
             game.audio_mgr.play('SOUND28')  # newemail, PUSH
             snake.set_head_dim(True)
-            snake.pos = gnipMath.cVector2.RandInRect(snake.wrap_boundary)
-            game.timers.add(CFG.BeamMeUpRound.TeleportCooldown,
+            snake.pos = utils.rand_in_rect(snake.wrap_boundary, game.rng)
+            self.timers.add(CFG.BeamMeUpRound.TeleportCooldown,
                             functools.partial(BeamMeUpRound.on_teleport_timer_reset, snake))
 
     @staticmethod
@@ -994,6 +1514,7 @@ class SqueezeReadyAimComboRound(MainGameState):
     Author: Kaelan E."""
     _LABEL = 'Ready, Aim... Squeeze!'
     _SUB_LABEL = 'Press both buttons to fire!'
+    _REGIONS_ARE_PERMANENT = False
 
     class Bullet(object):
         def __init__(self, position, velocity, source_color):
@@ -1025,17 +1546,15 @@ class SqueezeReadyAimComboRound(MainGameState):
             touching = clr not in (CFG.Win.BackgroundColorRGB, CFG.Win.BorderColorRGB)
             return touching
 
+    def add_boundaries(self, arena_rect):
+        radius = gnipMath.cVector2(arena_rect.centerx, arena_rect.centery).Magnitude()  # rectangle diagonal
+        radius = int(radius * CFG.SqueezeReadyAimComboRound.StartDelayMultiplier)  # delay start of squeeze for a bit
+        self._squeeze = self.boundary.add(arena.ShrinkingCircle(
+            arena_rect.center, radius, CFG.SqueezeReadyAimComboRound.MinCircleRadius,
+            CFG.SqueezeReadyAimComboRound.SqueezeDuration))
+
     def __init__(self, game_obj):
         super(SqueezeReadyAimComboRound, self).__init__(game_obj)
-        game_rect = self.game_surface.get_rect()
-        self._center_point = (game_rect.centerx, game_rect.centery)
-        self._center_point_jitter = (game_rect.centerx + 1, game_rect.centery)
-        self._radius = gnipMath.cVector2(self._center_point[0], self._center_point[1]).Magnitude()  # rectangle diagonal
-        self._radius = int(
-            self._radius * CFG.SqueezeReadyAimComboRound.StartDelayMultiplier)  # delay start of squeeze for a bit
-        self._total_time = CFG.SqueezeReadyAimComboRound.SqueezeDuration
-        self._elapsed = 0.0
-
         self._bullets = gnppygame.ActorList()
         self._vfx_actors = gnppygame.ActorList()
         for snake in self.alive_snakes:
@@ -1055,7 +1574,7 @@ class SqueezeReadyAimComboRound(MainGameState):
             game.audio_mgr.play('SOUND999')
             self._bullets.append(self.Bullet(snake.pos, snake.vel, snake.body_color))
             snake.set_head_dim(True)
-            game.timers.add(CFG.SqueezeReadyAimComboRound.FiringCooldown,
+            self.timers.add(CFG.SqueezeReadyAimComboRound.FiringCooldown,
                             functools.partial(SqueezeReadyAimComboRound.on_timer_reset_firing, snake))
 
     @staticmethod
@@ -1063,6 +1582,23 @@ class SqueezeReadyAimComboRound(MainGameState):
         """Callback to fire when the snake's cooldown has reset"""
         snake.set_head_dim(False)
 
+    def get_state(self):
+        state = super(SqueezeReadyAimComboRound, self).get_state()
+        state['squeeze'] = self._squeeze.get_state()
+        state['bullets'] = [(bullet.pos.AsTuple(), bullet._vel.AsTuple(), bullet.source_color)
+                            for bullet in self._bullets if not bullet.can_reap()]
+        return state
+
+    def set_state(self, state):
+        super(SqueezeReadyAimComboRound, self).set_state(state)
+        self._squeeze.set_state(state['squeeze'])
+        self._bullets = gnppygame.ActorList()
+        for pos, vel, source_color in state['bullets']:
+            bullet = self.Bullet(gnipMath.cVector2(*pos), gnipMath.cVector2(*vel), source_color)
+            bullet.pos = gnipMath.cVector2(*pos)
+            bullet._vel = gnipMath.cVector2(*vel)
+            self._bullets.append(bullet)
+
     def draw(self, surface):
         super(SqueezeReadyAimComboRound, self).draw(surface)
         self._vfx_actors.draw(surface)
@@ -1070,14 +1606,10 @@ class SqueezeReadyAimComboRound(MainGameState):
 
     def step(self, time_delta):
         super(SqueezeReadyAimComboRound, self).step(time_delta)
-        radius = int(
-            gnipMath.Lerp(self._radius, CFG.SqueezeRound.MinCircleRadius, min(self._elapsed / self._total_time, 1.0)))
-        # Pygame bug: circles with width > 1 have missing pixels (moire pattern artifacts on concentric circles): Fixed in Pygame 1.9.4: https://stackoverflow.com/a/48720206
-        # Put in a hacky fix that draws two circles with a one pixel offset to get rid of circle drawing artifacts
-        pygame.draw.circle(self.game_surface, CFG.Win.BorderColorIdx, self._center_point, radius, 3)
-        pygame.draw.circle(self.game_surface, CFG.Win.BorderColorIdx, self._center_point_jitter, radius, 3)
-        self._elapsed += time_delta
-        # Maybe slow down shrink rate as it gets smaller?
+        self._squeeze.step(time_delta)
+        band = self._squeeze.draw(self.game_surface)  # only touches the game surface when the radius changes
+        if band is not None:
+            self.occupancy.mark_dirty_ring(self._squeeze.center, *band)
 
         self._bullets.step(time_delta)
         self._vfx_actors.step(time_delta)
@@ -1088,8 +1620,11 @@ class SqueezeReadyAimComboRound(MainGameState):
                 bullet.reap()
             if bullet.is_touching_wall(game_surface):
                 self.owner().audio_mgr.play('SOUND49D')
-                pygame.draw.circle(game_surface, CFG.Win.BackgroundColorIdx, bullet.pos.AsIntTuple(),
-                                   CFG.SqueezeReadyAimComboRound.ExplosionRadius)
+                self.clear_circle(bullet.pos.AsIntTuple(), CFG.SqueezeReadyAimComboRound.ExplosionRadius)
+                band = self._squeeze.repair(self.game_surface, bullet.pos.AsIntTuple(),
+                                            CFG.SqueezeReadyAimComboRound.ExplosionRadius)
+                if band is not None:
+                    self.occupancy.mark_dirty_ring(self._squeeze.center, *band)
                 self._vfx_actors.extend(self._explosion_factory(bullet.pos, bullet.source_color.rgb))
                 bullet.reap()
 
@@ -1115,3 +1650,37 @@ class SqueezeReadyAimComboRound(MainGameState):
             1
         )
         return implode, explode, ring
+
+
+class BigArenaRound(MainGameState):
+    """Arena that is bigger than the screen. The camera scrolls and zooms to keep the snakes that are still alive in
+    view. Trails are stored in chunks, so cost follows how much has been drawn, not the size of the arena."""
+    _LABEL = 'Big Arena'
+    _SUB_LABEL = 'The camera follows the survivors'
+    _CHUNK_SIZE = CFG.BigArenaRound.ChunkSize
+
+    def __init__(self, game_obj):
+        super(BigArenaRound, self).__init__(game_obj)
+        self._camera = chunks.Camera(self.owner().get_playfield_rect().size, self.get_arena_rect(),
+                                     CFG.BigArenaRound.CameraMargin, CFG.BigArenaRound.MinZoom,
+                                     CFG.BigArenaRound.MaxZoom, CFG.BigArenaRound.CameraFollowRate)
+        self._camera.update([snake.pos for snake in self.alive_snakes], 0.0, snap=True)
+
+    def get_arena_rect(self):
+        return pygame.Rect(0, 0, CFG.BigArenaRound.Width, CFG.BigArenaRound.Height)
+
+    def get_snake_starts(self, num_players, playfield_rect):
+        return self.get_scattered_starts(num_players, playfield_rect)
+
+    def draw(self, surface):
+        # Effect actors (explosions, starting circles) are positioned in arena coordinates, so they aren't drawn here
+        surface.blit(self._surface_eraser, (0, 0))  # erase main display
+        self.draw_below_game(surface)
+        self.game_surface.draw_view(surface, self._camera.get_view_rect(), self._camera.zoom)
+        self._label_actors.draw(surface)
+
+    def step(self, time_delta):
+        self._camera.update([snake.pos for snake in self.alive_snakes], time_delta)
+        super(BigArenaRound, self).step(time_delta)
+        self.game_surface.free_empty_chunks()
+        self.owner_map.free_empty_chunks()
@@ -90,8 +90,17 @@ class Player:
 
     RequireUniqueColors = True
 
+    # Expanded mode generates extra colors (after the ones above) so that many more snakes can play. Good for bot-filled
+    # arenas and big crowds. The 8-bit palette has room for 251 player colors.
+    ExpandedMode = False
+    ExpandedColorCount = 96
+    RegistrationListRows = 18  # players per column when the registration list switches to a grid
+
 class Score:
     PointsForSurviving = 10
+    PageSize = 14  # players on the scoreboard at once. Larger games page through the players.
+    PageTime = 3.0  # seconds each page of the scoreboard is shown
+    MaxNamesListed = 5
 
 class Snake:
     Speed = 70
@@ -106,6 +115,10 @@ class Win:
     # HD resolution
     ResolutionX = 1280
     ResolutionY = 720
+    # Logical resolution of the playfield. Simulation and collision happen at this size on any display, and each frame
+    # is upscaled to the display (letterboxed if the aspect ratios differ).
+    PlayfieldX = 1280
+    PlayfieldY = 720
     Fullscreen = True
     BackgroundColorIdx = 100
     BackgroundColorRGB = (0, 0, 0)
@@ -113,6 +126,24 @@ class Win:
     BorderColorIdx = 101
     BorderColorRGB = (100, 100, 100)
 
+class StartPositions:
+    MinClearance = 110  # pixels between snakes, when they are scattered around the arena
+    SmallestClearance = 30  # clearance is shrunk toward this when there are too many snakes to fit
+    LookAhead = 100  # pixels. Snakes start heading in a direction that stays clear of other snakes for this long.
+    EdgeMargin = 40
+
+class DistanceField:
+    CellSize = 8  # pixels. Must evenly divide 64.
+    MaxDistance = 128  # pixels. Anything farther away than this from a trail is reported as this.
+
+class RegionAnalysis:
+    On = False  # changes how rounds end, so only when asked for
+    CellSize = 4  # pixels. Must be one of the occupancy pyramid tile sizes. Narrower passages count as closed.
+    IntervalTicks = 20
+    ConfirmCount = 2  # survivors must be found sealed apart this many analyses in a row before acting on it
+    SealedAction = 'resolve'  # 'resolve' (by remaining area), 'fast_forward' or None
+    FastForwardRate = 4  # simulation ticks per frame while fast forwarding
+
 class Background:
     Visible = True
     RandomizeOrder = True
@@ -157,17 +188,98 @@ class Input:
     JoyCountMax = 8
     JoyDeadzone = 0.6
     OnePlayerPerJoy = True
-    
+    SubFrameTurns = True  # apply turns at the point in the tick the button was pressed, instead of at the start of it
+
+class NetInput:
+    On = False  # let players use devices on the local network (ex: phones) as controllers, see netinput.py
+    Host = '0.0.0.0'
+    Port = 7878
+
+class Netplay:
+    On = False  # play a match together with other arc_arena instances over the network, in lockstep (see netplay.py)
+    Addresses = ('127.0.0.1:47400', '127.0.0.1:47401')  # host:port of every instance, in peer index order
+    PeerIndex = 0  # which of the Addresses is this instance (or use the --netplay-peer command line option)
+    TickRate = 60
+    InputDelayTicks = 4
+    HashIntervalTicks = 60
+    ConnectTimeout = 60.0
+    StallTimeout = 10.0
+
 class Sound:
     EnableSFX = True
 
 class Debug:
     On = False
     FastStart = True
+    EchoEvents = False  # print input events and the player list on the registration screen
 
 class Profiler:
     On = False
 
+class Latency:
+    On = False  # measure input-to-photon latency and print histograms at the end of each round
+    HistogramBucketMs = 4
+    HistogramBuckets = 25
+    SyntheticInput = False  # press the registered players' buttons at random (to measure without anyone playing)
+    SyntheticPressRate = 6.0  # presses per second, across all players
+    SyntheticHoldMin = 0.05
+    SyntheticHoldMax = 0.4
+
+class Replay:
+    On = False  # record the input of every round to a replay file (see replay.py)
+    Directory = 'replays'
+    KeyframeIntervalTicks = 300  # a snapshot of the round every this many ticks (5 seconds), for seeking in replays
+
+class Snapshot:
+    On = False  # snapshots of rounds in memory, for rematches, rewinding and benchmarks (see snapshot.py)
+    SaveKey = 'f6'  # save the round as it is now
+    RestoreKey = 'f7'  # put the round back the way it was when saved
+    WriteKey = 'f8'  # write the saved snapshot to a file in Directory
+    RematchKey = 'r'  # on the score screen: play the round again, from the same start
+    Directory = 'snapshots'
+    StartFile = None  # snapshot file to start the first round from (ex: a benchmark scenario), or None
+
+class GameLog:
+    On = False  # log snake positions and events of every round to a file, for analytics.py (see gamelog.py)
+    Directory = 'logs'
+
+class Analytics:
+    HeatmapSize = (128, 72)  # cells across and down the arena
+    Processes = None  # worker processes, or None for one per CPU core
+    FilesPerTask = 8  # log files handed to a worker at a time
+
+class Export:
+    Size = (640, 360)  # frame size of exported clips (see export.py)
+    FrameRate = 30  # frames per second. Most viewers slow GIFs down above 50.
+    Processes = None  # frame encoding worker processes, or None for one per CPU core
+    QueueFrames = 32  # rendered frames waiting to be encoded, at most. Bounds the memory an export uses.
+    FfmpegCommand = 'ffmpeg'  # encodes video files (.mp4, .webm, ...)
+
+class Capture:
+    On = False  # ToggleKey starts and stops capturing the display to a file, on any screen (see capture.py)
+    ToggleKey = 'f9'
+    Directory = 'captures'
+    FrameRate = 30  # frames captured per second, at most
+    Buffers = 4  # captured frames that can wait to be compressed. Frames are dropped while all of them are waiting.
+    CompressLevel = 1  # zlib level. Higher levels make smaller files, but take longer (so more frames get dropped).
+
+class SharedFrames:
+    On = False  # publish every frame to shared memory, for streaming tools and second screens (see shmframes.py)
+    Name = 'arc_arena_frames'  # of the shared memory block
+    Slots = 3  # frames in the ring buffer. With three, a reader has a whole frame's time to read one.
+    FrameRate = 60  # frames published per second, at most
+
+class StateFeed:
+    On = False  # write the live state of every round to a memory-mapped file, for overlays and bots (see statefeed.py)
+    Filename = 'ArcArena.stateFeed'
+    PlayerSlots = 32  # players the file has room for
+
+class KillCam:
+    On = True  # replay the end of each round in slow motion on the score screen (see killcam.py)
+    Seconds = 2.5
+    SlowMotion = 0.35  # playback speed
+    MaxFrameRate = 240  # frames per second the buffer has room for. Caps its memory use however fast the game runs.
+
 
 ########## Round-specific config
 class Round:
@@ -276,3 +388,12 @@ class SqueezeReadyAimComboRound:
     WallSize = 200
     HeadColorDimIdx = 103
     HeadColorDimRGB = (160, 160, 160)
+
+class BigArenaRound:
+    Width = 3840
+    Height = 2160
+    ChunkSize = 256
+    CameraMargin = 200  # pixels kept around the outermost snakes
+    MinZoom = 0.25
+    MaxZoom = 1.0
+    CameraFollowRate = 0.9  # fraction of the way to the target framing the camera moves each second
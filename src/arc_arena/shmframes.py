@@ -0,0 +1,226 @@
+"""
+Every frame the game shows, published to shared memory for streaming tools, lobby screens and recorders running on the
+same machine (see settings.SharedFrames)
+
+The game copies the display into the next slot of a ring buffer of settings.SharedFrames.Slots frames, right after
+each pygame.display.update(), and that is all it does: it never waits on a reader, and readers never touch the game.
+Readers map the same memory and read the latest frame in place.
+
+Layout of the shared memory block (named settings.SharedFrames.Name, all integers little endian):
+
+    header, HEADER_SIZE bytes:
+        b'ARCF', uint16 version, uint16 slot count, uint32 width, height, pitch (bytes per row),
+        uint32 red, green and blue masks of the 32 bit pixels, uint64 frames published so far
+    slots, each SLOT_HEADER_SIZE + pitch * height bytes:
+        uint64 sequence number, uint64 frame number, uint64 microseconds since publishing started, then the pixels
+
+The latest frame is frame number (frames published - 1), in slot (frames published - 1) % slot count. Each slot is a
+seqlock: its sequence number is odd while the game writes to it. A reader notes the sequence number (waiting if it is
+odd), reads the pixels, and checks the sequence number again. If it changed, the game wrote over the frame while it was
+being read, and the reader tries again. With three slots, that only happens to a reader more than a frame behind.
+
+Check it works, with a reader in another process, on synthetic frames:
+
+    python -m arc_arena.shmframes --self-test [SECONDS]
+
+Watch a running game (with settings.SharedFrames.On) from another process, saving the latest frame to a PNG file:
+
+    python -m arc_arena.shmframes [--seconds N] [--out FRAME.png]
+"""
+import multiprocessing
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+import numpy
+import pygame
+from arc_arena import settings
+from arc_arena import capture
+
+CFG = settings  # quick alias
+MAGIC = b'ARCF'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIIIIQ')
+HEADER_SIZE = 64
+FRAME_COUNT_OFFSET = HEADER.size - 8
+SLOT_HEADER = struct.Struct('<QQQ')
+SLOT_HEADER_SIZE = 64  # keeps the pixels of every slot 64 byte aligned
+SEQUENCE = struct.Struct('<Q')
+FRAME_COUNT = struct.Struct('<Q')
+
+
+class FramePublisher(object):
+    """Creates the shared memory block and publishes frames to it. Call publish() after every pygame.display.update(),
+    and close() when done (which removes the block)."""
+
+    def __init__(self, name, display, slot_count):
+        self.size = display.get_size()
+        self.pitch = display.get_pitch()
+        self.slot_count = slot_count
+        self.frame_count = 0
+        self._slot_size = SLOT_HEADER_SIZE + self.pitch * self.size[1]
+        size = HEADER_SIZE + slot_count * self._slot_size
+        try:
+            self._shm = shared_memory.SharedMemory(name, True, size)
+        except FileExistsError:  # left behind by a game that crashed
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name, True, size)
+        self._buf = self._shm.buf
+        masks = display.get_masks()
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, slot_count, self.size[0], self.size[1], self.pitch, masks[0],
+                         masks[1], masks[2], 0)
+        self._start_time = time.perf_counter()
+        self._last_time = None  # of the last frame published
+        self._interval = 1.0 / CFG.SharedFrames.FrameRate
+
+    def publish(self, display):
+        """Copy the display into the next slot, if a frame is due"""
+        now = time.perf_counter()
+        if self._last_time is not None and now - self._last_time < self._interval:
+            return
+        if display.get_size() != self.size or display.get_pitch() != self.pitch:
+            return  # display mode changed. Readers only know the size publishing started at.
+        self._last_time = now
+        offset = HEADER_SIZE + (self.frame_count % self.slot_count) * self._slot_size
+        sequence = SEQUENCE.unpack_from(self._buf, offset)[0]
+        SLOT_HEADER.pack_into(self._buf, offset, sequence + 1, self.frame_count,  # odd sequence: being written
+                              int((now - self._start_time) * 1000000))
+        pixels = offset + SLOT_HEADER_SIZE
+        self._buf[pixels:pixels + self.pitch * self.size[1]] = display.get_view('0')
+        SEQUENCE.pack_into(self._buf, offset, sequence + 2)  # even: done
+        self.frame_count += 1
+        FRAME_COUNT.pack_into(self._buf, FRAME_COUNT_OFFSET, self.frame_count)
+
+    def close(self):
+        self._buf.release()
+        self._shm.close()
+        self._shm.unlink()
+
+
+class FrameReader(object):
+    """Reads frames published by a FramePublisher, in another process"""
+
+    def __init__(self, name):
+        self._shm = shared_memory.SharedMemory(name)
+        if sys.version_info < (3, 13) and multiprocessing.parent_process() is None:
+            # only the publisher removes the block. Before 3.13, the resource tracker would remove it when this
+            # process exits. (Child processes share their parent's tracker, which already knows about the block.)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._buf = self._shm.buf
+        (magic, version, self.slot_count, width, height, self.pitch, red_mask, green_mask, blue_mask,
+         frame_count) = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d shared frame buffer' % (name, VERSION))
+        self.size = (width, height)
+        self.masks = (red_mask, green_mask, blue_mask)
+        self._slot_size = SLOT_HEADER_SIZE + self.pitch * height
+        self.retry_count = 0  # reads that were written over while reading, and tried again
+        # the pixels of every slot, as (height, pitch) arrays of bytes, read in place
+        self._slots = [numpy.ndarray((height, self.pitch), numpy.uint8, self._buf,
+                                     HEADER_SIZE + idx * self._slot_size + SLOT_HEADER_SIZE)
+                       for idx in range(self.slot_count)]
+
+    def get_frame_count(self):
+        """Frames published so far"""
+        return FRAME_COUNT.unpack_from(self._buf, FRAME_COUNT_OFFSET)[0]
+
+    def make_buffer(self):
+        """Array to read frames into"""
+        return numpy.empty((self.size[1], self.pitch), numpy.uint8)
+
+    def read_latest(self, out):
+        """Copy the latest frame's pixels into out (see make_buffer()). Returns (frame number, seconds since publishing
+        started), or None if nothing has been published yet."""
+        while True:
+            frame_count = self.get_frame_count()
+            if frame_count == 0:
+                return None
+            slot = (frame_count - 1) % self.slot_count
+            offset = HEADER_SIZE + slot * self._slot_size
+            sequence, frame_idx, micros = SLOT_HEADER.unpack_from(self._buf, offset)
+            if sequence % 2 == 0:
+                out[:] = self._slots[slot]
+                if SEQUENCE.unpack_from(self._buf, offset)[0] == sequence:
+                    return frame_idx, micros / 1000000.0
+            self.retry_count += 1
+
+    def get_rgb(self, rows):
+        """RGB pixels, as a (height, width, 3) array, of a frame read with read_latest()"""
+        return capture.get_rgb(rows, self.size[0], self.masks)
+
+    def close(self):
+        del self._slots
+        self._buf.release()
+        self._shm.close()
+
+
+def _self_test_reader(name, seconds, results):
+    """Read frames for a while, checking each is whole. Runs in a process of its own."""
+    reader = FrameReader(name)
+    rows = reader.make_buffer()
+    read_count = 0
+    torn_count = 0
+    last_frame = None
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        frame = reader.read_latest(rows)
+        if frame is None or frame[0] == last_frame:
+            continue
+        last_frame = frame[0]
+        read_count += 1
+        # the test frames are filled with their frame number. Anything else is a mix of two frames.
+        pixels = rows[:, :reader.size[0] * 4].view(numpy.uint32)
+        if not (pixels == (last_frame & 0xffffff)).all():
+            torn_count += 1
+    results.put((read_count, torn_count, reader.retry_count))
+    reader.close()
+
+
+def self_test(seconds):
+    """Publish synthetic frames as fast as possible while a reader process checks every frame it reads is whole.
+    Returns True if none were mixed up."""
+    name = CFG.SharedFrames.Name + '_self_test'
+    surface = pygame.Surface((640, 360), 0, 32, (0xff0000, 0xff00, 0xff, 0))
+    publisher = FramePublisher(name, surface, 1)  # the worst case: every frame is written over the one being read
+    publisher._interval = 0.0  # no frame rate cap
+    results = multiprocessing.Queue()
+    reader = multiprocessing.Process(target=_self_test_reader, args=(name, seconds, results))
+    reader.start()
+    try:
+        while reader.is_alive():
+            surface.fill(publisher.frame_count & 0xffffff)
+            publisher.publish(surface)
+        read_count, torn_count, retry_count = results.get()
+    finally:
+        reader.join()
+        publisher.close()
+    print('Published %d frames. The reader read %d of them, %d mixed up, %d reads tried again.' % (
+        publisher.frame_count, read_count, torn_count, retry_count))
+    return torn_count == 0 and read_count > 0
+
+
+if __name__ == '__main__':
+    if '--self-test' in sys.argv:
+        idx = sys.argv.index('--self-test')
+        ok = self_test(float(sys.argv[idx + 1]) if len(sys.argv) > idx + 1 else 3.0)
+        print('OK' if ok else 'FAILED')
+        sys.exit(0 if ok else 1)
+    watch_seconds = float(sys.argv[sys.argv.index('--seconds') + 1]) if '--seconds' in sys.argv else 5.0
+    out_path = sys.argv[sys.argv.index('--out') + 1] if '--out' in sys.argv else 'shared_frame.png'
+    frame_reader = FrameReader(CFG.SharedFrames.Name)
+    frame_rows = frame_reader.make_buffer()
+    first = frame_reader.get_frame_count()
+    time.sleep(watch_seconds)
+    latest = frame_reader.read_latest(frame_rows)
+    if latest is None:
+        print('Nothing published yet')
+    else:
+        rgb = frame_reader.get_rgb(frame_rows)
+        pygame.image.save(pygame.image.frombuffer(rgb.tobytes(), frame_reader.size, 'RGB'), out_path)
+        print('%dx%d frames, %.1f published per second. Frame %d (at %.1f seconds) saved to %s' % (
+            frame_reader.size[0], frame_reader.size[1], (frame_reader.get_frame_count() - first) / watch_seconds,
+            latest[0], latest[1], out_path))
+    frame_reader.close()
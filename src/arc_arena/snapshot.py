@@ -0,0 +1,57 @@
+"""
+Snapshots of a round's complete state, held in memory (see settings.Snapshot)
+
+A snapshot is MainGameState.get_state() pickled into a bytes buffer: the trail surfaces, every snake's position, heading
+and gap state, bullets, apples, followers, pending round timers, scores and the random number generator. Restoring one
+takes a few milliseconds, however far into the round it was taken.
+
+They are used to:
+    - rematch: play the round that just ended again, from the same start (settings.Snapshot.RematchKey on the score
+      screen)
+    - rewind: put the round back the way it was at a moment saved during play (SaveKey saves, RestoreKey goes back),
+      ex: to settle a dispute
+    - benchmark: write a mid-round position to a file (WriteKey) and start rounds from it (StartFile, or the
+      --start-snapshot command line option) instead of playing up to it every time
+"""
+import pickle
+
+
+class RoundSnapshot(object):
+    def __init__(self, round_name, seed, round_idx, player_count, data):
+        self.round_name = round_name  # class of the round
+        self.seed = seed
+        self.round_idx = round_idx
+        self.player_count = player_count
+        self._data = data  # pickled MainGameState.get_state()
+
+    @staticmethod
+    def take(state):
+        """Snapshot of a round (a MainGameState)"""
+        return RoundSnapshot(state.__class__.__name__, state.seed, state.owner().round_idx,
+                             len(state.owner()._controllers), pickle.dumps(state.get_state(), pickle.HIGHEST_PROTOCOL))
+
+    def get_size(self):
+        return len(self._data)
+
+    def is_of(self, state):
+        """Is this a snapshot of the given round? (Same kind of round, seed and players.)"""
+        return (state.__class__.__name__ == self.round_name and state.seed == self.seed and
+                len(state.owner()._controllers) == self.player_count)
+
+    def restore(self, state):
+        """Put a round back the way it was when the snapshot was taken. The round must be the one the snapshot was taken
+        of, or one made from the same seed (see ArcGame.make_round_from_snapshot())."""
+        if not self.is_of(state):
+            raise ValueError('Snapshot of a %s with %d players can not be restored into this %s' % (
+                self.round_name, self.player_count, state.__class__.__name__))
+        state.set_state(pickle.loads(self._data))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump((self.round_name, self.seed, self.round_idx, self.player_count, self._data), f,
+                        pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return RoundSnapshot(*pickle.load(f))
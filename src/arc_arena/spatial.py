@@ -0,0 +1,344 @@
+"""
+Spatial indexes built from the trails on the game surface, used to answer "is anything over there?" questions
+without walking pixels one at a time
+"""
+import math
+import numpy
+import pygame
+import pygame.surfarray
+
+
+class OccupancyPyramid(object):
+    """Multi-level occupancy map of the game surface: max-pooled tiles at 1, 4, 16 and 64 pixels.
+
+    A tile is occupied if any pixel inside of it is not the background color. Drawing code marks the areas it touched
+    as dirty and the affected tiles are recomputed the next time the pyramid is queried, so the pyramid costs nothing
+    on ticks that nobody asks it anything.
+    """
+    TILE_SIZES = (64, 16, 4, 1)  # coarsest to finest
+
+    def __init__(self, game_surface, background_color):
+        self._game_surface = game_surface
+        size = game_surface.get_size()
+        self._size = size
+        self._background_color = background_color
+        top = self.TILE_SIZES[0]
+        self._tile_counts = (int(math.ceil(size[0] / top)), int(math.ceil(size[1] / top)))
+        padded = (self._tile_counts[0] * top, self._tile_counts[1] * top)  # so every top level tile is complete
+        self._levels = [numpy.zeros((padded[0] // tile, padded[1] // tile), dtype=bool) for tile in self.TILE_SIZES]
+        self._dirty_tiles = set()
+        self._listeners = []
+
+    def rebuild(self):
+        """Mark the whole surface as dirty"""
+        self._dirty_tiles.update((tx, ty) for tx in range(self._tile_counts[0]) for ty in range(self._tile_counts[1]))
+
+    def mark_dirty(self, rect):
+        """Mark the top level tiles touched by the given rect as needing to be recomputed"""
+        rect = pygame.Rect(rect).clip(pygame.Rect((0, 0), self._size))
+        if rect.width == 0 or rect.height == 0:
+            return
+        top = self.TILE_SIZES[0]
+        for tx in range(rect.left // top, (rect.right - 1) // top + 1):
+            for ty in range(rect.top // top, (rect.bottom - 1) // top + 1):
+                self._dirty_tiles.add((tx, ty))
+
+    def mark_dirty_ring(self, center, inner_radius, outer_radius):
+        """Mark the top level tiles that overlap a ring (ex: the squeeze circle) as dirty"""
+        top = self.TILE_SIZES[0]
+        for tx in range(self._tile_counts[0]):
+            for ty in range(self._tile_counts[1]):
+                # closest and farthest distance from the center to this tile
+                nearest_x = min(max(center[0], tx * top), (tx + 1) * top)
+                nearest_y = min(max(center[1], ty * top), (ty + 1) * top)
+                farthest_x = max(abs(center[0] - tx * top), abs(center[0] - (tx + 1) * top))
+                farthest_y = max(abs(center[1] - ty * top), abs(center[1] - (ty + 1) * top))
+                if math.hypot(nearest_x - center[0], nearest_y - center[1]) <= outer_radius and \
+                        math.hypot(farthest_x, farthest_y) >= inner_radius:
+                    self._dirty_tiles.add((tx, ty))
+
+    def update(self):
+        """Recompute all dirty tiles from the game surface. Returns the list of top level tiles that were updated."""
+        if not self._dirty_tiles:
+            return []
+        top = self.TILE_SIZES[0]
+        width, height = self._size
+        fine = self._levels[-1]
+        updated = sorted(self._dirty_tiles)
+        pixels = pygame.surfarray.pixels2d(self._game_surface)
+        for tx, ty in updated:
+            x0, y0 = tx * top, ty * top
+            x1, y1 = min(x0 + top, width), min(y0 + top, height)
+            fine[x0:x1, y0:y1] = pixels[x0:x1, y0:y1] != self._background_color
+        del pixels  # pixel arrays lock their surface until they are released
+
+        # max-pool each coarser level from the one below it, for all of the dirty tiles at once (numpy call overhead
+        # dominates the per-tile work)
+        txs, tys = numpy.array(updated).T
+        tile_count_x, tile_count_y = self._tile_counts
+        pooled = fine.reshape(tile_count_x, top, tile_count_y, top)[txs, :, tys, :]
+        for level in range(len(self.TILE_SIZES) - 2, -1, -1):
+            count = top // self.TILE_SIZES[level]
+            factor = self.TILE_SIZES[level] // self.TILE_SIZES[level + 1]
+            if factor == 4 and pooled.shape[2] % 4 == 0:
+                # viewing 4 bools as one uint32 ORs them along y far faster than any() does
+                pooled = numpy.ascontiguousarray(pooled).view(numpy.uint32) != 0
+                pooled = pooled.reshape(len(updated), count, factor, count).any(axis=2)
+            else:
+                pooled = pooled.reshape(len(updated), count, factor, count, factor).any(axis=(2, 4))
+            self._levels[level].reshape(tile_count_x, count, tile_count_y, count)[txs, :, tys, :] = pooled
+
+        self._dirty_tiles.clear()
+        for listener in self._listeners:
+            listener(updated)
+        return updated
+
+    def add_listener(self, callback):
+        """Register a callback that is given the list of top level tiles each time they are recomputed"""
+        self._listeners.append(callback)
+
+    def get_level(self, tile_size):
+        """Return the occupancy grid for the given tile size, indexed [x][y]"""
+        self.update()
+        return self._levels[self.TILE_SIZES.index(tile_size)]
+
+    def is_occupied(self, pos):
+        self.update()
+        x, y = int(pos[0]), int(pos[1])
+        if not (0 <= x < self._size[0] and 0 <= y < self._size[1]):
+            return False
+        return bool(self._levels[-1][x, y])
+
+    def is_box_empty(self, rect):
+        """Return True if no pixel inside of the rect is occupied"""
+        self.update()
+        rect = pygame.Rect(rect).clip(pygame.Rect((0, 0), self._size))
+        if rect.width == 0 or rect.height == 0:
+            return True
+        return self._is_region_empty(0, rect.left, rect.top, rect.right, rect.bottom)
+
+    def _is_region_empty(self, level, x0, y0, x1, y1):
+        tile = self.TILE_SIZES[level]
+        tx0, ty0 = x0 // tile, y0 // tile
+        tx1, ty1 = (x1 - 1) // tile + 1, (y1 - 1) // tile + 1
+        block = self._levels[level][tx0:tx1, ty0:ty1]
+        if not block.any():
+            return True
+        if tile == 1:
+            return False
+        for i, j in numpy.argwhere(block):
+            tile_x0, tile_y0 = (tx0 + i) * tile, (ty0 + j) * tile
+            tile_x1, tile_y1 = tile_x0 + tile, tile_y0 + tile
+            if x0 <= tile_x0 and y0 <= tile_y0 and tile_x1 <= x1 and tile_y1 <= y1:
+                return False  # an occupied tile lies completely inside of the region
+            if not self._is_region_empty(level + 1, max(x0, tile_x0), max(y0, tile_y0), min(x1, tile_x1),
+                                         min(y1, tile_y1)):
+                return False
+        return True
+
+    def raycast(self, start, direction, max_dist):
+        """March a ray from start along the (normalized) direction. Returns the distance to the first occupied pixel,
+        or None if nothing is hit within max_dist. Empty tiles are skipped in a single step."""
+        self.update()
+        x, y = start[0], start[1]
+        dx, dy = direction[0], direction[1]
+        dist = 0.0
+        while dist <= max_dist:
+            px, py = x + dx * dist, y + dy * dist
+            if not (0 <= px < self._size[0] and 0 <= py < self._size[1]):
+                return None
+            for level, tile in enumerate(self.TILE_SIZES):
+                if not self._levels[level][int(px) // tile, int(py) // tile]:
+                    break
+            else:
+                return dist  # the pixel itself is occupied
+            dist += self._get_tile_exit_dist(px, py, dx, dy, tile) + 0.01  # nudge into the next tile
+        return None
+
+    @staticmethod
+    def _get_tile_exit_dist(px, py, dx, dy, tile):
+        """Distance along a ray from a point to where it exits the tile containing the point"""
+        left, top = (int(px) // tile) * tile, (int(py) // tile) * tile
+        exit_x = ((left + tile - px) / dx if dx > 0 else (left - px) / dx) if dx != 0 else math.inf
+        exit_y = ((top + tile - py) / dy if dy > 0 else (top - py) / dy) if dy != 0 else math.inf
+        return max(0.0, min(exit_x, exit_y))
+
+
+class DistanceField(object):
+    """Coarse grid holding each cell's distance (in pixels) to the nearest occupied cell, capped at max_dist.
+
+    Kept current from the OccupancyPyramid it listens to. Cells that become occupied (the common case: trails being
+    drawn) are folded in with a precomputed distance kernel. Cells that become empty (trails being cleared) can make
+    distances grow, so the area they could affect is recomputed from scratch.
+    """
+
+    def __init__(self, pyramid, cell_size, max_dist):
+        assert OccupancyPyramid.TILE_SIZES[0] % cell_size == 0, 'cell size must evenly divide the top level tiles'
+        self._pyramid = pyramid
+        self._cell_size = cell_size
+        self._max_dist = float(max_dist)
+        self._cap = int(math.ceil(max_dist / cell_size))  # in cells
+        top_level = pyramid.get_level(OccupancyPyramid.TILE_SIZES[0])
+        self._tile_counts = top_level.shape
+        self._cells_per_tile = OccupancyPyramid.TILE_SIZES[0] // cell_size
+        shape = (self._tile_counts[0] * self._cells_per_tile, self._tile_counts[1] * self._cells_per_tile)
+        self._occupied = numpy.zeros(shape, dtype=bool)
+        self._dist = numpy.full(shape, self._max_dist, dtype=numpy.float32)
+        offsets = numpy.arange(-self._cap, self._cap + 1)
+        kernel = numpy.hypot(offsets[:, numpy.newaxis], offsets[numpy.newaxis, :]) * cell_size
+        self._kernel = numpy.minimum(kernel, self._max_dist).astype(numpy.float32)
+        self._source_level = max(tile for tile in OccupancyPyramid.TILE_SIZES if cell_size % tile == 0)
+        pyramid.add_listener(self._on_tiles_updated)
+        # catch up with anything the pyramid already holds
+        self._on_tiles_updated([(tx, ty) for tx in range(self._tile_counts[0]) for ty in range(self._tile_counts[1])])
+
+    def get_distance(self, pos):
+        """Distance in pixels from pos to the nearest trail or wall (at cell resolution), up to max_dist"""
+        self._pyramid.update()
+        cx, cy = int(pos[0]) // self._cell_size, int(pos[1]) // self._cell_size
+        if not (0 <= cx < self._dist.shape[0] and 0 <= cy < self._dist.shape[1]):
+            return 0.0
+        return float(self._dist[cx, cy])
+
+    def get_field(self):
+        """Return the whole distance grid, indexed [x][y], one entry per cell"""
+        self._pyramid.update()
+        return self._dist
+
+    def _on_tiles_updated(self, tiles):
+        txs, tys = numpy.array(tiles).T
+        per_tile = self._cells_per_tile
+        tile_count_x, tile_count_y = self._tile_counts
+        source = self._pyramid.get_level(self._source_level)
+        ratio = self._cell_size // self._source_level
+        # max-pool the pyramid level into cells, for just the updated tiles
+        blocks = source.reshape(tile_count_x, per_tile * ratio, tile_count_y, per_tile * ratio)[txs, :, tys, :]
+        new = blocks.reshape(len(tiles), per_tile, ratio, per_tile, ratio).any(axis=(2, 4))
+        occupied_tiles = self._occupied.reshape(tile_count_x, per_tile, tile_count_y, per_tile)
+        old = occupied_tiles[txs, :, tys, :]
+        if (new == old).all():
+            return
+        occupied_tiles[txs, :, tys, :] = new
+
+        changed = numpy.argwhere(new != old)  # rows of (tile, x in tile, y in tile)
+        cells_x = txs[changed[:, 0]] * per_tile + changed[:, 1]
+        cells_y = tys[changed[:, 0]] * per_tile + changed[:, 2]
+        if (old & ~new).any():
+            self._recompute(cells_x.min(), cells_y.min(), cells_x.max() + 1, cells_y.max() + 1)
+        else:
+            for cx, cy in zip(cells_x, cells_y):
+                self._add_source(cx, cy)
+
+    def _add_source(self, cx, cy):
+        """Fold a newly occupied cell into the field"""
+        cap = self._cap
+        x0, y0 = max(cx - cap, 0), max(cy - cap, 0)
+        x1, y1 = min(cx + cap + 1, self._dist.shape[0]), min(cy + cap + 1, self._dist.shape[1])
+        kernel = self._kernel[x0 - cx + cap:x1 - cx + cap, y0 - cy + cap:y1 - cy + cap]
+        window = self._dist[x0:x1, y0:y1]
+        numpy.minimum(window, kernel, out=window)
+
+    def _recompute(self, x0, y0, x1, y1):
+        """Recompute the distances for every cell that could have been affected by a change inside of the given
+        cell range, using every occupied cell that could be close enough to matter"""
+        cap = self._cap
+        width, height = self._dist.shape
+        # cells within cap of the change, and the occupied cells within cap of those
+        ax0, ay0, ax1, ay1 = max(x0 - cap, 0), max(y0 - cap, 0), min(x1 + cap, width), min(y1 + cap, height)
+        sx0, sy0, sx1, sy1 = max(ax0 - cap, 0), max(ay0 - cap, 0), min(ax1 + cap, width), min(ay1 + cap, height)
+        dist = self._compute_distances(self._occupied[sx0:sx1, sy0:sy1], cap)
+        self._dist[ax0:ax1, ay0:ay1] = numpy.minimum(dist[ax0 - sx0:ax1 - sx0, ay0 - sy0:ay1 - sy0] * self._cell_size,
+                                                     self._max_dist)
+
+    @staticmethod
+    def _compute_distances(occupied, cap):
+        """Euclidean distance transform of a boolean grid, in cells, exact up to cap. Done as two separable passes:
+        nearest occupied cell along each column, then a min over the rows within cap."""
+        width, height = occupied.shape
+        far = cap + 1
+        index = numpy.arange(width)[:, numpy.newaxis]
+        nearest_before = numpy.maximum.accumulate(numpy.where(occupied, index, -far - width), axis=0)
+        nearest_after = numpy.minimum.accumulate(numpy.where(occupied, index, far + 2 * width)[::-1], axis=0)[::-1]
+        along_x = numpy.minimum(numpy.minimum(index - nearest_before, nearest_after - index), far)
+        along_x_sq = along_x.astype(numpy.float32) ** 2
+        dist_sq = along_x_sq.copy()
+        for dy in range(1, min(cap, height - 1) + 1):
+            numpy.minimum(dist_sq[:, dy:], along_x_sq[:, :-dy] + dy * dy, out=dist_sq[:, dy:])
+            numpy.minimum(dist_sq[:, :-dy], along_x_sq[:, dy:] + dy * dy, out=dist_sq[:, :-dy])
+        return numpy.sqrt(dist_sq)
+
+
+class FreeSpaceRegions(object):
+    """Connected regions of free space on a coarse grid taken from an OccupancyPyramid level.
+
+    A cell is free if no pixel inside of it is occupied, so a passage has to be at least a cell wide to connect two
+    regions. Regions are found by splitting each column of the grid into runs of free cells and joining the runs that
+    touch in neighboring columns, all with whole-array numpy operations.
+    """
+
+    def __init__(self, pyramid, cell_size, size, do_wrap=False):
+        assert cell_size in OccupancyPyramid.TILE_SIZES, 'cell size must be one of the pyramid tile sizes'
+        self._pyramid = pyramid
+        self._cell_size = cell_size
+        self._grid_size = (int(math.ceil(size[0] / cell_size)), int(math.ceil(size[1] / cell_size)))
+        self.do_wrap = do_wrap
+        self._labels = None
+        self._areas = None
+
+    def analyze(self):
+        """Label every free cell with the region it belongs to"""
+        width, height = self._grid_size
+        free = ~self._pyramid.get_level(self._cell_size)[:width, :height]
+        run_starts = free.copy()
+        run_starts[:, 1:] &= ~free[:, :-1]
+        run_count = int(run_starts.sum())
+        run_ids = numpy.cumsum(run_starts).reshape(width, height) - 1  # which run each free cell is in (column order)
+
+        # pairs of runs that touch: horizontal neighbors, plus the edges of the arena if it wraps around
+        pairs = [self._get_touching_runs(run_ids[:-1], run_ids[1:], free[:-1] & free[1:], run_count)]
+        if self.do_wrap:
+            pairs.append(self._get_touching_runs(run_ids[-1:], run_ids[:1], free[-1:] & free[:1], run_count))
+            wrapped = free[:, -1] & free[:, 0]
+            pairs.append((run_ids[:, -1][wrapped], run_ids[:, 0][wrapped]))
+        run_a = numpy.concatenate([a for a, b in pairs])
+        run_b = numpy.concatenate([b for a, b in pairs])
+
+        # label propagation: hook the larger root of each pair onto the smaller, then flatten, until nothing changes
+        roots = numpy.arange(run_count)
+        while True:
+            root_a, root_b = roots[run_a], roots[run_b]
+            if (root_a == root_b).all():
+                break
+            numpy.minimum.at(roots, numpy.maximum(root_a, root_b), numpy.minimum(root_a, root_b))
+            while True:
+                next_roots = roots[roots]
+                if (next_roots == roots).all():
+                    break
+                roots = next_roots
+
+        self._labels = numpy.where(free, roots[run_ids] if run_count else -1, -1)
+        self._areas = numpy.bincount(self._labels[free], minlength=run_count)
+
+    @staticmethod
+    def _get_touching_runs(runs_a, runs_b, touching, run_count):
+        """Return the (a, b) run pairs of cells that touch, without repeating a pair along a shared stretch"""
+        keys = runs_a.astype(numpy.int64) * run_count + runs_b
+        unique = touching.copy()
+        unique[:, 1:] &= ~(touching[:, :-1] & (keys[:, 1:] == keys[:, :-1]))
+        return runs_a[unique], runs_b[unique]
+
+    def get_region(self, pos):
+        """Return the label of the region containing pos, or None if pos is not in free space"""
+        x, y = int(pos[0]) // self._cell_size, int(pos[1]) // self._cell_size
+        if self.do_wrap:
+            x, y = x % self._grid_size[0], y % self._grid_size[1]
+        elif not (0 <= x < self._grid_size[0] and 0 <= y < self._grid_size[1]):
+            return None
+        label = self._labels[x, y]
+        return None if label < 0 else int(label)
+
+    def get_area(self, region):
+        """Area of a region in square pixels. The None region (no free space) has no area."""
+        if region is None:
+            return 0
+        return int(self._areas[region]) * self._cell_size * self._cell_size
@@ -0,0 +1,157 @@
+"""
+Live state of the round in a memory-mapped file, for overlays, commentary dashboards and bots (see settings.StateFeed)
+
+Every tick of a round, the game writes where each snake is, where it is heading, whether it is alive and the scores to
+a small file with a fixed layout. Other programs map the same file and read it whenever they like, as often as they
+like: no sockets, no parsing, and nothing they do slows the game down.
+
+Layout (all integers little endian, floats are IEEE 754):
+
+    offset 0, header:
+        b'ARCS', uint16 version, uint16 player slots, uint32 reserved, uint32 reserved, uint64 sequence number
+    offset PAYLOAD_OFFSET, the round (ROUND):
+        uint64 ticks since the round started, float64 seconds of play (0 during the countdown), uint32 round index,
+        uint16 player count, uint8 phase (PHASE_*), pad byte, 32 bytes round class name (UTF-8, NUL padded)
+    offset PAYLOAD_OFFSET + ROUND_SIZE, one PLAYER_SIZE record per player slot (PLAYER), in player order:
+        float32 x, y, heading (radians, 0 is right, increasing clockwise on screen), speed (pixels per second),
+        uint8 alive, uint8 turning (see Snake.NOTURN...), 2 pad bytes, uint8 red, green, blue, pad byte,
+        int32 score, score this round, kills, uint32 win streak, 24 bytes name (UTF-8, NUL padded)
+
+The sequence number is a seqlock: it is odd while the game writes. A reader notes it (waiting if it is odd), copies
+what it needs and checks it again. If it changed, the game wrote while it was reading, and it tries again.
+
+Watch the feed of a running game (with settings.StateFeed.On) from another process:
+
+    python -m arc_arena.statefeed [FEED_FILE] [--rate TIMES_PER_SECOND]
+"""
+import math
+import mmap
+import struct
+import sys
+import time
+from arc_arena import settings
+
+CFG = settings  # quick alias
+MAGIC = b'ARCS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIQ')
+SEQUENCE = struct.Struct('<Q')
+SEQUENCE_OFFSET = HEADER.size - SEQUENCE.size
+PAYLOAD_OFFSET = 64
+ROUND = struct.Struct('<QdIHBx32s')
+ROUND_SIZE = 64
+PLAYER = struct.Struct('<ffffBB2xBBBxiiiI24s')
+PLAYER_SIZE = 64
+PHASE_NONE = 0  # no round yet
+PHASE_COUNTDOWN = 1
+PHASE_PLAYING = 2
+PHASE_OVER = 3
+
+
+def get_file_size(player_slots):
+    return PAYLOAD_OFFSET + ROUND_SIZE + player_slots * PLAYER_SIZE
+
+
+class StateFeedWriter(object):
+    """Writes the state of rounds to a feed file. Call write() after every tick of a round, and close() when done."""
+
+    def __init__(self, path, player_slots):
+        self.path = path
+        self.player_slots = player_slots
+        size = get_file_size(player_slots)
+        with open(path, 'wb') as f:
+            f.write(bytes(size))
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), size)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, player_slots, 0, 0, 0)
+        self._sequence = 0
+        self._payload = bytearray(size - PAYLOAD_OFFSET)  # built here, then copied to the file in one go
+
+    def write(self, state):
+        """Write the state of a round (a MainGameState)"""
+        game = state.owner()
+        if state.round_over:
+            phase = PHASE_OVER
+        elif state._paused:
+            phase = PHASE_COUNTDOWN
+        else:
+            phase = PHASE_PLAYING
+        elapsed = state.round_timer.get_elapsed() if hasattr(state, 'round_timer') else 0.0
+        players = game.scoreboard._player_list
+        count = min(len(players), self.player_slots)
+        ROUND.pack_into(self._payload, 0, state.tick_count, elapsed, game.round_idx, count, phase,
+                        state.__class__.__name__.encode('utf-8'))
+        for idx in range(count):
+            player = players[idx]
+            snake = state._snakes[idx]
+            red, green, blue = player.color[:3]
+            PLAYER.pack_into(self._payload, ROUND_SIZE + idx * PLAYER_SIZE, snake.pos.x, snake.pos.y,
+                             math.atan2(snake.vel.y, snake.vel.x), snake.vel.Magnitude(), snake in state.alive_snakes,
+                             snake.turning_dir or snake.NOTURN, red, green, blue, player.score, player.score_delta,
+                             player.kills, player.win_streak, player.name.encode('utf-8'))
+        self._sequence += 1
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence)  # odd: being written
+        self._map[PAYLOAD_OFFSET:] = self._payload
+        self._sequence += 1
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class StateFeedReader(object):
+    """Reads a feed file written by a StateFeedWriter, in another process"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.player_slots, reserved, reserved, sequence = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d state feed' % (path, VERSION))
+        self.retry_count = 0  # reads that were written over while reading, and tried again
+
+    def get_sequence(self):
+        """Changes every time the game writes. Poll this to tell if there is anything new to read."""
+        return SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+
+    def read(self):
+        """Returns (sequence number, the state as a dict: tick, elapsed, round_idx, phase, round, players (a list of
+        dicts: x, y, heading, speed, alive, turning, color, score, score_delta, kills, win_streak, name))"""
+        while True:
+            sequence = self.get_sequence()
+            if sequence % 2 == 0:
+                payload = self._map[PAYLOAD_OFFSET:]
+                if self.get_sequence() == sequence:
+                    break
+            self.retry_count += 1
+        tick, elapsed, round_idx, count, phase, round_name = ROUND.unpack_from(payload, 0)
+        players = []
+        for idx in range(count):
+            (x, y, heading, speed, alive, turning, red, green, blue, score, score_delta, kills, win_streak,
+             name) = PLAYER.unpack_from(payload, ROUND_SIZE + idx * PLAYER_SIZE)
+            players.append({'x': x, 'y': y, 'heading': heading, 'speed': speed, 'alive': bool(alive),
+                            'turning': turning, 'color': (red, green, blue), 'score': score,
+                            'score_delta': score_delta, 'kills': kills, 'win_streak': win_streak,
+                            'name': name.rstrip(b'\0').decode('utf-8', 'ignore')})
+        return sequence, {'tick': tick, 'elapsed': elapsed, 'round_idx': round_idx, 'phase': phase,
+                          'round': round_name.rstrip(b'\0').decode('utf-8', 'ignore'), 'players': players}
+
+    def close(self):
+        self._map.close()
+
+
+if __name__ == '__main__':
+    feed_path = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith('--') else CFG.StateFeed.Filename
+    rate = float(sys.argv[sys.argv.index('--rate') + 1]) if '--rate' in sys.argv else 4.0
+    reader = StateFeedReader(feed_path)
+    phase_names = {PHASE_NONE: 'waiting', PHASE_COUNTDOWN: 'countdown', PHASE_PLAYING: 'playing', PHASE_OVER: 'over'}
+    last_sequence = None
+    while True:
+        if reader.get_sequence() != last_sequence:
+            last_sequence, feed = reader.read()
+            print('round %d %s (%s), tick %d, %.1f s: %s' % (
+                feed['round_idx'], feed['round'], phase_names.get(feed['phase'], '?'), feed['tick'], feed['elapsed'],
+                ', '.join('%s %s %d (%.0f, %.0f)' % (p['name'], '+' if p['alive'] else 'x', p['score'], p['x'], p['y'])
+                          for p in feed['players'])))
+        time.sleep(1.0 / rate)
@@ -0,0 +1,67 @@
+"""
+Bookkeeping that is kept alongside the trails drawn to the game surface
+"""
+import pygame
+import pygame.surfarray
+from arc_arena import chunks
+
+NO_OWNER = 0
+
+
+class OwnerMap(object):
+    """Per-pixel record of which player drew each trail pixel on the game surface.
+
+    The game surface only stores a color index, which doesn't say who drew a pixel (ex: in ColorBlindRound every
+    trail is the same color). Owner ids are stored in a parallel 8-bit surface, so up to 255 players are supported.
+    Give a chunk_size to store the owners in a chunks.ChunkedSurface, to match a chunked game surface.
+    """
+
+    def __init__(self, size, chunk_size=None):
+        if chunk_size is None:
+            self._surface = pygame.Surface(size, 0, 8)
+            self._surface.fill(NO_OWNER)
+        else:
+            self._surface = chunks.ChunkedSurface(size, chunk_size, NO_OWNER)
+
+    @staticmethod
+    def get_owner_id(player_index):
+        return player_index + 1
+
+    def stamp(self, pos, radius, owner_id):
+        chunks.draw_circle(self._surface, owner_id, pos, radius)
+
+    def clear(self, pos, radius):
+        self.stamp(pos, radius, NO_OWNER)
+
+    def get_owner(self, pos):
+        try:
+            return self._surface.get_at_mapped(pos)
+        except IndexError:
+            return NO_OWNER
+
+    def copy_pixels(self):
+        return chunks.copy_pixels(self._surface)
+
+    def paste_pixels(self, pixels):
+        chunks.paste_pixels(self._surface, pixels)
+
+    def free_empty_chunks(self):
+        if isinstance(self._surface, chunks.ChunkedSurface):
+            self._surface.free_empty_chunks()
+
+    def erase_owner(self, owner_id, game_surface, background_color):
+        """Remove every trail pixel drawn by the given owner from the game surface in one bulk operation"""
+        if isinstance(self._surface, chunks.ChunkedSurface):
+            # both surfaces are chunked the same way
+            pairs = [(owner_chunk, game_surface.get_chunk(key)) for key, owner_chunk in self._surface.iter_chunks()]
+        else:
+            pairs = [(self._surface, game_surface)]
+        for owner_surface, trail_surface in pairs:
+            if trail_surface is None:
+                continue
+            owners = pygame.surfarray.pixels2d(owner_surface)
+            trail = pygame.surfarray.pixels2d(trail_surface)
+            mask = owners == owner_id
+            trail[mask] = background_color
+            owners[mask] = NO_OWNER
+            del owners, trail  # pixel arrays lock their surfaces until they are released
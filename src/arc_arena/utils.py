@@ -1,4 +1,8 @@
+import colorsys
+import math
+import queue
 import random
+import threading
 
 import pygame
 from gnp_pygame import gnipMath
@@ -44,14 +48,162 @@ def make_grid_points(rect, spacing):
     return pts
 
 
-def get_jitter_vect(xdelta, ydelta):
+def poisson_disc_points(rect, min_dist, is_valid=None, rng=random, tries=30):
+    """Fill a rect with random points that are all at least min_dist apart (Bridson's Poisson-disc sampling).
+    is_valid is an optional callback taking a cVector2 that can reject points, to fit the points to any shape
+    inside of the rect. rng is anything with the random module's interface."""
+    cell = min_dist / math.sqrt(2)  # a cell this size can hold only one point
+    cols, rows = int(math.ceil(rect.width / cell)), int(math.ceil(rect.height / cell))
+    grid = {}
+    points = []
+    active = []
+
+    def fits(x, y):
+        if not (rect.left <= x < rect.right and rect.top <= y < rect.bottom):
+            return False
+        col, row = int((x - rect.left) / cell), int((y - rect.top) / cell)
+        for i in range(max(col - 2, 0), min(col + 3, cols)):
+            for j in range(max(row - 2, 0), min(row + 3, rows)):
+                other = grid.get((i, j))
+                if other is not None and math.hypot(other[0] - x, other[1] - y) < min_dist:
+                    return False
+        return is_valid is None or is_valid(gnipMath.cVector2(x, y))
+
+    def add(x, y):
+        grid[(int((x - rect.left) / cell), int((y - rect.top) / cell))] = (x, y)
+        points.append((x, y))
+        active.append((x, y))
+
+    for _ in range(tries):
+        x, y = rng.uniform(rect.left, rect.right), rng.uniform(rect.top, rect.bottom)
+        if fits(x, y):
+            add(x, y)
+            break
+    while active:
+        idx = rng.randrange(len(active))
+        x, y = active[idx]
+        for _ in range(tries):
+            angle, dist = rng.uniform(0.0, 2 * math.pi), rng.uniform(min_dist, 2 * min_dist)
+            new_x, new_y = x + math.cos(angle) * dist, y + math.sin(angle) * dist
+            if fits(new_x, new_y):
+                add(new_x, new_y)
+                break
+        else:
+            active[idx] = active[-1]  # nothing fits around this point anymore
+            active.pop()
+    return [gnipMath.cVector2(x, y) for x, y in points]
+
+
+def get_safe_heading(pos, others, look_ahead, is_valid=None, rng=random, samples=16):
+    """Pick a direction to head from pos that stays as far as possible from the other points for look_ahead pixels,
+    without leaving the area allowed by the is_valid callback (see poisson_disc_points)"""
+    offset = rng.uniform(0.0, 2 * math.pi)
+    enough = look_ahead / 2.0  # a path that stays this far from everyone is as good as any other
+    nearby = [(o.x, o.y) for o in others if 0 < math.hypot(o.x - pos.x, o.y - pos.y) < look_ahead + enough]
+    best, best_clearance = None, -1.0
+    for idx in range(samples):
+        angle = offset + idx * (2 * math.pi / samples)
+        dx, dy = math.cos(angle), math.sin(angle)
+        if is_valid is not None and not all(
+                is_valid(gnipMath.cVector2(pos.x + dx * look_ahead * step / 4.0, pos.y + dy * look_ahead * step / 4.0))
+                for step in range(1, 5)):
+            continue
+        clearance = enough
+        for x, y in nearby:
+            # distance from the other point to the path segment
+            along = max(0.0, min(look_ahead, (x - pos.x) * dx + (y - pos.y) * dy))
+            clearance = min(clearance, math.hypot(x - (pos.x + dx * along), y - (pos.y + dy * along)))
+            if clearance <= best_clearance:
+                break
+        if clearance > best_clearance:
+            best, best_clearance = (dx, dy), clearance
+            if clearance >= enough:
+                break
+    if best is None:
+        best = (math.cos(offset), math.sin(offset))
+    return gnipMath.cVector2(best[0], best[1])
+
+
+def get_scattered_starts(count, rect, min_dist, smallest_dist, look_ahead, is_valid=None, rng=random):
+    """Return a list of (position, direction) pairs for count snakes scattered around the rect. The clearance between
+    snakes starts at min_dist and is shrunk (but not below smallest_dist) until everyone fits."""
+    # Poisson-disc sampling packs at least ~0.6 points per min_dist squared, so start near a distance that will fit
+    dist = max(min(min_dist, math.sqrt(0.55 * rect.width * rect.height / count)), smallest_dist)
+    while True:
+        pts = poisson_disc_points(rect, dist, is_valid, rng)
+        if len(pts) >= count:
+            break
+        assert dist > smallest_dist, 'Can not fit %d snakes %dpx apart in %s' % (count, smallest_dist, str(rect))
+        dist = max(dist * 0.8, smallest_dist)
+    pts = rng.sample(pts, count)
+    return [(p, get_safe_heading(p, pts, look_ahead, is_valid, rng)) for p in pts]
+
+
+def get_jitter_vect(xdelta, ydelta, rng=random):
     """Return random vector which can be added to other vectors to jitter them slightly"""
     return gnipMath.cVector2(
-        random.randint(-xdelta, xdelta),
-        random.randint(-ydelta, ydelta)
+        rng.randint(-xdelta, xdelta),
+        rng.randint(-ydelta, ydelta)
     )
 
 
+def rand_in_rect(rect, rng=random):
+    """Random point in a rect, like gnipMath.cVector2.RandInRect() but with the given random number generator"""
+    return gnipMath.cVector2(rng.uniform(rect.left, rect.right), rng.uniform(rect.top, rect.bottom))
+
+
+def rand_in_circle(center, radius, rng=random):
+    """Random point in a circle (evenly spread over its area), using the given random number generator"""
+    angle = rng.uniform(0.0, 2 * math.pi)
+    dist = radius * math.sqrt(rng.random())
+    return gnipMath.cVector2(center[0] + math.cos(angle) * dist, center[1] + math.sin(angle) * dist)
+
+
+def random_no_repeat(items, rng=random):
+    """Generator that yields the items in random order, reshuffling each time they have all been used, without
+    yielding the same item twice in a row"""
+    items = list(items)
+    last = None
+    while True:
+        rng.shuffle(items)
+        if len(items) > 1 and items[0] is last:
+            items[0], items[-1] = items[-1], items[0]
+        for item in items:
+            yield item
+        last = items[-1]
+
+
+def make_distinct_colors(count, existing=(), min_dist=60):
+    """Generate count bright, saturated colors that are spread around the hue wheel (golden ratio hue steps) and are not
+    too close to each other or to any of the existing colors. Always generates the same colors for the same arguments,
+    so colors saved with the player list still match next time."""
+    golden_ratio = 0.618033988749895
+    levels = ((1.0, 1.0), (0.6, 1.0), (1.0, 0.7), (0.6, 0.8))  # (saturation, value) pairs to cycle through
+    colors = []
+    taken = list(existing)
+    hue = 0.0
+    attempts = 0
+    while len(colors) < count:
+        saturation, value = levels[(attempts // 7) % len(levels)]
+        hue = (hue + golden_ratio) % 1.0
+        attempts += 1
+        color = tuple(int(c * 255) for c in colorsys.hsv_to_rgb(hue, saturation, value))
+        # distinctness requirement relaxes as the color wheel fills up
+        required_dist = min_dist * max(0.0, 1.0 - attempts / (20.0 * count))
+        if all(math.sqrt(sum((a - b) ** 2 for a, b in zip(color, other))) >= required_dist for other in taken):
+            colors.append(color)
+            taken.append(color)
+    return colors
+
+
+def names_summary(names, max_names):
+    """Comma separated list of names that doesn't get longer than max_names"""
+    names = list(names)
+    if len(names) <= max_names:
+        return ','.join(names)
+    return '%s +%d more' % (','.join(names[:max_names]), len(names) - max_names)
+
+
 def withalpha(trg_surface, drawing_callback):
     """Run the drawing_callback (assumed to be a pygame.draw.* function) and blit it to given surface.
     pygame.draw functions don't do alpha blending, but they do preserve alpha in the color. So, if
@@ -77,3 +229,44 @@ def darken_color(color, darken_pct):
 def alphaize(color, alpha):
     """Take a 3-tuple color and return a color with the given alpha"""
     return (color[0], color[1], color[2], alpha)
+
+
+class BackgroundFileWriter(object):
+    """Writes a file on a background thread, so the game never waits on the disk. Subclasses can handle other kinds of
+    items than bytes, and add to the end of the file when it is closed."""
+
+    def __init__(self, path, thread_name):
+        self._file = open(path, 'wb')
+        self._queue = queue.Queue()
+        self._offset = 0  # bytes written so far
+        self._thread = threading.Thread(target=self._run, name=thread_name, daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        self._queue.put(data)
+
+    def close(self):
+        self._queue.put(None)
+
+    def wait(self):
+        """Wait for everything to be written (after close())"""
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._handle(item)
+        self._finish()
+        self._file.close()
+
+    def _handle(self, item):
+        self._write(item)
+
+    def _finish(self):
+        pass
+
+    def _write(self, data):
+        self._file.write(data)
+        self._offset += len(data)